@@ -0,0 +1,213 @@
+"""
+Per-worker materialized view of the active request list (DROP_REQUESTS)
+
+Every worker process keeps all active requests in memory, indexed by serial_no, part_no
+and deliver_to, and answers /api/requests, the isRequested tagging of ERP containers and
+the cleanup status counts from it instead of querying DROP_REQUESTS each time.
+
+The view follows DROP_REQUESTS_CHANGELOG: a refresh reads only the inserts and deletes
+committed after the version it holds (StorageBackend.active_request_changes). The whole
+list is read only on first use, or when the change log no longer covers that version.
+Applying a change twice is harmless (rows are keyed by req_id), so a reload may read rows
+newer than its version.
+
+Changes made through this worker are applied as soon as they commit (main.py refreshes
+before publishing request events); changes made through other workers arrive with the
+next background refresh. Reads refresh first when the data is older than max_lag_seconds,
+so a stalled background loop degrades to read-through instead of serving stale data.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from storage import ActiveRequestChanges, StorageBackend
+
+logger = logging.getLogger(__name__)
+
+INDEXED_COLUMNS = ('serial_no', 'part_no', 'deliver_to')
+
+
+def newest_first_key(row: Dict[str, Any]) -> tuple:
+    """Sort key for req_time DESC (NULLs last), req_id DESC as a tiebreaker"""
+    return (row['req_time'] is not None, row['req_time'] or datetime.min, row['req_id'])
+
+
+class ActiveRequestsView:
+    """
+    Args:
+        storage: Backend the view reads DROP_REQUESTS and its change log from
+        max_lag_seconds: Reads older than this refresh before answering
+
+    Rows handed out are the view's own dicts: callers must not modify them.
+    """
+
+    def __init__(self, storage: StorageBackend, max_lag_seconds: float):
+        self.storage = storage
+        self.max_lag_seconds = max_lag_seconds
+        self.version: Optional[int] = None  # None until the first load
+        self._rows: Dict[int, Dict[str, Any]] = {}
+        self._indexes: Dict[str, Dict[Any, Set[int]]] = {column: {} for column in INDEXED_COLUMNS}
+        self._newest_first: Optional[List[Dict[str, Any]]] = None
+        self._refresh_lock = asyncio.Lock()
+        self._synced_at: Optional[float] = None  # monotonic time the current data was read at
+        self.refresh_count = 0
+        self.full_reloads = 0
+        self.changes_applied = 0
+        self.refresh_failures = 0
+        self.read_through_refreshes = 0
+        self.last_refresh_ms: Optional[float] = None
+        self.max_served_lag_seconds = 0.0
+        self.last_error: Optional[str] = None
+        self.last_error_time: Optional[str] = None
+
+    # --- Maintenance ---
+
+    def _index(self, row: Dict[str, Any]):
+        for column in INDEXED_COLUMNS:
+            self._indexes[column].setdefault(row[column], set()).add(row['req_id'])
+
+    def _unindex(self, row: Dict[str, Any]):
+        for column in INDEXED_COLUMNS:
+            req_ids = self._indexes[column].get(row[column])
+            if req_ids is not None:
+                req_ids.discard(row['req_id'])
+                if not req_ids:
+                    del self._indexes[column][row[column]]
+
+    def _remove(self, req_id: int):
+        row = self._rows.pop(req_id, None)
+        if row is not None:
+            self._unindex(row)
+
+    def _upsert(self, row: Dict[str, Any]):
+        self._remove(row['req_id'])
+        self._rows[row['req_id']] = row
+        self._index(row)
+
+    def _apply(self, changes: ActiveRequestChanges):
+        for req_id in changes.deleted_req_ids:
+            self._remove(req_id)
+        for row in changes.rows:
+            self._upsert(row)
+        if changes.rows or changes.deleted_req_ids:
+            self._newest_first = None
+        self.changes_applied += len(changes.rows) + len(changes.deleted_req_ids)
+        self.version = changes.version
+
+    async def _reload(self):
+        # Version before rows: rows changed in between are applied again by the next refresh
+        version = await self.storage.active_requests_version()
+        rows = await self.storage.list_active_requests()
+        self._rows = {}
+        self._indexes = {column: {} for column in INDEXED_COLUMNS}
+        for row in rows:
+            self._upsert(row)
+        self._newest_first = None
+        self.version = version
+        self.full_reloads += 1
+
+    async def refresh(self):
+        """
+        Catch up with the newest committed version. Concurrent callers share one refresh;
+        a caller waiting behind a refresh that started before it was called runs another.
+        """
+        requested_at = time.monotonic()
+        async with self._refresh_lock:
+            if self._synced_at is not None and self._synced_at >= requested_at:
+                return
+            started = time.monotonic()
+            self.refresh_count += 1
+            try:
+                changes = None
+                if self.version is not None:
+                    changes = await self.storage.active_request_changes(self.version)
+                if changes is None:
+                    await self._reload()
+                else:
+                    self._apply(changes)
+            except Exception as e:
+                self.refresh_failures += 1
+                self.last_error = str(e)
+                self.last_error_time = datetime.now().isoformat()
+                raise
+            self._synced_at = started
+            self.last_refresh_ms = round((time.monotonic() - started) * 1000, 2)
+
+    async def run(self, interval_seconds: float):
+        """Background loop: refresh every interval_seconds until cancelled"""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"⚠️ Active requests view refresh failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    def lag_seconds(self) -> Optional[float]:
+        """Age of the data: time since the last successful refresh read the database"""
+        return time.monotonic() - self._synced_at if self._synced_at is not None else None
+
+    async def _fresh(self):
+        lag = self.lag_seconds()
+        if lag is None or lag > self.max_lag_seconds:
+            self.read_through_refreshes += 1
+            await self.refresh()
+            lag = self.lag_seconds()
+        self.max_served_lag_seconds = max(self.max_served_lag_seconds, lag)
+
+    # --- Reads ---
+
+    def _sorted_rows(self) -> List[Dict[str, Any]]:
+        if self._newest_first is None:
+            self._newest_first = sorted(self._rows.values(), key=newest_first_key, reverse=True)
+        return self._newest_first
+
+    async def list_requests(self, part_no: Optional[str] = None,
+                            deliver_to: Optional[str] = None) -> Tuple[int, List[Dict[str, Any]]]:
+        """(version, active requests newest first), optionally only one part / workcenter"""
+        await self._fresh()
+        if part_no is None and deliver_to is None:
+            return self.version, list(self._sorted_rows())
+
+        req_ids: Optional[Set[int]] = None
+        for column, value in (('part_no', part_no), ('deliver_to', deliver_to)):
+            if value is not None:
+                matches = self._indexes[column].get(value, set())
+                req_ids = matches if req_ids is None else req_ids & matches
+        rows = sorted((self._rows[req_id] for req_id in req_ids), key=newest_first_key, reverse=True)
+        return self.version, rows
+
+    async def requested_serials(self, serial_nos: Sequence[Any]) -> Set[str]:
+        """The subset of serial_nos that have an active request"""
+        await self._fresh()
+        serial_index = self._indexes['serial_no']
+        return {str(s) for s in serial_nos if s is not None and str(s) in serial_index}
+
+    async def summary(self) -> Tuple[int, Optional[datetime], Optional[datetime]]:
+        """(active request count, oldest req_time, newest req_time)"""
+        await self._fresh()
+        times = [row['req_time'] for row in self._sorted_rows() if row['req_time'] is not None]
+        return len(self._rows), (times[-1] if times else None), (times[0] if times else None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lag = self.lag_seconds()
+        return {
+            'storage_backend': self.storage.name,
+            'loaded': self.version is not None,
+            'version': self.version,
+            'rows': len(self._rows),
+            'distinct_values': {column: len(index) for column, index in self._indexes.items()},
+            'lag_seconds': round(lag, 3) if lag is not None else None,
+            'max_lag_seconds': self.max_lag_seconds,
+            'max_served_lag_seconds': round(self.max_served_lag_seconds, 3),
+            'refresh_count': self.refresh_count,
+            'full_reloads': self.full_reloads,
+            'changes_applied': self.changes_applied,
+            'read_through_refreshes': self.read_through_refreshes,
+            'refresh_failures': self.refresh_failures,
+            'last_refresh_ms': self.last_refresh_ms,
+            'last_error': self.last_error,
+            'last_error_time': self.last_error_time
+        }
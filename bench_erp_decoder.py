@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: pandas ERP response processing vs the pandas-free erp_decoder
+
+Builds synthetic Plex containers payloads (20-2000 rows, with missing values,
+inf quantities and J-B locations), checks that both paths produce identical
+records and prints the time per response for each.
+
+Usage:
+    python bench_erp_decoder.py [--repeat 200]
+"""
+
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+from erp_decoder import ErpTable, prepare_containers
+
+COLUMNS = ['Serial_No', 'Part_No', 'Revision', 'Quantity', 'Location', 'Add_Date', 'Master_Unit_Key']
+
+
+def make_payload(row_count: int, seed: int = 7) -> dict:
+    """Synthetic datasource 8566 response with the quirks seen in real data"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(row_count):
+        roll = rng.random()
+        quantity = rng.choice([50, 100, 120.5, 200])
+        if roll < 0.03:
+            quantity = None
+        elif roll < 0.05:
+            quantity = math.inf
+        location = rng.choice(['WH-A01', 'WH-B07', 'PROD-03', 'J-B1', 'J-B3', None])
+        rows.append([
+            str(3900000 + rng.randint(0, 10 * row_count)),
+            'P-10001',
+            rng.choice(['A', 'B', None]),
+            quantity,
+            location,
+            f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00",
+            rng.choice([None, '800001', '800002'])
+        ])
+    return {'outputs': {}, 'tables': [{'columns': COLUMNS, 'rows': rows}]}
+
+
+def pandas_path(response_data: dict, existing_serials: set) -> list:
+    """The previous DataFrame-based processing from main.py"""
+    columns = response_data.get("tables")[0].get("columns", [])
+    rows = response_data.get("tables")[0].get("rows", [])
+    df = pd.DataFrame(rows, columns=columns)
+    df = df.sort_values(by=["Add_Date", "Serial_No"], ascending=[True, True])
+    df['isRequested'] = df['Serial_No'].isin(existing_serials)
+    df = df[~df['Location'].str.startswith('J-B', na=False)]
+    df = df.replace([np.inf, -np.inf], np.nan).fillna(0)
+    return df.to_dict(orient="records")
+
+
+def decoder_path(response_data: dict, existing_serials: set) -> list:
+    table = response_data.get("tables")[0]
+    return prepare_containers(ErpTable(table.get("columns", []), table.get("rows", [])), existing_serials)
+
+
+def time_per_call(func, payload, existing_serials, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(payload, existing_serials)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    print("🧪 ERP response decoding: pandas vs erp_decoder")
+    print("=" * 60)
+    print(f"{'rows':>6} {'pandas (ms)':>12} {'decoder (ms)':>13} {'speedup':>8}  parity")
+
+    for row_count in (20, 50, 200, 2000):
+        payload = make_payload(row_count)
+        existing_serials = {row[0] for row in payload['tables'][0]['rows'][::7]}
+
+        expected = pandas_path(payload, existing_serials)
+        actual = decoder_path(payload, existing_serials)
+        parity = expected == actual and all(
+            type(a) is type(b) for e, d in zip(expected, actual) for a, b in zip(e.values(), d.values())
+        )
+
+        pandas_ms = time_per_call(pandas_path, payload, existing_serials, args.repeat) * 1000
+        decoder_ms = time_per_call(decoder_path, payload, existing_serials, args.repeat) * 1000
+        print(f"{row_count:>6} {pandas_ms:>12.3f} {decoder_ms:>13.3f} {pandas_ms / decoder_ms:>7.1f}x  {'✅' if parity else '❌'}")
+
+        if not parity:
+            raise SystemExit(f"❌ Output mismatch for {row_count} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark: LIKE '%term%' scan vs trigram candidate lookup for /api/history searches
+
+Builds a synthetic history (1,000,000 rows by default) of serial numbers and part
+numbers, indexes it with the same trigram functions the app uses (history_search.py)
+and times substring searches both ways, checking that they return the same rows.
+
+Modes:
+    memory  Python list scan vs an in-memory trigram posting index (default)
+    sqlite  The actual SQL shapes (LIKE only vs LIKE + candidate_filter_sql) on an
+            in-memory SQLite database with DROP_REQUESTS_HISTORY / _NGRAM tables
+
+Usage:
+    python bench_history_search.py [--rows 1000000] [--mode memory|sqlite] [--repeat 5]
+"""
+
+import argparse
+import random
+import sqlite3
+import time
+from array import array
+from collections import defaultdict
+
+from history_search import (FIELD_PART_NO, FIELD_SERIAL_NO, candidate_filter_sql, ngram_rows,
+                            search_trigrams, trigrams)
+
+# (field, term) searches typed into the history UI
+SEARCHES = [
+    (FIELD_SERIAL_NO, '391'),
+    (FIELD_SERIAL_NO, '39125'),
+    (FIELD_SERIAL_NO, '3912577'),
+    (FIELD_PART_NO, '100'),
+    (FIELD_PART_NO, '52100-A'),
+    (FIELD_PART_NO, 'p-1004'),
+]
+
+
+def make_history(row_count: int, seed: int = 11) -> list:
+    """Synthetic (history_id, serial_no, part_no) rows"""
+    rng = random.Random(seed)
+    part_numbers = [f"P-{10000 + i}" for i in range(1500)] + [f"52{i:03d}-{rng.choice('ABC')}{rng.randint(0, 99):02d}" for i in range(500)]
+    return [
+        (history_id, str(3900000 + rng.randint(0, 2_000_000)), rng.choice(part_numbers))
+        for history_id in range(1, row_count + 1)
+    ]
+
+
+def timed(func, repeat: int):
+    result = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def bench_memory(history: list, repeat: int):
+    started = time.perf_counter()
+    postings = {FIELD_SERIAL_NO: defaultdict(lambda: array('i')), FIELD_PART_NO: defaultdict(lambda: array('i'))}
+    for history_id, serial_no, part_no in history:
+        for gram in trigrams(serial_no):
+            postings[FIELD_SERIAL_NO][gram].append(history_id)
+        for gram in trigrams(part_no):
+            postings[FIELD_PART_NO][gram].append(history_id)
+    entries = sum(len(ids) for field in postings.values() for ids in field.values())
+    print(f"   index built in {time.perf_counter() - started:.1f}s ({entries:,} trigram entries)")
+
+    column = {FIELD_SERIAL_NO: 1, FIELD_PART_NO: 2}
+    values = {row[0]: row for row in history}
+    print_header()
+
+    for field, term in SEARCHES:
+        needle = term.lower()
+        index = column[field]
+
+        def scan():
+            return [row[0] for row in history if needle in row[index].lower()]
+
+        def indexed():
+            lists = sorted((postings[field].get(gram, array('i')) for gram in search_trigrams(term)), key=len)
+            candidates = set(lists[0])
+            for ids in lists[1:]:
+                candidates.intersection_update(ids)
+            return sorted(history_id for history_id in candidates if needle in values[history_id][index].lower()), len(candidates)
+
+        expected, scan_ms = timed(scan, repeat)
+        (actual, candidates), index_ms = timed(indexed, repeat)
+        report(field, term, len(expected), candidates, scan_ms, index_ms, expected == actual)
+
+
+def bench_sqlite(history: list, repeat: int):
+    started = time.perf_counter()
+    db = sqlite3.connect(':memory:')
+    db.execute("CREATE TABLE DROP_REQUESTS_HISTORY (history_id INTEGER PRIMARY KEY, serial_no TEXT, part_no TEXT)")
+    db.execute("""
+        CREATE TABLE DROP_REQUESTS_HISTORY_NGRAM (
+            field TEXT NOT NULL, gram TEXT NOT NULL, history_id INTEGER NOT NULL,
+            PRIMARY KEY (field, gram, history_id)
+        ) WITHOUT ROWID
+    """)
+    db.executemany("INSERT INTO DROP_REQUESTS_HISTORY VALUES (?, ?, ?)", history)
+    db.executemany(
+        "INSERT INTO DROP_REQUESTS_HISTORY_NGRAM (field, gram, history_id) VALUES (?, ?, ?)",
+        (row for history_id, serial_no, part_no in history for row in ngram_rows(history_id, serial_no, part_no))
+    )
+    db.commit()
+    print(f"   tables built in {time.perf_counter() - started:.1f}s")
+    print_header()
+
+    column = {FIELD_SERIAL_NO: 'serial_no', FIELD_PART_NO: 'part_no'}
+    for field, term in SEARCHES:
+        like_sql = f"SELECT history_id FROM DROP_REQUESTS_HISTORY WHERE {column[field]} LIKE ? ORDER BY history_id"
+        candidate_sql, candidate_params = candidate_filter_sql(field, search_trigrams(term))
+        indexed_sql = (f"SELECT history_id FROM DROP_REQUESTS_HISTORY "
+                       f"WHERE {column[field]} LIKE ? AND {candidate_sql} ORDER BY history_id")
+        count_sql = f"SELECT COUNT(*) FROM DROP_REQUESTS_HISTORY WHERE {candidate_sql}"
+
+        expected, scan_ms = timed(lambda: db.execute(like_sql, [f"%{term}%"]).fetchall(), repeat)
+        actual, index_ms = timed(lambda: db.execute(indexed_sql, [f"%{term}%", *candidate_params]).fetchall(), repeat)
+        candidates = db.execute(count_sql, candidate_params).fetchone()[0]
+        report(field, term, len(expected), candidates, scan_ms, index_ms, expected == actual)
+
+
+def print_header():
+    print(f"{'field':>9} {'term':>11} {'matches':>8} {'candidates':>10} {'scan (ms)':>10} {'index (ms)':>10} {'speedup':>8}  parity")
+
+
+def report(field: str, term: str, matches: int, candidates: int, scan_ms: float, index_ms: float, parity: bool):
+    name = 'serial_no' if field == FIELD_SERIAL_NO else 'part_no'
+    print(f"{name:>9} {term!r:>11} {matches:>8,} {candidates:>10,} {scan_ms:>10.1f} {index_ms:>10.1f} "
+          f"{scan_ms / index_ms if index_ms else float('inf'):>7.1f}x  {'✅' if parity else '❌'}")
+    if not parity:
+        raise SystemExit(f"❌ Result mismatch for {name} {term!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--mode', choices=['memory', 'sqlite'], default='memory')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"🧪 History substring search: scan vs trigram index ({args.rows:,} rows, {args.mode})")
+    print("=" * 78)
+    history = make_history(args.rows)
+
+    if args.mode == 'memory':
+        bench_memory(history, args.repeat)
+    else:
+        bench_sqlite(history, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark: WebSocket fan-out latency across worker processes
+
+Starts --workers processes joined by the Unix socket broadcast bus (broadcast_bus.py) on a
+temporary socket, each with a BroadcastHub (websocket_hub.py) holding --clients in-process
+stand-ins for WebSocket clients: the path a request event takes between gunicorn workers
+in the app. Worker 0 publishes --messages messages at --rate per second, delivering them
+to its own clients directly and to the other workers through the bus. Reports
+publish-to-client latency percentiles for local and cross-worker delivery, and any
+messages lost.
+
+--slow-clients adds clients per worker whose sends never complete (a tablet that stopped
+reading): their queues fill up and are coalesced without delaying the other clients.
+
+Usage:
+    python bench_ws_fanout.py [--workers 4] [--clients 50] [--messages 2000] [--rate 500] [--slow-clients 0]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+from broadcast_bus import UnixSocketBus, unix_bus_supported
+from websocket_hub import BroadcastHub
+
+
+class BenchClient:
+    """Records publish-to-delivery latency of every message sent to it"""
+
+    client = None
+
+    def __init__(self, stalled: bool = False):
+        self.latencies = []
+        self.stalled = stalled
+
+    async def send_text(self, text: str):
+        if self.stalled:
+            await asyncio.Event().wait()  # Never completes
+        self.latencies.append(time.monotonic() - json.loads(text)['t'])
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def run_worker(index: int, args, socket_path: str, ready, go, done, results):
+    hub = BroadcastHub(args.queue_size, 'coalesce', 3600, resync_message=lambda: {'type': 'resync', 't': time.monotonic()})
+    clients = [BenchClient() for _ in range(args.clients)]
+    slow_clients = [BenchClient(stalled=True) for _ in range(args.slow_clients)]
+    connections = [hub.connect(client) for client in clients + slow_clients]
+
+    async def on_message(text: str):
+        hub.broadcast(text)
+
+    bus = UnixSocketBus(socket_path, reconnect_seconds=0.05)
+    await bus.start(on_message)
+    while not bus.get_stats()['connected']:
+        await asyncio.sleep(0.01)
+    ready.put(index)
+
+    if index == 0:
+        await asyncio.to_thread(go.wait)
+        started = time.monotonic()
+        for i in range(args.messages):
+            # Pace to --rate: sleep until this message's slot
+            delay = started + i / args.rate - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            text = json.dumps({'type': 'bench', 'i': i, 't': time.monotonic()})
+            hub.broadcast(text)
+            await bus.publish(text)
+
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline and any(len(c.latencies) < args.messages for c in clients):
+        await asyncio.sleep(0.02)
+
+    slow_stats = [connection.get_stats() for connection in connections[len(clients):]]
+    results.put({
+        'worker': index,
+        'latencies': [latency for client in clients for latency in client.latencies],
+        'expected': args.messages * len(clients),
+        'slow_coalesced': sum(s['coalesced'] for s in slow_stats),
+        'slow_dropped': sum(s['dropped'] for s in slow_stats)
+    })
+    # Stay on the bus (one of the workers is the broker) until everyone has reported
+    await asyncio.to_thread(done.wait)
+    await hub.close()
+    await bus.close()
+
+
+def worker_process(index: int, args, socket_path: str, ready, go, done, results):
+    logging.basicConfig(level=logging.ERROR)  # Bus reconnect warnings while the workers shut down
+    asyncio.run(run_worker(index, args, socket_path, ready, go, done, results))
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))] if sorted_values else float('nan')
+
+
+def report(label: str, clients: int, results: list):
+    latencies = sorted(latency for result in results for latency in result['latencies'])
+    expected = sum(result['expected'] for result in results)
+    ms = [percentile(latencies, p) * 1000 for p in (0.5, 0.95, 0.99)] + [(latencies[-1] if latencies else float('nan')) * 1000]
+    print(f"{label:<16} {clients:>8} {len(latencies):>10,} {expected - len(latencies):>6,} "
+          + " ".join(f"{value:>9.2f}" for value in ms))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=50, help='WebSocket clients per worker')
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=500, help='messages per second')
+    parser.add_argument('--slow-clients', type=int, default=0, help='stalled clients per worker')
+    parser.add_argument('--queue-size', type=int, default=100, help='send queue per connection (WS_SEND_QUEUE_SIZE)')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds to wait for deliveries')
+    args = parser.parse_args()
+
+    if not unix_bus_supported():
+        raise SystemExit("❌ Unix domain sockets are not available on this platform")
+
+    print(f"🧪 WebSocket fan-out: {args.workers} workers x {args.clients} clients "
+          f"(+{args.slow_clients} stalled), {args.messages:,} messages at {args.rate:,.0f}/s")
+    print("=" * 78)
+
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, 'bus.sock')
+        ready, results = multiprocessing.Queue(), multiprocessing.Queue()
+        go, done = multiprocessing.Event(), multiprocessing.Event()
+        processes = [
+            multiprocessing.Process(target=worker_process, args=(i, args, socket_path, ready, go, done, results))
+            for i in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.get(timeout=30)
+
+        go.set()
+        collected = sorted((results.get(timeout=args.timeout + 60) for _ in processes), key=lambda r: r['worker'])
+        done.set()
+        for process in processes:
+            process.join()
+
+    print(f"{'delivery':<16} {'clients':>8} {'delivered':>10} {'lost':>6} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9}")
+    report('local (worker 0)', args.clients, collected[:1])
+    if args.workers > 1:
+        report('cross-worker', args.clients * (args.workers - 1), collected[1:])
+    if args.slow_clients:
+        print(f"\nStalled clients: {sum(r['slow_coalesced'] for r in collected):,} coalesces, "
+              f"{sum(r['slow_dropped'] for r in collected):,} messages dropped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Cross-worker broadcast bus for WebSocket messages
+
+gunicorn runs several worker processes and every tablet's WebSocket lives in one of them.
+Messages that must reach all clients (request events, cleanup notifications, /ws relays)
+are delivered by the worker that produced them to its own clients and published on the
+bus; every other worker delivers what it receives from the bus to its clients through
+its BroadcastHub (websocket_hub.py).
+
+Backends (BROADCAST_BUS):
+
+    local  Nothing leaves the process: a single worker (uvicorn, the Windows service)
+    unix   Broker on a Unix domain socket, no external service. The worker that holds the
+           lock file next to the socket runs the broker in its event loop; every worker,
+           that one included, connects to it as a client. When the broker's worker exits
+           the others reconnect and one of them takes over.
+
+Delivery is at most once. A client that was cut off from the bus is told through
+on_reconnect, so it can make its WebSocket clients resync. A backend spanning several
+nodes (Redis pub/sub, Azure Web PubSub, ...) implements the same start / publish / close.
+
+Frames on the socket are a 4-byte big-endian length followed by the UTF-8 message. The
+broker forwards every frame to all clients except the sender, without waiting on any of
+them: a client whose unsent backlog exceeds MAX_PEER_BACKLOG_BYTES is disconnected.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER_BYTES = 4
+
+# Unsent bytes a socket may buffer before the other end counts as stalled (broker side and client side)
+MAX_PEER_BACKLOG_BYTES = 8 * 1024 * 1024
+
+MessageHandler = Callable[[str], Awaitable[None]]
+ReconnectHandler = Callable[[], Awaitable[None]]
+
+
+def unix_bus_supported() -> bool:
+    return hasattr(socket, 'AF_UNIX') and fcntl is not None
+
+
+def encode_frame(message: str) -> bytes:
+    data = message.encode('utf-8')
+    return len(data).to_bytes(FRAME_HEADER_BYTES, 'big') + data
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    """One frame including its header (raises IncompleteReadError at end of stream)"""
+    header = await reader.readexactly(FRAME_HEADER_BYTES)
+    return header + await reader.readexactly(int.from_bytes(header, 'big'))
+
+
+class BroadcastBus:
+    """Publishes this worker's messages to the other workers and hands theirs to on_message"""
+
+    name = 'abstract'
+
+    async def start(self, on_message: MessageHandler, on_reconnect: Optional[ReconnectHandler] = None):
+        """Begin receiving; on_message is awaited for each message, one at a time, in order"""
+
+    async def publish(self, message: str):
+        """Send message to every other worker (never to this one)"""
+
+    async def close(self):
+        """Stop receiving and release the bus"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'backend': self.name}
+
+
+class LocalBus(BroadcastBus):
+    """Single process: the publishing worker's own delivery already reached every client"""
+
+    name = 'local'
+
+    def __init__(self):
+        self.published = 0
+
+    async def publish(self, message: str):
+        self.published += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'published': self.published}
+
+
+class UnixSocketBus(BroadcastBus):
+    """
+    Args:
+        path: Unix domain socket of the broker; the broker election lock is path + '.lock'
+        reconnect_seconds: Pause before reconnecting (and possibly taking over the broker)
+    """
+
+    name = 'unix'
+
+    def __init__(self, path: str, reconnect_seconds: float = 1.0):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.reconnect_seconds = reconnect_seconds
+        self._on_message: Optional[MessageHandler] = None
+        self._on_reconnect: Optional[ReconnectHandler] = None
+        self._task: Optional[asyncio.Task] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock_fd: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: Set[asyncio.StreamWriter] = set()
+        self.connects = 0
+        self.published = 0
+        self.publish_dropped = 0
+        self.received = 0
+        self.handler_errors = 0
+        self.forwarded = 0
+        self.peers_dropped = 0
+        self.last_error: Optional[str] = None
+        self.last_error_time: Optional[str] = None
+
+    async def start(self, on_message: MessageHandler, on_reconnect: Optional[ReconnectHandler] = None):
+        self._on_message = on_message
+        self._on_reconnect = on_reconnect
+        self._task = asyncio.ensure_future(self._run())
+
+    # --- Client side ---
+
+    async def _run(self):
+        while True:
+            try:
+                await self._become_broker_if_free()
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (OSError, asyncio.IncompleteReadError) as e:
+                self._error(f"Broadcast bus connect failed: {e}")
+                await asyncio.sleep(self.reconnect_seconds)
+                continue
+
+            self._writer = writer
+            self.connects += 1
+            logger.info(f"✅ Broadcast bus connected ({'broker' if self._server else 'client'}, {self.path})")
+            if self.connects > 1 and self._on_reconnect:
+                # Messages published while this worker was cut off are lost: let its clients resync
+                await self._call(self._on_reconnect())
+            try:
+                while True:
+                    frame = await read_frame(reader)
+                    self.received += 1
+                    await self._call(self._on_message(frame[FRAME_HEADER_BYTES:].decode('utf-8')))
+            except (OSError, asyncio.IncompleteReadError) as e:
+                self._error(f"Broadcast bus connection lost: {e!r}")
+            finally:
+                self._writer = None
+                writer.close()
+            await asyncio.sleep(self.reconnect_seconds)
+
+    async def _call(self, handler: Awaitable[None]):
+        try:
+            await handler
+        except Exception as e:
+            self.handler_errors += 1
+            logger.error(f"❌ Broadcast bus handler failed: {e}")
+
+    def _error(self, message: str):
+        if message != self.last_error:
+            logger.warning(f"⚠️ {message}")
+        self.last_error = message
+        self.last_error_time = datetime.now().isoformat()
+
+    async def publish(self, message: str):
+        writer = self._writer
+        if writer is None or writer.is_closing():
+            self.publish_dropped += 1
+            return
+        if writer.transport.get_write_buffer_size() > MAX_PEER_BACKLOG_BYTES:
+            # The broker stopped reading: reconnect rather than buffer without bound
+            self.publish_dropped += 1
+            writer.close()
+            return
+        writer.write(encode_frame(message))
+        self.published += 1
+
+    # --- Broker side ---
+
+    async def _become_broker_if_free(self):
+        if self._server is not None:
+            return
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)  # Another worker is the broker
+            return
+        try:
+            # Holding the lock means no broker is running: a socket file left behind is stale
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self._server = await asyncio.start_unix_server(self._serve_peer, self.path)
+        except Exception:
+            os.close(fd)
+            raise
+        self._lock_fd = fd
+        logger.info(f"📡 Broadcast bus broker started on {self.path} (pid {os.getpid()})")
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.add(writer)
+        try:
+            while True:
+                frame = await read_frame(reader)
+                for peer in list(self._peers):
+                    if peer is writer:
+                        continue
+                    if peer.transport.get_write_buffer_size() > MAX_PEER_BACKLOG_BYTES:
+                        self._drop_peer(peer)
+                        continue
+                    peer.write(frame)
+                    self.forwarded += 1
+        except (OSError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # Worker went away, or this one is shutting down
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    def _drop_peer(self, peer: asyncio.StreamWriter):
+        logger.warning("⚠️ Broadcast bus peer is not reading, disconnecting it")
+        self.peers_dropped += 1
+        self._peers.discard(peer)
+        peer.close()
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+        if self._writer:
+            self._writer.close()
+        if self._server is not None:
+            self._server.close()
+            for peer in list(self._peers):
+                peer.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self._server = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # Releases the broker lock for another worker
+            self._lock_fd = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'backend': self.name,
+            'path': self.path,
+            'role': 'broker' if self._server is not None else 'client',
+            'connected': self._writer is not None and not self._writer.is_closing(),
+            'connects': self.connects,
+            'published': self.published,
+            'publish_dropped': self.publish_dropped,
+            'received': self.received,
+            'handler_errors': self.handler_errors,
+            'broker_peers': len(self._peers) if self._server is not None else None,
+            'broker_forwarded': self.forwarded,
+            'broker_peers_dropped': self.peers_dropped,
+            'last_error': self.last_error,
+            'last_error_time': self.last_error_time
+        }
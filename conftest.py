@@ -0,0 +1,62 @@
+"""
+Shared pytest setup
+
+- async def tests run in a fresh event loop (asyncio.run), no pytest plugin needed
+- storage: factory for a throwaway SQLite storage backend in the test's tmp_path
+- tests importing main get the SQLite backend in a temporary directory and a single-process
+  broadcast bus, so no database server or ERP credentials are needed
+"""
+
+import asyncio
+import inspect
+import os
+import tempfile
+
+import pytest
+
+os.environ.setdefault('STORAGE_BACKEND', 'sqlite')
+os.environ.setdefault('SQLITE_PATH', os.path.join(tempfile.mkdtemp(prefix='drop_list_tests_'), 'drop_list.db'))
+os.environ.setdefault('BROADCAST_BUS', 'local')
+
+from sqlite_storage import SQLiteStorage
+
+PERFORMANCE_CATEGORIES = [
+    (60, 'fast', 'Fast (≤1 hour)'),
+    (480, 'medium', 'Medium (1-8 hours)'),
+    (1440, 'slow', 'Slow (8-24 hours)'),
+    (None, 'very_slow', 'Very Slow (>24 hours)')
+]
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    arguments = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**arguments))
+    return True
+
+
+@pytest.fixture
+def make_storage(tmp_path):
+    """make_storage(on_history_change=None) -> SQLiteStorage on a new database file"""
+    created = []
+
+    def make(on_history_change=None):
+        storage = SQLiteStorage(
+            str(tmp_path / f"drop_list_{len(created)}.db"),
+            shift_of=lambda dt: 'Unknown' if dt is None else 'Morning',
+            performance_categories=PERFORMANCE_CATEGORIES,
+            on_history_change=on_history_change
+        )
+        created.append(storage)
+        return storage
+
+    yield make
+    for storage in created:
+        asyncio.run(storage.close())
+
+
+@pytest.fixture
+def storage(make_storage):
+    return make_storage()
@@ -0,0 +1,158 @@
+"""
+Lightweight decoder for Plex datasource `tables` payloads
+
+Works directly on the column list and row lists returned by Plex instead of building
+a pandas DataFrame per response. Output matches the previous pandas pipeline
+(DataFrame -> sort_values -> isin -> str.startswith filter -> replace inf / fillna(0)
+-> to_dict(orient="records")), including pandas' per-column dtype promotion:
+- an integer column with missing values becomes float
+- a column mixing ints and floats becomes float
+- missing values are filled with 0.0 in float columns and 0 in every other column
+"""
+
+import math
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+# Column kinds, mirroring the dtype pandas would infer for the column
+KIND_INT = 'int'
+KIND_FLOAT = 'float'
+KIND_BOOL = 'bool'
+KIND_OBJECT = 'object'
+
+
+def is_missing(value: Any) -> bool:
+    """True for None and NaN (what pandas treats as NA)"""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _is_non_finite(value: Any) -> bool:
+    return isinstance(value, float) and not math.isfinite(value)
+
+
+def column_kind(values: Iterable[Any]) -> str:
+    """Infer the pandas dtype kind of a column from its raw values"""
+    has_missing = False
+    has_nan = False
+    has_int = has_float = has_bool = has_other = False
+
+    for value in values:
+        if value is None:
+            has_missing = True
+        elif isinstance(value, bool):
+            has_bool = True
+        elif isinstance(value, int):
+            has_int = True
+        elif isinstance(value, float):
+            if math.isnan(value):
+                has_missing = has_nan = True
+            else:
+                has_float = True
+        else:
+            has_other = True
+
+    if has_other:
+        return KIND_OBJECT
+    if has_bool:
+        return KIND_BOOL if not (has_int or has_float or has_missing) else KIND_OBJECT
+    if has_float or (has_int and has_missing) or (has_nan and not has_int):
+        return KIND_FLOAT
+    if has_int:
+        return KIND_INT
+    return KIND_OBJECT
+
+
+def _convert(value: Any, kind: str, fill: bool) -> Any:
+    if kind == KIND_FLOAT:
+        if value is None:
+            value = math.nan
+        value = float(value)
+        if fill and (math.isnan(value) or math.isinf(value)):
+            return 0.0
+        return value
+    if fill and kind == KIND_OBJECT and (is_missing(value) or _is_non_finite(value)):
+        return 0
+    return value
+
+
+class ErpTable(NamedTuple):
+    """The first result table of a Plex datasource response"""
+    columns: List[str]
+    rows: List[List[Any]]
+
+    def column_index(self, name: str) -> int:
+        try:
+            return self.columns.index(name)
+        except ValueError:
+            raise KeyError(name)
+
+    def column(self, name: str) -> List[Any]:
+        """All values of one column, in row order"""
+        index = self.column_index(name)
+        return [row[index] for row in self.rows]
+
+    def column_kinds(self) -> List[str]:
+        return [column_kind(row[i] for row in self.rows) for i in range(len(self.columns))]
+
+    def records(self, fill_missing: bool = False) -> List[Dict[str, Any]]:
+        """
+        Rows as dicts, with pandas dtype promotion applied per column
+        fill_missing also replaces NaN/inf/None like replace([inf, -inf], nan).fillna(0)
+        """
+        return _build_records(self.columns, self.rows, self.column_kinds(), fill_missing)
+
+
+def _build_records(columns: Sequence[str], rows: Iterable[Sequence[Any]], kinds: Sequence[str],
+                   fill_missing: bool) -> List[Dict[str, Any]]:
+    # Only float columns (and object columns when filling) need per-value conversion
+    converted = [
+        (column, kind) for column, kind in zip(columns, kinds)
+        if kind == KIND_FLOAT or (fill_missing and kind == KIND_OBJECT)
+    ]
+    records = [dict(zip(columns, row)) for row in rows]
+    for column, kind in converted:
+        for record in records:
+            record[column] = _convert(record[column], kind, fill_missing)
+    return records
+
+
+def table_from_response(response_data: Dict[str, Any]) -> ErpTable:
+    """
+    Extract the first table of a Plex datasource response
+    Raises IndexError/TypeError/KeyError on an unexpected response shape
+    """
+    table = response_data.get("tables")[0]
+    return ErpTable(list(table.get("columns", [])), table.get("rows", []))
+
+
+def _sort_key(value: Any):
+    # Missing values sort last, like pandas na_position='last'
+    return (1, 0) if is_missing(value) else (0, value)
+
+
+def prepare_containers(table: ErpTable,
+                       requested_serials: Optional[set],
+                       sort_by: Sequence[str] = ("Add_Date", "Serial_No"),
+                       exclude_location_prefix: Optional[str] = "J-B") -> List[Dict[str, Any]]:
+    """
+    Decode a containers table the way the ERP helpers need it:
+    sort by sort_by ascending, tag isRequested from requested_serials (None -> all False),
+    drop rows whose Location starts with exclude_location_prefix and clean NaN/inf to 0
+    """
+    kinds = table.column_kinds()
+    sort_indexes = [table.column_index(name) for name in sort_by]
+    serial_index = table.column_index("Serial_No")
+    location_index = table.column_index("Location") if exclude_location_prefix else None
+
+    rows = sorted(table.rows, key=lambda row: tuple(_sort_key(row[i]) for i in sort_indexes))
+
+    if exclude_location_prefix:
+        rows = [
+            row for row in rows
+            if not (isinstance(row[location_index], str) and row[location_index].startswith(exclude_location_prefix))
+        ]
+
+    records = _build_records(table.columns, rows, kinds, fill_missing=True)
+    requested_serials = requested_serials or set()
+    for record, row in zip(records, rows):
+        record['isRequested'] = row[serial_index] in requested_serials
+    return records
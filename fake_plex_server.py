@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Plex datasource API, for offline load tests and benchmarks
+
+Implements POST /api/datasources/{id}/execute for the datasources used by main.py
+and returns the same response shapes (tables/columns/rows and outputs):
+- 4619   Container by serial number    (inputs: Serial_No)
+- 8566   Containers by part number     (inputs: Part_No)
+- 4390   Containers by master unit key (inputs: Master_Unit_Key)
+- 233972 Master unit number -> key     (inputs: Master_Unit_No, outputs: Master_Unit_Key)
+- 18120  Production locations          (inputs: Location_Type)
+
+Usage:
+    python fake_plex_server.py --port 8001 --parts 50 --containers-per-part 20 --latency lognormal:-1.6,0.5
+    ERP_API_BASE=http://127.0.0.1:8001/api/datasources/ uvicorn main:app
+
+Every option can also be set with the matching FAKE_PLEX_* environment variable.
+Data and injected latency/errors are driven by --seed, so runs are reproducible.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+CONTAINER_COLUMNS = ['Serial_No', 'Part_No', 'Revision', 'Quantity', 'Location', 'Add_Date', 'Master_Unit_Key', 'Container_Status']
+LOCATION_COLUMNS = ['Location', 'Location_Type', 'Building_Code']
+
+
+class FakePlexConfig:
+    """Configuration for the fake Plex server, read from FAKE_PLEX_* environment variables"""
+
+    def __init__(self):
+        self.parts = int(os.getenv('FAKE_PLEX_PARTS', '50'))
+        self.containers_per_part = int(os.getenv('FAKE_PLEX_CONTAINERS_PER_PART', '20'))
+        self.containers_per_master_unit = int(os.getenv('FAKE_PLEX_CONTAINERS_PER_MASTER_UNIT', '4'))
+        self.prod_locations = int(os.getenv('FAKE_PLEX_PROD_LOCATIONS', '12'))
+        self.prod_fraction = float(os.getenv('FAKE_PLEX_PROD_FRACTION', '0.2'))
+        self.jb_fraction = float(os.getenv('FAKE_PLEX_JB_FRACTION', '0.1'))
+        # Latency spec: "none", "fixed:S", "uniform:MIN,MAX" or "lognormal:MU,SIGMA" (seconds)
+        self.latency = os.getenv('FAKE_PLEX_LATENCY', 'none')
+        self.error_rate = float(os.getenv('FAKE_PLEX_ERROR_RATE', '0.0'))
+        self.auth_error_rate = float(os.getenv('FAKE_PLEX_AUTH_ERROR_RATE', '0.0'))
+        self.seed = int(os.getenv('FAKE_PLEX_SEED', '42'))
+
+
+def parse_latency(spec: str):
+    """Turn a latency spec into a function returning a delay in seconds"""
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',') if v.strip()]
+
+    if kind in ('', 'none'):
+        return lambda rng: 0.0
+    if kind == 'fixed':
+        return lambda rng: values[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'lognormal':
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+class FakePlexData:
+    """Deterministic synthetic containers, master units and locations"""
+
+    def __init__(self, config: FakePlexConfig):
+        rng = random.Random(config.seed)
+        self.prod_locations = [f"PROD-{i:02d}" for i in range(1, config.prod_locations + 1)]
+        storage_locations = [f"WH-{aisle}{slot:02d}" for aisle in 'ABCDEF' for slot in range(1, 21)]
+        jb_locations = ['J-B1', 'J-B2', 'J-B3']
+
+        self.containers_by_serial: Dict[str, Dict[str, Any]] = {}
+        self.containers_by_part: Dict[str, List[Dict[str, Any]]] = {}
+        self.containers_by_master_unit_key: Dict[str, List[Dict[str, Any]]] = {}
+        self.master_unit_keys: Dict[str, str] = {}
+
+        start_date = datetime(2024, 1, 1)
+        serial = 3900000
+        master_unit_no = 1
+        pending_master_unit: List[Dict[str, Any]] = []
+
+        for part_index in range(config.parts):
+            part_no = f"P-{10000 + part_index}"
+            self.containers_by_part[part_no] = []
+            for _ in range(config.containers_per_part):
+                serial += 1
+                roll = rng.random()
+                if roll < config.prod_fraction:
+                    location = rng.choice(self.prod_locations)
+                elif roll < config.prod_fraction + config.jb_fraction:
+                    location = rng.choice(jb_locations)
+                else:
+                    location = rng.choice(storage_locations)
+
+                container = {
+                    'Serial_No': str(serial),
+                    'Part_No': part_no,
+                    'Revision': rng.choice(['A', 'B', 'C']),
+                    'Quantity': rng.choice([50, 100, 120, 200, 250.5]),
+                    'Location': location,
+                    'Add_Date': (start_date + timedelta(minutes=rng.randint(0, 500000))).isoformat(),
+                    'Master_Unit_Key': None,
+                    'Container_Status': 'OK'
+                }
+                self.containers_by_serial[container['Serial_No']] = container
+                self.containers_by_part[part_no].append(container)
+
+                pending_master_unit.append(container)
+                if len(pending_master_unit) == config.containers_per_master_unit:
+                    self._add_master_unit(master_unit_no, pending_master_unit)
+                    master_unit_no += 1
+                    pending_master_unit = []
+
+        if pending_master_unit:
+            self._add_master_unit(master_unit_no, pending_master_unit)
+
+    def _add_master_unit(self, master_unit_no: int, containers: List[Dict[str, Any]]):
+        key = str(800000 + master_unit_no)
+        for container in containers:
+            container['Master_Unit_Key'] = key
+        self.master_unit_keys[f"MU{master_unit_no:06d}"] = key
+        self.containers_by_master_unit_key[key] = list(containers)
+
+
+def table_response(columns: List[str], records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build a Plex datasource response with a single result table"""
+    return {
+        'outputs': {},
+        'tables': [{
+            'columns': columns,
+            'rows': [[record.get(column) for column in columns] for record in records],
+            'rowLimitExceeded': False
+        }],
+        'transactionNo': '0'
+    }
+
+
+def outputs_response(outputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a Plex datasource response that only carries output parameters"""
+    return {'outputs': outputs, 'tables': [], 'transactionNo': '0'}
+
+
+def create_app(config: Optional[FakePlexConfig] = None) -> FastAPI:
+    config = config or FakePlexConfig()
+    data = FakePlexData(config)
+    latency = parse_latency(config.latency)
+    rng = random.Random(config.seed + 1)
+    calls: Counter = Counter()
+    injected: Counter = Counter()
+
+    app = FastAPI(title="Fake Plex datasource server")
+
+    def execute_datasource(datasource_id: int, inputs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if datasource_id == 4619:
+            container = data.containers_by_serial.get(str(inputs.get('Serial_No')))
+            return table_response(CONTAINER_COLUMNS, [container] if container else [])
+        if datasource_id == 8566:
+            return table_response(CONTAINER_COLUMNS, data.containers_by_part.get(inputs.get('Part_No'), []))
+        if datasource_id == 4390:
+            return table_response(CONTAINER_COLUMNS, data.containers_by_master_unit_key.get(str(inputs.get('Master_Unit_Key')), []))
+        if datasource_id == 233972:
+            return outputs_response({'Master_Unit_Key': data.master_unit_keys.get(inputs.get('Master_Unit_No'))})
+        if datasource_id == 18120:
+            locations = [{'Location': location, 'Location_Type': inputs.get('Location_Type'), 'Building_Code': 'CZ1'}
+                         for location in data.prod_locations]
+            return table_response(LOCATION_COLUMNS, locations)
+        return None
+
+    @app.post("/api/datasources/{datasource_id}/execute")
+    async def execute(datasource_id: int, request: Request):
+        calls[datasource_id] += 1
+        payload = await request.json()
+        inputs = payload.get('inputs', {}) if isinstance(payload, dict) else {}
+
+        delay = latency(rng)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        roll = rng.random()
+        if roll < config.auth_error_rate:
+            injected['419'] += 1
+            return JSONResponse(status_code=419, content={'message': 'Authentication failed'})
+        if roll < config.auth_error_rate + config.error_rate:
+            injected['500'] += 1
+            return JSONResponse(status_code=500, content={'message': 'Injected datasource error'})
+
+        response = execute_datasource(datasource_id, inputs)
+        if response is None:
+            return JSONResponse(status_code=404, content={'message': f'Unknown datasource {datasource_id}'})
+        return JSONResponse(content=response)
+
+    @app.get("/fake/stats")
+    async def stats():
+        """Call counters per datasource and injected error counts"""
+        return {
+            'calls': {str(ds_id): count for ds_id, count in calls.items()},
+            'total_calls': sum(calls.values()),
+            'injected_errors': dict(injected),
+            'containers': len(data.containers_by_serial),
+            'parts': len(data.containers_by_part),
+            'master_units': len(data.master_unit_keys)
+        }
+
+    @app.post("/fake/reset")
+    async def reset():
+        """Reset the call counters between benchmark runs"""
+        calls.clear()
+        injected.clear()
+        return {'status': 'success'}
+
+    @app.get("/fake/sample")
+    async def sample(count: int = 10):
+        """Sample part numbers, serial numbers and master unit numbers for load scripts"""
+        sample_rng = random.Random(config.seed + 2)
+        return {
+            'part_nos': sample_rng.sample(sorted(data.containers_by_part), min(count, len(data.containers_by_part))),
+            'serial_nos': sample_rng.sample(sorted(data.containers_by_serial), min(count, len(data.containers_by_serial))),
+            'master_unit_nos': sample_rng.sample(sorted(data.master_unit_keys), min(count, len(data.master_unit_keys))),
+            'prod_locations': data.prod_locations
+        }
+
+    return app
+
+
+def main():
+    defaults = FakePlexConfig()
+    parser = argparse.ArgumentParser(description="Fake Plex datasource server for offline benchmarking")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.getenv('FAKE_PLEX_PORT', '8001')))
+    parser.add_argument('--parts', type=int, default=defaults.parts)
+    parser.add_argument('--containers-per-part', type=int, default=defaults.containers_per_part)
+    parser.add_argument('--containers-per-master-unit', type=int, default=defaults.containers_per_master_unit)
+    parser.add_argument('--prod-locations', type=int, default=defaults.prod_locations)
+    parser.add_argument('--prod-fraction', type=float, default=defaults.prod_fraction,
+                        help="Fraction of containers already sitting in a production location")
+    parser.add_argument('--jb-fraction', type=float, default=defaults.jb_fraction,
+                        help="Fraction of containers in J-B locations")
+    parser.add_argument('--latency', default=defaults.latency,
+                        help="none, fixed:S, uniform:MIN,MAX or lognormal:MU,SIGMA (seconds)")
+    parser.add_argument('--error-rate', type=float, default=defaults.error_rate, help="Fraction of calls answered with 500")
+    parser.add_argument('--auth-error-rate', type=float, default=defaults.auth_error_rate, help="Fraction of calls answered with 419")
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    config = FakePlexConfig()
+    for name in ('parts', 'containers_per_part', 'containers_per_master_unit', 'prod_locations', 'prod_fraction',
+                 'jb_fraction', 'latency', 'error_rate', 'auth_error_rate', 'seed'):
+        setattr(config, name, getattr(args, name))
+    parse_latency(config.latency)  # fail fast on a bad spec
+
+    print(f"🧪 Fake Plex server on http://{args.host}:{args.port}/api/datasources/")
+    print(f"   {config.parts} parts x {config.containers_per_part} containers, latency={config.latency}, "
+          f"error_rate={config.error_rate}, auth_error_rate={config.auth_error_rate}, seed={config.seed}")
+
+    import uvicorn
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Trigram (3-gram) substring index for the /api/history serial_no and part_no filters
+
+Each history row gets one DROP_REQUESTS_HISTORY_NGRAM row per distinct lower-cased
+trigram of its serial_no and part_no. A substring search for a term of 3+ characters
+only has to consider history_ids that contain every trigram of the term; the LIKE
+filter is still applied to those candidates, so results are identical to a plain
+LIKE '%term%' scan.
+"""
+
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+GRAM_SIZE = 3
+
+# Field codes stored in DROP_REQUESTS_HISTORY_NGRAM.field
+FIELD_SERIAL_NO = 's'
+FIELD_PART_NO = 'p'
+
+# LIKE wildcards: terms containing them cannot be answered from the index
+LIKE_SPECIAL_CHARS = set('%_[]')
+
+
+def trigrams(value: Optional[str]) -> Set[str]:
+    """Distinct lower-cased trigrams of value (empty for None or values shorter than 3)"""
+    if not value:
+        return set()
+    value = value.lower()
+    return {value[i:i + GRAM_SIZE] for i in range(len(value) - GRAM_SIZE + 1)}
+
+
+def search_trigrams(term: Optional[str]) -> Optional[List[str]]:
+    """
+    Trigrams to look up for a substring search, or None when the index cannot be used
+    (term shorter than 3 characters or containing LIKE wildcards)
+    """
+    if not term or len(term) < GRAM_SIZE or LIKE_SPECIAL_CHARS & set(term):
+        return None
+    return sorted(trigrams(term))
+
+
+def ngram_rows(history_id: int, serial_no: Optional[str], part_no: Optional[str]) -> List[Tuple[str, str, int]]:
+    """(field, gram, history_id) rows to store for one history row"""
+    rows = [(FIELD_SERIAL_NO, gram, history_id) for gram in trigrams(serial_no)]
+    rows.extend((FIELD_PART_NO, gram, history_id) for gram in trigrams(part_no))
+    return rows
+
+
+def ngram_rows_for_history(records: Iterable[dict]) -> List[Tuple[str, str, int]]:
+    """ngram_rows for history dicts with history_id, serial_no and part_no"""
+    rows = []
+    for record in records:
+        rows.extend(ngram_rows(record['history_id'], record.get('serial_no'), record.get('part_no')))
+    return rows
+
+
+def candidate_filter_sql(field: str, grams: Sequence[str], id_column: str = 'history_id') -> Tuple[str, list]:
+    """
+    WHERE clause fragment restricting id_column to history rows containing every gram
+
+    Returns:
+        (sql, params)
+    """
+    # One posting list per gram, intersected; each list is a range seek on the
+    # (field, gram, history_id) primary key and comes back sorted by history_id
+    postings = " INTERSECT ".join(
+        "SELECT history_id FROM DROP_REQUESTS_HISTORY_NGRAM WHERE field = ? AND gram = ?" for _ in grams
+    )
+    params = [value for gram in grams for value in (field, gram)]
+    return f"{id_column} IN ({postings})", params
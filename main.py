@@ -1,6 +1,6 @@
 from fastapi import FastAPI, HTTPException, Request, Form, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, Response
 from fastapi.templating import Jinja2Templates
 from typing import List
 import httpx
@@ -8,21 +8,34 @@ import os
 import json
 from datetime import datetime, timedelta, timezone
 import pytz
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 from pydantic import BaseModel
-import pandas as pd
 import base64
-import aioodbc
-import pyodbc
+try:
+    import aioodbc
+    import pyodbc
+except ImportError:  # only needed for STORAGE_BACKEND=azure
+    aioodbc = pyodbc = None
 from dotenv import load_dotenv
 from decimal import Decimal
 from fastapi.encoders import jsonable_encoder
-import numpy as np
 import asyncio
 import logging
+import sys
+import time
+from collections import OrderedDict
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 import atexit
+from erp_decoder import ErpTable, table_from_response, prepare_containers
+import schema_migrations
+from storage import (EXCLUDED_DELIVER_TO, HISTORY_COLUMNS, ActiveRequestChanges, HistoryFilters, RequestRecord,
+                     StorageBackend, StorageBusyError)
+from sqlite_storage import SQLiteStorage
+from active_requests_view import ActiveRequestsView
+from websocket_hub import BroadcastHub
+from broadcast_bus import BroadcastBus, LocalBus, UnixSocketBus, unix_bus_supported
+from history_search import FIELD_PART_NO, FIELD_SERIAL_NO, candidate_filter_sql, ngram_rows_for_history, search_trigrams
 
 load_dotenv()
 
@@ -129,6 +142,21 @@ def get_shift_from_czech_datetime(dt):
     else:  # hour >= 22 or hour < 6
         return 'Night'
 
+def czech_shift_sql(column: str) -> str:
+    """
+    T-SQL expression equivalent to get_shift_from_czech_datetime for a UTC DATETIME column
+    'Central Europe Standard Time' is the Windows time zone covering Prague (CET/CEST)
+    (parity across DST transitions is checked by test_shift_sql_parity.py)
+    """
+    czech_hour = f"DATEPART(hour, {column} AT TIME ZONE 'UTC' AT TIME ZONE 'Central Europe Standard Time')"
+    return (
+        f"CASE WHEN {column} IS NULL THEN 'Unknown' "
+        f"WHEN {czech_hour} < 6 THEN 'Night' "
+        f"WHEN {czech_hour} < 14 THEN 'Morning' "
+        f"WHEN {czech_hour} < 22 THEN 'Evening' "
+        f"ELSE 'Night' END"
+    )
+
 # Initialize scheduler
 # COMMENTED OUT - Auto cleanup disabled
 # scheduler = AsyncIOScheduler()
@@ -139,24 +167,22 @@ async def startup_event():
     """Start the background scheduler when the application starts"""
     logger.info("🚀 Starting application startup...")
     
-    # Initialize database connection and create tables
+    # Open the storage backend (Azure SQL: connectivity and schema version check)
     try:
-        conn = await get_db_connection()
-        try:
-            cursor = await conn.cursor()
-            await cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES")
-            row = await cursor.fetchone()
-            table_count = row[0] if row else 0
-            logger.info(f"Connected successfully! Database has {table_count} tables.")
-        finally:
-            await release_db_connection(conn)
-        
-        # Create history table on startup
-        await create_history_table()
-        
+        await storage.start()
     except Exception as e:
         logger.error(f"Database connection error during startup: {e}")
 
+    # Load the active requests view and keep it following the change log
+    global active_requests_task
+    active_requests_task = asyncio.ensure_future(active_requests.run(AppConfig.REQUESTS_VIEW_REFRESH_SECONDS))
+
+    # Join the other workers on the broadcast bus (the first one up runs the broker)
+    await broadcast_bus.start(on_bus_message, on_bus_reconnect)
+
+    # Warm the production locations cache in the background so the first page render does not wait on Plex
+    asyncio.ensure_future(prod_locations_cache.refresh())
+
     # COMMENTED OUT - Auto cleanup disabled
     # logger.info("🚀 Starting automated cleanup scheduler...")
     #
@@ -212,40 +238,150 @@ async def shutdown_event():
         await http_client.aclose()
         logger.info("✅ HTTP client closed")
     
-    # Close database connection pool
-    global connection_pool
-    if connection_pool:
-        connection_pool.close()
-        await connection_pool.wait_closed()
-        logger.info("✅ Database connection pool closed")
+    # Close WebSocket clients (they reconnect to another worker / after the restart)
+    await websocket_hub.close()
+    await broadcast_bus.close()
+
+    # Stop refreshing the active requests view before its connections go away
+    if active_requests_task:
+        active_requests_task.cancel()
+
+    # Close the database connection pool / SQLite connection
+    await storage.close()
+    logger.info(f"✅ Storage backend closed ({storage.name})")
     
     logger.info("✅ Application shutdown complete")
 
 
-# global counter
-req_id = 0
 
 # Notification function for cleanup results
 async def send_cleanup_notification(notification_data):
-    """Send cleanup notifications to all connected WebSocket clients"""
-    if active_connections:
-        message = json.dumps(notification_data)
-        disconnected_connections = []
-        
-        for connection in active_connections:
+    """Send cleanup notifications to all connected WebSocket clients, in every worker"""
+    websocket_hub.broadcast(notification_data)
+    await publish_to_bus('message', notification_data)
+
+async def publish_to_bus(kind: str, payload: Any):
+    """
+    Hand a message this worker already delivered to its own clients to the other workers
+    kind: 'request_event' (payload is the event without seq), 'message' (sent to clients as is)
+    or 'resync' (the other workers' clients reload, see on_bus_reconnect)
+    """
+    try:
+        await broadcast_bus.publish(json.dumps({
+            'kind': kind,
+            'view_version': active_requests.version,
+            'payload': payload
+        }))
+    except Exception as e:
+        logger.error(f"❌ Error publishing {kind} on the broadcast bus: {e}")
+
+async def on_bus_message(text: str):
+    """Deliver a message published by another worker to this worker's clients"""
+    envelope = json.loads(text)
+    if envelope['kind'] == 'request_event':
+        # Clients reloading /api/requests on this event must find the change in this worker's view too
+        if envelope['view_version'] is not None and (active_requests.version or 0) < envelope['view_version']:
             try:
-                await connection.send_text(message)
+                await active_requests.refresh()
             except Exception as e:
-                # Connection is dead, mark for removal
-                disconnected_connections.append(connection)
-                logger.warning(f"Removing dead WebSocket connection: {e}")
-        
-        # Remove dead connections
-        for dead_conn in disconnected_connections:
-            try:
-                active_connections.remove(dead_conn)
-            except ValueError:
-                pass  # Already removed
+                logger.warning(f"⚠️ Active requests view refresh for a bus event failed: {e}")
+        deliver_request_event(envelope['payload'])
+    elif envelope['kind'] == 'resync':
+        await resync_clients()
+    else:
+        websocket_hub.broadcast(envelope['payload'])
+
+async def resync_clients():
+    """Make this worker's clients reload /api/requests (after events may have been lost)"""
+    try:
+        await active_requests.refresh()
+    except Exception as e:
+        logger.warning(f"⚠️ Active requests view refresh for a resync failed: {e}")
+    websocket_hub.broadcast({'type': 'resync', 'seq': request_event_seq})
+
+# Messages this worker could not publish (bus 'publish_dropped') that the other workers were told about
+bus_publish_dropped_announced = 0
+
+async def on_bus_reconnect():
+    """
+    This worker was cut off from the bus: its clients may have missed the other workers' events,
+    and the other workers' clients this worker's events if it published any meanwhile
+    """
+    global bus_publish_dropped_announced
+    await resync_clients()
+    dropped = broadcast_bus.get_stats().get('publish_dropped', 0)
+    if dropped > bus_publish_dropped_announced:
+        bus_publish_dropped_announced = dropped
+        await publish_to_bus('resync', None)
+
+# --- Live Request Updates ---
+
+# Sequence number of the last request event this worker sent to its clients (events from every worker
+# are numbered by the worker delivering them); clients that see a gap re-read /api/requests
+request_event_seq = 0
+
+def format_request_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Active request as /api/requests and the request events send it"""
+    formatted = {}
+    for column, value in row.items():
+        if isinstance(value, datetime):
+            formatted[column] = value.isoformat()
+        elif isinstance(value, Decimal):
+            formatted[column] = float(value)
+        else:
+            formatted[column] = value
+    return formatted
+
+def new_request_row(req_id: int, part_no: str, deliver_to: str, req_time: datetime, record: "RequestRecord") -> Dict[str, Any]:
+    """The DROP_REQUESTS row just inserted for record, in /api/requests format"""
+    return format_request_row({
+        'req_id': req_id,
+        'serial_no': record.serial_no,
+        'part_no': part_no,
+        'revision': record.revision,
+        'quantity': float(record.quantity) if record.quantity is not None else None,
+        'location': record.location,
+        'deliver_to': deliver_to,
+        'req_time': req_time,
+        'master_unit_no': record.master_unit_no
+    })
+
+def deliver_request_event(event: Dict[str, Any]):
+    """
+    Queue a request event for this worker's clients with the next 'seq'; numbering and queueing
+    happen without an await in between, so every connection gets events in sequence order
+    """
+    global request_event_seq
+    request_event_seq += 1
+    websocket_hub.broadcast({**event, 'seq': request_event_seq})
+
+async def publish_request_event(event_type: str, **fields):
+    """
+    Send an active request delta to the WebSocket clients of every worker
+    Event types: request_added / master_unit_requested (with the new rows in 'requests'),
+    request_fulfilled / request_deleted (with 'serial_nos'). Failures are logged, never raised:
+    the change is committed and clients catch up on their next resync.
+    The active requests view is refreshed first, so a client reloading on the event already gets the change.
+    """
+    try:
+        await active_requests.refresh()
+    except Exception as e:
+        logger.warning(f"⚠️ Active requests view refresh after {event_type} failed: {e}")
+    event = {'type': event_type, **fields}
+    try:
+        deliver_request_event(event)
+    except Exception as e:
+        logger.error(f"❌ Error publishing {event_type} event: {e}")
+    await publish_to_bus('request_event', event)
+
+async def publish_requests_removed(moved: List[Dict[str, Any]], fulfillment_type: str):
+    """request_deleted for manual deletes, request_fulfilled for cleanups"""
+    if moved:
+        await publish_request_event(
+            'request_deleted' if fulfillment_type == 'manual_delete' else 'request_fulfilled',
+            serial_nos=[row['serial_no'] for row in moved],
+            fulfillment_type=fulfillment_type
+        )
 
 # your existing routes...
 
@@ -256,16 +392,135 @@ if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=port, log_level="info")
 
 
-# Validate required environment variables
-required_vars = ['AZURE_SQL_SERVER', 'AZURE_SQL_DATABASE', 'AZURE_SQL_USERNAME', 'AZURE_SQL_PASSWORD']
-missing_vars = [var for var in required_vars if not os.getenv(var)]
-
-if missing_vars:
-    raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
-
 # Connection pool for async database operations
 connection_pool = None
 
+# Upper bounds (ms) of the acquire wait histogram buckets
+POOL_ACQUIRE_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# Frames skipped when attributing a connection to the code that acquired it
+POOL_INTERNAL_FRAMES = {'acquire', 'get_db_connection', 'release', 'release_db_connection'}
+
+class InstrumentedPool:
+    """
+    Wraps the aioodbc pool and records how it is used: acquire wait time histogram,
+    in-use / idle / waiting gauges, acquire timeouts, connections held longer than
+    hold_warning_seconds (with the call site that acquired them) and releases of
+    connections this pool did not hand out. Everything else is delegated to the pool.
+    """
+
+    def __init__(self, pool, acquire_timeout: float, hold_warning_seconds: float):
+        self._pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.hold_warning_seconds = hold_warning_seconds
+        self._held: Dict[int, Dict[str, Any]] = {}
+        self._bucket_counts = [0] * (len(POOL_ACQUIRE_BUCKETS_MS) + 1)
+        self._recent_long_holds: List[Dict[str, Any]] = []
+        self.acquires = 0
+        self.acquire_wait_ms_sum = 0.0
+        self.acquire_wait_ms_max = 0.0
+        self.acquire_timeouts = 0
+        self.acquire_errors = 0
+        self.waiting = 0
+        self.max_in_use = 0
+        self.releases = 0
+        self.long_holds = 0
+        self.release_without_acquire = 0
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    @staticmethod
+    def _call_site() -> str:
+        frame = sys._getframe(1)
+        while frame is not None and frame.f_code.co_name in POOL_INTERNAL_FRAMES | {'_call_site'}:
+            frame = frame.f_back
+        if frame is None:
+            return 'unknown'
+        return f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+
+    async def acquire(self):
+        call_site = self._call_site()
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            conn = await asyncio.wait_for(self._pool.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.acquire_timeouts += 1
+            logger.warning(f"⚠️ Timed out after {self.acquire_timeout}s waiting for a database connection "
+                           f"({call_site}, {len(self._held)} in use)")
+            raise
+        except Exception:
+            self.acquire_errors += 1
+            raise
+        finally:
+            self.waiting -= 1
+
+        wait_ms = (time.perf_counter() - started) * 1000
+        self.acquires += 1
+        self.acquire_wait_ms_sum += wait_ms
+        self.acquire_wait_ms_max = max(self.acquire_wait_ms_max, wait_ms)
+        bucket = next((i for i, bound in enumerate(POOL_ACQUIRE_BUCKETS_MS) if wait_ms <= bound), len(POOL_ACQUIRE_BUCKETS_MS))
+        self._bucket_counts[bucket] += 1
+
+        self._held[id(conn)] = {'acquired_at': time.monotonic(), 'call_site': call_site}
+        self.max_in_use = max(self.max_in_use, len(self._held))
+        return conn
+
+    async def release(self, conn):
+        held = self._held.pop(id(conn), None)
+        if held is None:
+            # Handing it to the pool again would put the same connection in the free list twice
+            self.release_without_acquire += 1
+            logger.error(f"❌ Database connection released without a matching acquire ({self._call_site()})")
+            return
+
+        self.releases += 1
+        held_seconds = time.monotonic() - held['acquired_at']
+        if held_seconds > self.hold_warning_seconds:
+            self.long_holds += 1
+            self._recent_long_holds.append({
+                'call_site': held['call_site'],
+                'held_seconds': round(held_seconds, 2),
+                'released_at': datetime.now().isoformat()
+            })
+            del self._recent_long_holds[:-20]
+            logger.warning(f"⚠️ Database connection held for {held_seconds:.1f}s by {held['call_site']}")
+        await self._pool.release(conn)
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        holders = sorted(
+            ({'call_site': held['call_site'], 'held_seconds': round(now - held['acquired_at'], 2)}
+             for held in self._held.values()),
+            key=lambda holder: holder['held_seconds'], reverse=True
+        )
+        histogram = {f"le_{bound}ms": count for bound, count in zip(POOL_ACQUIRE_BUCKETS_MS, self._bucket_counts)}
+        histogram['gt_10000ms'] = self._bucket_counts[-1]
+        return {
+            'size': self._pool.size,
+            'max_size': self._pool.maxsize,
+            'in_use': len(self._held),
+            'idle': self._pool.freesize,
+            'waiting': self.waiting,
+            'max_in_use': self.max_in_use,
+            'acquires': self.acquires,
+            'releases': self.releases,
+            'acquire_timeouts': self.acquire_timeouts,
+            'acquire_errors': self.acquire_errors,
+            'release_without_acquire': self.release_without_acquire,
+            'acquire_wait_ms': {
+                'avg': round(self.acquire_wait_ms_sum / self.acquires, 2) if self.acquires else None,
+                'max': round(self.acquire_wait_ms_max, 2),
+                'histogram': histogram
+            },
+            'hold_warning_seconds': self.hold_warning_seconds,
+            'long_holds': self.long_holds,
+            'held_too_long': [holder for holder in holders if holder['held_seconds'] > self.hold_warning_seconds],
+            'recent_long_holds': list(reversed(self._recent_long_holds)),
+            'holders': holders
+        }
+
 async def get_db_connection():
     """Get an async database connection from the pool with retry logic"""
     global connection_pool
@@ -282,12 +537,17 @@ async def get_db_connection():
             Command Timeout={AppConfig.DB_COMMAND_TIMEOUT};
         '''
         try:
-            connection_pool = await aioodbc.create_pool(
+            pool = await aioodbc.create_pool(
                 dsn=connection_string,
                 minsize=AppConfig.DB_POOL_MIN_SIZE,
                 maxsize=AppConfig.DB_POOL_MAX_SIZE,
                 pool_recycle=AppConfig.DB_POOL_RECYCLE
             )
+            connection_pool = InstrumentedPool(
+                pool,
+                acquire_timeout=AppConfig.DB_POOL_ACQUIRE_TIMEOUT,
+                hold_warning_seconds=AppConfig.DB_POOL_HOLD_WARNING_SECONDS
+            )
             logger.info("✅ Database connection pool created successfully")
         except Exception as e:
             logger.error(f"❌ Failed to create database connection pool: {e}")
@@ -298,6 +558,10 @@ async def get_db_connection():
     for attempt in range(max_retries):
         try:
             return await connection_pool.acquire()
+        except asyncio.TimeoutError:
+            # The pool stayed exhausted for DB_POOL_ACQUIRE_TIMEOUT; retrying would only queue again
+            logger.error(f"❌ No database connection available within {connection_pool.acquire_timeout}s")
+            raise
         except Exception as e:
             if attempt == max_retries - 1:
                 logger.error(f"❌ Failed to acquire database connection after {max_retries} attempts: {e}")
@@ -335,65 +599,20 @@ class AzureSQLConnection:
 
 # --- Database Setup Functions ---
 
-async def create_history_table():
-    """Create DROP_REQUESTS_HISTORY table if it doesn't exist"""
-    create_table_sql = """
-    IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'DROP_REQUESTS_HISTORY')
-    BEGIN
-        CREATE TABLE DROP_REQUESTS_HISTORY (
-            history_id INT IDENTITY(1,1) PRIMARY KEY,
-            req_id INT,
-            serial_no NVARCHAR(255),
-            part_no NVARCHAR(255),
-            revision NVARCHAR(50),
-            quantity DECIMAL(10,2),
-            location NVARCHAR(255),
-            deliver_to NVARCHAR(255),
-            req_time DATETIME,
-            fulfilled_time DATETIME,
-            fulfillment_duration_minutes INT,
-            fulfillment_type NVARCHAR(50),
-            current_location NVARCHAR(255)
-        );
-
-        -- Create indexes for better performance
-        CREATE INDEX IX_DROP_REQUESTS_HISTORY_serial_no ON DROP_REQUESTS_HISTORY(serial_no);
-        CREATE INDEX IX_DROP_REQUESTS_HISTORY_part_no ON DROP_REQUESTS_HISTORY(part_no);
-        CREATE INDEX IX_DROP_REQUESTS_HISTORY_req_time ON DROP_REQUESTS_HISTORY(req_time);
-        CREATE INDEX IX_DROP_REQUESTS_HISTORY_fulfilled_time ON DROP_REQUESTS_HISTORY(fulfilled_time);
-
-        PRINT 'DROP_REQUESTS_HISTORY table and indexes created successfully.';
-    END
-    ELSE
-    BEGIN
-        PRINT 'DROP_REQUESTS_HISTORY table already exists.';
-    END
-
-    -- Add master_unit_no column if it doesn't exist (for both DROP_REQUESTS and DROP_REQUESTS_HISTORY)
-    IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'DROP_REQUESTS' AND COLUMN_NAME = 'master_unit_no')
-    BEGIN
-        ALTER TABLE DROP_REQUESTS ADD master_unit_no NVARCHAR(255);
-        PRINT 'Added master_unit_no column to DROP_REQUESTS table.';
-    END
-
-    IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'DROP_REQUESTS_HISTORY' AND COLUMN_NAME = 'master_unit_no')
-    BEGIN
-        ALTER TABLE DROP_REQUESTS_HISTORY ADD master_unit_no NVARCHAR(255);
-        PRINT 'Added master_unit_no column to DROP_REQUESTS_HISTORY table.';
-    END
-    """
-    
+async def run_schema_migrations(wait_seconds: float = 0) -> dict:
+    """Apply pending migrations from migrations/ (see schema_migrations.py); skipped if another process holds the lock"""
+    conn = await get_db_connection()
     try:
-        conn = await get_db_connection()
-        try:
-            cursor = await conn.cursor()
-            await cursor.execute(create_table_sql)
-            await conn.commit()
-            logger.info("✅ DROP_REQUESTS_HISTORY table setup completed")
-        finally:
-            await release_db_connection(conn)
-    except Exception as e:
-        logger.error(f"❌ Error creating DROP_REQUESTS_HISTORY table: {e}")
+        result = await schema_migrations.apply_pending_migrations(conn, wait_seconds=wait_seconds)
+    finally:
+        await release_db_connection(conn)
+
+    if result['status'] == 'applied':
+        logger.info(f"✅ Applied schema migrations {', '.join(result['applied'])} (now at version {result['current_version']})")
+        invalidate_history_caches('schema_migration')
+    elif result['status'] == 'skipped':
+        logger.info("⏭️ Schema migrations are being applied by another process, skipping")
+    return result
 
 # Global HTTP client for async requests
 http_client = None
@@ -424,12 +643,21 @@ async def get_http_client():
 class AppConfig:
     """Centralized configuration management for the application"""
 
+    # Storage settings: 'azure' (Azure SQL via aioodbc) or 'sqlite' (embedded, see sqlite_storage.py)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'azure').lower()
+    SQLITE_PATH = os.getenv('SQLITE_PATH', 'drop_list.db')
+
     # Database settings
     DB_CONNECTION_TIMEOUT = int(os.getenv('DB_CONNECTION_TIMEOUT', '120'))
     DB_COMMAND_TIMEOUT = int(os.getenv('DB_COMMAND_TIMEOUT', '60'))
     DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '5'))
     DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '25'))
     DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '3600'))
+    DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', '30'))
+    # Connections held longer than this are logged and reported by /api/metrics/db-pool
+    DB_POOL_HOLD_WARNING_SECONDS = float(os.getenv('DB_POOL_HOLD_WARNING_SECONDS', '10'))
+    # Apply pending migrations from worker startup (normally done once by "manage.py migrate" before the workers start)
+    MIGRATE_ON_STARTUP = os.getenv('MIGRATE_ON_STARTUP', 'false').lower() == 'true'
 
     # HTTP client settings
     HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10.0'))
@@ -447,6 +675,48 @@ class AppConfig:
     CLEANUP_INTERVAL_MINUTES = int(os.getenv('CLEANUP_INTERVAL_MINUTES', '1'))
     CLEANUP_SAFETY_LIMIT = int(os.getenv('CLEANUP_SAFETY_LIMIT', '10'))
     HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', '30'))
+    # History purges delete this many rows per transaction (below SQL Server's 5000-lock escalation threshold)
+    HISTORY_PURGE_BATCH_SIZE = int(os.getenv('HISTORY_PURGE_BATCH_SIZE', '2000'))
+    HISTORY_PURGE_PAUSE_SECONDS = float(os.getenv('HISTORY_PURGE_PAUSE_SECONDS', '0.5'))
+    HISTORY_COUNT_CACHE_SECONDS = int(os.getenv('HISTORY_COUNT_CACHE_SECONDS', '60'))
+    # 'rollup' or 'raw'; 'rollup' answers from raw history until the rollups have been backfilled
+    HISTORY_STATS_SOURCE = os.getenv('HISTORY_STATS_SOURCE', 'rollup')
+    # Runs the stats queries on up to 5 pooled connections at once instead of one after another
+    HISTORY_STATS_PARALLEL = os.getenv('HISTORY_STATS_PARALLEL', 'true').lower() == 'true'
+    # Pooled connections all parallel stats queries of a worker may hold together; concurrent
+    # dashboard loads queue for these instead of draining the pool (DB_POOL_MAX_SIZE)
+    HISTORY_STATS_MAX_CONNECTIONS = int(os.getenv('HISTORY_STATS_MAX_CONNECTIONS', '5'))
+    HISTORY_RESPONSE_CACHE_SECONDS = float(os.getenv('HISTORY_RESPONSE_CACHE_SECONDS', '30'))
+    HISTORY_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('HISTORY_RESPONSE_CACHE_MAX_ENTRIES', '256'))
+    # Use DROP_REQUESTS_HISTORY_NGRAM for serial_no/part_no searches; history older than the index is
+    # matched by LIKE alone until "manage.py backfill-ngrams" has run (see migration 0010)
+    HISTORY_NGRAM_SEARCH = os.getenv('HISTORY_NGRAM_SEARCH', 'true').lower() == 'true'
+    CLEANUP_MAX_CONCURRENCY = int(os.getenv('CLEANUP_MAX_CONCURRENCY', '8'))
+    CLEANUP_RATE_PER_SECOND = float(os.getenv('CLEANUP_RATE_PER_SECOND', '10.0'))
+    CLEANUP_RATE_BURST = int(os.getenv('CLEANUP_RATE_BURST', '10'))
+
+    # Live update settings: driver pages re-check /api/requests (ETag, usually 304) this often besides
+    # applying WebSocket events - a safety net for events lost while a worker was cut off from the bus
+    REQUESTS_FALLBACK_POLL_SECONDS = float(os.getenv('REQUESTS_FALLBACK_POLL_SECONDS', '5'))
+
+    # Cross-worker bus for WebSocket messages (see broadcast_bus.py): 'unix' (broker on a Unix domain
+    # socket, shared by all workers started from the same directory) or 'local' (single worker)
+    BROADCAST_BUS = os.getenv('BROADCAST_BUS', 'unix').lower()
+    BROADCAST_BUS_SOCKET = os.getenv('BROADCAST_BUS_SOCKET', 'drop_list_bus.sock')
+
+    # Active requests view (per worker, see active_requests_view.py): background refresh interval and
+    # the oldest data a read may be answered from before it refreshes itself
+    REQUESTS_VIEW_REFRESH_SECONDS = float(os.getenv('REQUESTS_VIEW_REFRESH_SECONDS', '1'))
+    REQUESTS_VIEW_MAX_LAG_SECONDS = float(os.getenv('REQUESTS_VIEW_MAX_LAG_SECONDS', '5'))
+
+    # WebSocket fan-out (see websocket_hub.py): messages queued per connection before it is a slow
+    # consumer, what happens to slow consumers ('coalesce' or 'disconnect'), and the longest a send may take
+    WS_SEND_QUEUE_SIZE = int(os.getenv('WS_SEND_QUEUE_SIZE', '100'))
+    WS_SLOW_CONSUMER_POLICY = os.getenv('WS_SLOW_CONSUMER_POLICY', 'coalesce').lower()
+    WS_SEND_TIMEOUT_SECONDS = float(os.getenv('WS_SEND_TIMEOUT_SECONDS', '10'))
+
+    # ERP cache settings
+    PROD_LOCATIONS_TTL_SECONDS = int(os.getenv('PROD_LOCATIONS_TTL_SECONDS', '3600'))
 
     # Logging settings
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -460,11 +730,21 @@ class AppConfig:
             # Temporarily use the original password for testing
             cls.PLEX_PASSWORD = "09c11ed-40b3-4"
 
+        if cls.STORAGE_BACKEND not in ('azure', 'sqlite'):
+            raise ValueError(f"STORAGE_BACKEND must be 'azure' or 'sqlite', got {cls.STORAGE_BACKEND!r}")
+
+        if cls.STORAGE_BACKEND == 'azure':
+            # Validate required environment variables
+            required_vars = ['AZURE_SQL_SERVER', 'AZURE_SQL_DATABASE', 'AZURE_SQL_USERNAME', 'AZURE_SQL_PASSWORD']
+            missing_vars = [var for var in required_vars if not os.getenv(var)]
+            if missing_vars:
+                raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
+
         if cls.DB_POOL_MAX_SIZE < cls.DB_POOL_MIN_SIZE:
             logger.error("DB_POOL_MAX_SIZE must be >= DB_POOL_MIN_SIZE")
             raise ValueError("Invalid database pool configuration")
 
-        logger.info(f"✅ Configuration validated - ERP: {cls.ERP_API_BASE}")
+        logger.info(f"✅ Configuration validated - ERP: {cls.ERP_API_BASE}, storage: {cls.STORAGE_BACKEND}")
         logger.info(f"✅ Authentication configured - Username: {cls.PLEX_USERNAME}")
 
 # Initialize and validate configuration
@@ -502,10 +782,119 @@ class SerialNoRequest(BaseModel):
     part_no: str
     serial_no: str
 
+class BulkRequestItem(BaseModel):
+    serial_no: str
+    revision: Optional[str] = None
+    quantity: Optional[float] = None
+    location: Optional[str] = None
+    master_unit_no: Optional[str] = None
+
+class BulkSerialRequest(BaseModel):
+    part_no: str
+    workcenter: str
+    req_time: Optional[str] = None
+    serials: List[BulkRequestItem]
+
+# --- Active Request Lookups ---
+
+# SQL Server allows 2100 parameters per statement; stay well below it
+REQUESTED_SERIALS_BATCH_SIZE = 1000
+
+async def get_requested_serials(serial_nos: List[Any]) -> set:
+    """
+    Return the subset of serial_nos that have an active request in DROP_REQUESTS
+    Only the given serials are looked up (batched IN queries on IX_DROP_REQUESTS_serial_no),
+    so the cost follows the size of the ERP result, not the size of the active list
+    """
+    unique_serials = list(dict.fromkeys(str(s) for s in serial_nos if s is not None))
+    if not unique_serials:
+        return set()
+
+    requested = set()
+    conn = await get_db_connection()
+    try:
+        cursor = await conn.cursor()
+        for i in range(0, len(unique_serials), REQUESTED_SERIALS_BATCH_SIZE):
+            batch = unique_serials[i:i + REQUESTED_SERIALS_BATCH_SIZE]
+            placeholders = ", ".join("?" for _ in batch)
+            await cursor.execute(f"SELECT serial_no FROM DROP_REQUESTS WHERE serial_no IN ({placeholders})", batch)
+            requested.update(row[0] for row in await cursor.fetchall())
+    finally:
+        await release_db_connection(conn)
+    return requested
+
+# --- ERP Request Coalescing ---
+
+# Plex datasource ids used by the ERP client
+CONTAINER_BY_SERIAL_NO_ID = 4619
+CONTAINERS_BY_PART_NO_ID = 8566
+CONTAINERS_BY_MASTER_UNIT_ID = 4390
+MASTER_UNIT_KEY_ID = 233972
+PROD_LOCATIONS_ID = 18120
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical ERP calls into one upstream request.
+    Calls are keyed by datasource id and inputs; while a call is in flight every
+    other caller with the same key awaits the same task and shares its result.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self._stats: Dict[int, Dict[str, int]] = {}
+
+    @staticmethod
+    def make_key(datasource_id: int, inputs: Dict[str, Any]) -> tuple:
+        return (datasource_id, json.dumps(inputs, sort_keys=True, default=str))
+
+    async def run(self, datasource_id: int, inputs: Dict[str, Any], func):
+        """Run func() unless an identical call is already in flight, then share its result"""
+        key = self.make_key(datasource_id, inputs)
+        stats = self._stats.setdefault(datasource_id, {'calls': 0, 'upstream_calls': 0, 'coalesced_calls': 0})
+        stats['calls'] += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            stats['upstream_calls'] += 1
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+        else:
+            stats['coalesced_calls'] += 1
+
+        # Shield the shared task so one caller disconnecting does not cancel it for the others
+        result = await asyncio.shield(task)
+        return self._copy_result(result)
+
+    @staticmethod
+    def _copy_result(result):
+        # Every caller gets its own list of records so post-processing cannot leak between requests
+        if isinstance(result, list):
+            return [dict(item) if isinstance(item, dict) else item for item in result]
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        totals = {'calls': 0, 'upstream_calls': 0, 'coalesced_calls': 0}
+        for stats in self._stats.values():
+            for name in totals:
+                totals[name] += stats[name]
+        return {
+            **totals,
+            'in_flight': len(self._inflight),
+            'by_datasource': {str(ds_id): dict(stats) for ds_id, stats in self._stats.items()}
+        }
+
+erp_single_flight = SingleFlight()
+
 # --- ERP Client ---
 async def get_container_by_serial_no(serial_no: str) -> List[str]:
-    container_by_serial_no_id = 4619
-    url = f"{ERP_API_BASE}{container_by_serial_no_id}/execute"
+    inputs = {"Serial_No": serial_no}
+    return await erp_single_flight.run(
+        CONTAINER_BY_SERIAL_NO_ID, inputs, lambda: _get_container_by_serial_no(serial_no)
+    )
+
+async def _get_container_by_serial_no(serial_no: str) -> List[str]:
+    url = f"{ERP_API_BASE}{CONTAINER_BY_SERIAL_NO_ID}/execute"
     payload = {
         "inputs": {
             "Serial_No": serial_no
@@ -537,21 +926,44 @@ async def get_container_by_serial_no(serial_no: str) -> List[str]:
         return []
     
     try:
-        columns = response_data.get("tables")[0].get("columns", [])
-        rows = response_data.get("tables")[0].get("rows", [])
+        table = table_from_response(response_data)
     except (IndexError, TypeError, KeyError) as e:
         print(f"Failed to extract table data: {e}")
         print(f"Response structure: {response_data}")
         return []
     
-    df = pd.DataFrame(rows, columns=columns)
-    print("-----df-----", df)
-    return df.to_dict(orient="records")
+    return table.records()
 
 async def get_containers_by_part_no(part_no: str) -> List[str]:
     print(f"[get_containers_by_part_no] Starting search for part_no: {part_no}")
-    containers_by_part_no_id = 8566
-    url = f"{ERP_API_BASE}{containers_by_part_no_id}/execute"
+    table = await fetch_containers_by_part_no(part_no)
+    if table is None:
+        return []
+    
+    # Look up which of these serial numbers are already requested
+    existing_serials = None
+    try:
+        existing_serials = await active_requests.requested_serials(table.column('Serial_No'))
+    except Exception as e:
+        print(f"Error checking existing containers: {e}")
+    
+    # Sort, add isRequested instead of filtering, drop "J-B" locations and clean NaN/inf values
+    containers = prepare_containers(table, existing_serials)
+    print(f"[get_containers_by_part_no] {len(containers)} of {len(table.rows)} containers outside J-B locations")
+    return containers
+
+async def fetch_containers_by_part_no(part_no: str) -> Optional[ErpTable]:
+    """
+    Get the raw ERP containers table (every location) for a part number
+    Returns None if the ERP call failed, so callers can tell failure from "no containers"
+    """
+    inputs = {"Part_No": part_no}
+    return await erp_single_flight.run(
+        CONTAINERS_BY_PART_NO_ID, inputs, lambda: _fetch_containers_by_part_no(part_no)
+    )
+
+async def _fetch_containers_by_part_no(part_no: str) -> Optional[ErpTable]:
+    url = f"{ERP_API_BASE}{CONTAINERS_BY_PART_NO_ID}/execute"
     payload = {
         "inputs": {
             "Part_No": part_no
@@ -568,14 +980,14 @@ async def get_containers_by_part_no(part_no: str) -> List[str]:
             print(f"[get_containers_by_part_no] HTTP error: {response.status_code} - {response.text}")
             if response.status_code == 419:
                 print(f"[get_containers_by_part_no] Authentication failed - check PLEX credentials")
-            return []
+            return None
             
     except httpx.TimeoutException:
         print(f"[get_containers_by_part_no] Request timeout")
-        return []
+        return None
     except httpx.RequestError as e:
         print(f"[get_containers_by_part_no] Request error: {e}")
-        return []
+        return None
     
     try:
         response_data = response.json()
@@ -583,51 +995,28 @@ async def get_containers_by_part_no(part_no: str) -> List[str]:
     except (ValueError, json.JSONDecodeError) as e:
         print(f"[get_containers_by_part_no] Failed to parse JSON response: {e}")
         print(f"[get_containers_by_part_no] Response text: {response.text}")
-        return []
+        return None
     
     try:
-        columns = response_data.get("tables")[0].get("columns", [])
-        rows = response_data.get("tables")[0].get("rows", [])
-        print(f"[get_containers_by_part_no] Extracted {len(rows)} rows with {len(columns)} columns")
+        table = table_from_response(response_data)
+        print(f"[get_containers_by_part_no] Extracted {len(table.rows)} rows with {len(table.columns)} columns")
     except (IndexError, TypeError, KeyError) as e:
         print(f"[get_containers_by_part_no] Failed to extract table data: {e}")
         print(f"[get_containers_by_part_no] Response structure: {response_data}")
-        return []
-    
-    df = pd.DataFrame(rows, columns=columns)
-    df = df.sort_values(by=["Add_Date", "Serial_No"], ascending=[True, True])
-    
-    # Get existing serial numbers from database
-    try:
-        conn = await get_db_connection()
-        try:
-            cursor = await conn.cursor()
-            await cursor.execute("SELECT serial_no FROM DROP_REQUESTS")
-            rows = await cursor.fetchall()
-            existing_serials = {row[0] for row in rows}
-            
-            # Add isRequested column instead of filtering
-            df['isRequested'] = df['Serial_No'].isin(existing_serials)
-        finally:
-            await release_db_connection(conn)
-            
-    except Exception as e:
-        print(f"Error checking existing containers: {e}")
-        df['isRequested'] = False
-    
-    print("[get_containers_by_part_no] df:", df[['Serial_No', 'Part_No', 'Revision', 'Quantity', 'Location', 'isRequested']])
-    
-    # Filter out containers from locations starting with "J-B"
-    df = df[~df['Location'].str.startswith('J-B', na=False)]
+        return None
     
-    df = df.replace([np.inf, -np.inf], np.nan).fillna(0)
-    return df.to_dict(orient="records")
+    return table
 
 
 async def get_containers_by_master_unit(master_unit_key: str) -> List[str]:
+    inputs = {"Master_Unit_Key": master_unit_key}
+    return await erp_single_flight.run(
+        CONTAINERS_BY_MASTER_UNIT_ID, inputs, lambda: _get_containers_by_master_unit(master_unit_key)
+    )
+
+async def _get_containers_by_master_unit(master_unit_key: str) -> List[str]:
     print(f"[get_containers_by_master_unit] Starting search for master_unit: {master_unit_key}")
-    containers_by_master_unit_id = 4390
-    url = f"{ERP_API_BASE}{containers_by_master_unit_id}/execute"
+    url = f"{ERP_API_BASE}{CONTAINERS_BY_MASTER_UNIT_ID}/execute"
     payload = {
         "inputs": {
             "Master_Unit_Key": master_unit_key
@@ -661,49 +1050,35 @@ async def get_containers_by_master_unit(master_unit_key: str) -> List[str]:
     
     print("-----response_data-----", response_data)
     try:
-        columns = response_data.get("tables")[0].get("columns", [])
-        rows = response_data.get("tables")[0].get("rows", [])
-        print(f"[get_containers_by_master_unit] Extracted {len(rows)} rows with {len(columns)} columns")
+        table = table_from_response(response_data)
+        print(f"[get_containers_by_master_unit] Extracted {len(table.rows)} rows with {len(table.columns)} columns")
     except (IndexError, TypeError, KeyError) as e:
         print(f"[get_containers_by_master_unit] Failed to extract table data: {e}")
         print(f"[get_containers_by_master_unit] Response structure: {response_data}")
         return []
     
-    df = pd.DataFrame(rows, columns=columns)
-    df = df.sort_values(by=["Add_Date", "Serial_No"], ascending=[True, True])
-    
-    # Get existing serial numbers from database to mark as requested
+    # Look up which of these serial numbers are already requested
+    existing_serials = None
     try:
-        conn = await get_db_connection()
-        try:
-            cursor = await conn.cursor()
-            await cursor.execute("SELECT serial_no FROM DROP_REQUESTS")
-            rows = await cursor.fetchall()
-            existing_serials = {row[0] for row in rows}
-            
-            # Add isRequested column
-            df['isRequested'] = df['Serial_No'].isin(existing_serials)
-        finally:
-            await release_db_connection(conn)
-            
+        existing_serials = await active_requests.requested_serials(table.column('Serial_No'))
     except Exception as e:
         print(f"Error checking existing containers: {e}")
-        df['isRequested'] = False
-    
-    print("[get_containers_by_master_unit] df:", df[['Serial_No', 'Part_No', 'Quantity', 'Location', 'isRequested']])
     
-    # Filter out containers from locations starting with "J-B"
-    df = df[~df['Location'].str.startswith('J-B', na=False)]
-    
-    df = df.replace([np.inf, -np.inf], np.nan).fillna(0)
-    print("-----df-----", df)
-    return df.to_dict(orient="records")
+    # Sort, add isRequested, drop "J-B" locations and clean NaN/inf values
+    containers = prepare_containers(table, existing_serials)
+    print(f"[get_containers_by_master_unit] {len(containers)} of {len(table.rows)} containers outside J-B locations")
+    return containers
 
 async def master_unit_key_to_no(master_unit_key: str) -> str:
+    inputs = {"Master_Unit_No": master_unit_key}
+    return await erp_single_flight.run(
+        MASTER_UNIT_KEY_ID, inputs, lambda: _master_unit_key_to_no(master_unit_key)
+    )
+
+async def _master_unit_key_to_no(master_unit_key: str) -> str:
     logger.info(f"[master_unit_key_to_no] Starting search for master_unit: {master_unit_key}")
     # Datasource ID for master unit lookup from Plex
-    containers_by_master_unit_id = 233972
-    url = f"{ERP_API_BASE}{containers_by_master_unit_id}/execute"
+    url = f"{ERP_API_BASE}{MASTER_UNIT_KEY_ID}/execute"
     payload = {
         "inputs": {
             "Master_Unit_No": master_unit_key
@@ -757,9 +1132,16 @@ async def master_unit_key_to_no(master_unit_key: str) -> str:
 
 
 async def get_prod_locations() -> List[str]:
-    """Get production locations from ERP API"""
-    prod_locations_id = 18120
-    url = f"{ERP_API_BASE}{prod_locations_id}/execute"
+    """Get production locations, served from the process-level stale-while-revalidate cache"""
+    return await prod_locations_cache.get()
+
+async def fetch_prod_locations() -> List[str]:
+    """Get production locations from ERP API (bypasses the cache)"""
+    inputs = {"Location_Type": "Production Storage_IN"}
+    return await erp_single_flight.run(PROD_LOCATIONS_ID, inputs, _get_prod_locations)
+
+async def _get_prod_locations() -> List[str]:
+    url = f"{ERP_API_BASE}{PROD_LOCATIONS_ID}/execute"
     payload = {
         "inputs": {
             "Location_Type": "Production Storage_IN"
@@ -796,11 +1178,7 @@ async def get_prod_locations() -> List[str]:
             logger.error(f"❌ No tables in production locations response")
             return []
             
-        columns = tables[0].get("columns", [])
-        rows = tables[0].get("rows", [])
-        
-        df = pd.DataFrame(rows, columns=columns)
-        locations = df['Location'].tolist()
+        locations = ErpTable(list(tables[0].get("columns", [])), tables[0].get("rows", [])).column('Location')
         
         logger.info(f"🏭 Found {len(locations)} production locations")
         
@@ -810,101 +1188,1363 @@ async def get_prod_locations() -> List[str]:
         logger.error(f"❌ Production locations processing error: {e}")
         return []
 
-# --- History Logging Functions ---
+class StaleWhileRevalidateCache:
+    """
+    Process-level cache for slowly changing ERP lists.
+    Fresh values are served directly, stale values are served while a background
+    refresh runs, and a failed or empty refresh keeps the last good value.
+    Only a cold cache makes the caller wait for the ERP.
+    """
+
+    def __init__(self, name: str, fetch, ttl_seconds: int):
+        self.name = name
+        self._fetch = fetch
+        self.ttl_seconds = ttl_seconds
+        self._value: Optional[List[Any]] = None
+        self._fetched_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.last_error: Optional[str] = None
+        self.last_error_time: Optional[str] = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_count = 0
+        self.refresh_failures = 0
+
+    def _is_fresh(self) -> bool:
+        if self._fetched_at is None:
+            return False
+        return (time.monotonic() - self._fetched_at) < self.ttl_seconds
+
+    async def get(self) -> List[Any]:
+        if self._value is None:
+            # Cold cache - nothing to serve, wait for the first good value
+            self.misses += 1
+            await self.refresh()
+            return list(self._value) if self._value is not None else []
+
+        if self._is_fresh():
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+            self._start_background_refresh()
+        return list(self._value)
+
+    def _start_background_refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh())
+
+    async def refresh(self) -> bool:
+        """Refresh now, joining a refresh that is already running. Returns True on success."""
+        self._start_background_refresh()
+        return await asyncio.shield(self._refresh_task)
+
+    async def _refresh(self) -> bool:
+        self.refresh_count += 1
+        try:
+            value = await self._fetch()
+        except Exception as e:
+            value = None
+            self.last_error = str(e)
+        else:
+            if not value:
+                self.last_error = f"ERP returned no {self.name}"
+
+        if not value:
+            self.refresh_failures += 1
+            self.last_error_time = datetime.now().isoformat()
+            if self._value is not None:
+                logger.warning(f"⚠️ {self.name} refresh failed, serving last good value ({len(self._value)} entries)")
+            return False
+
+        self._value = list(value)
+        self._fetched_at = time.monotonic()
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'cached': self._value is not None,
+            'entries': len(self._value) if self._value is not None else 0,
+            'age_seconds': round(time.monotonic() - self._fetched_at, 1) if self._fetched_at is not None else None,
+            'ttl_seconds': self.ttl_seconds,
+            'fresh': self._is_fresh(),
+            'refreshing': self._refresh_task is not None and not self._refresh_task.done(),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'refresh_count': self.refresh_count,
+            'refresh_failures': self.refresh_failures,
+            'last_error': self.last_error,
+            'last_error_time': self.last_error_time
+        }
+
+prod_locations_cache = StaleWhileRevalidateCache(
+    'production locations', fetch_prod_locations, AppConfig.PROD_LOCATIONS_TTL_SECONDS
+)
+
+# --- History Rollups ---
+
+# Fulfillment duration buckets: (upper bound in minutes, rollup column prefix, label)
+PERFORMANCE_CATEGORIES = [
+    (60, 'fast', 'Fast (≤1 hour)'),
+    (480, 'medium', 'Medium (1-8 hours)'),
+    (1440, 'slow', 'Slow (8-24 hours)'),
+    (None, 'very_slow', 'Very Slow (>24 hours)')
+]
+
+ROLLUP_KEY_COLUMNS = ['rollup_date', 'shift', 'part_no', 'deliver_to', 'fulfillment_type']
+ROLLUP_SUM_COLUMNS = ['fulfilled_count', 'duration_count', 'duration_sum'] + [
+    f"{prefix}_{suffix}" for _, prefix, _ in PERFORMANCE_CATEGORIES for suffix in ('count', 'sum')
+]
+ROLLUP_COLUMNS = ROLLUP_KEY_COLUMNS + ROLLUP_SUM_COLUMNS + ['duration_min', 'duration_max']
+
+# Adds one delta row to DROP_REQUESTS_HISTORY_ROLLUP (HOLDLOCK keeps concurrent workers from inserting the same key twice)
+ROLLUP_MERGE_SQL = f"""
+    MERGE DROP_REQUESTS_HISTORY_ROLLUP WITH (HOLDLOCK) AS t
+    USING (SELECT {", ".join(f"? AS {column}" for column in ROLLUP_COLUMNS)}) AS s
+    ON {" AND ".join(f"t.{column} = s.{column}" for column in ROLLUP_KEY_COLUMNS)}
+    WHEN MATCHED THEN UPDATE SET
+        {", ".join(f"{column} = t.{column} + s.{column}" for column in ROLLUP_SUM_COLUMNS)},
+        duration_min = CASE WHEN t.duration_min IS NULL OR s.duration_min < t.duration_min THEN s.duration_min ELSE t.duration_min END,
+        duration_max = CASE WHEN t.duration_max IS NULL OR s.duration_max > t.duration_max THEN s.duration_max ELSE t.duration_max END
+    WHEN NOT MATCHED THEN
+        INSERT ({", ".join(ROLLUP_COLUMNS)})
+        VALUES ({", ".join(f"s.{column}" for column in ROLLUP_COLUMNS)});
+"""
+
+def performance_category(duration_minutes: Optional[int]) -> Optional[str]:
+    """
+    Rollup column prefix of the performance bucket a fulfillment duration falls into
+    None for an unknown (NULL) duration, which no bucket counts, just as AVG() skips it
+    """
+    if duration_minutes is None:
+        return None
+    for upper_bound, prefix, _ in PERFORMANCE_CATEGORIES:
+        if upper_bound is None or duration_minutes <= upper_bound:
+            return prefix
+
+def accumulate_history_rollups(rows, rollups: Optional[Dict[tuple, Dict[str, Any]]] = None) -> Dict[tuple, Dict[str, Any]]:
+    """
+    Aggregate history rows into rollup entries keyed by
+    (UTC date, Czech shift, part_no, deliver_to, fulfillment_type)
 
-async def log_request_to_history(req_id: int, serial_no: str, part_no: str, revision: str, quantity: float, 
-                          location: str, deliver_to: str, req_time: datetime, 
-                          current_location: str, fulfillment_type: str = 'auto_cleanup'):
+    Args:
+        rows: dicts with fulfilled_time, part_no, deliver_to, fulfillment_type and fulfillment_duration_minutes
+        rollups: existing entries to add to (a new dict when omitted)
+    """
+    rollups = {} if rollups is None else rollups
+    for row in rows:
+        fulfilled_time = row.get('fulfilled_time')
+        if fulfilled_time is None or row.get('deliver_to') is None:
+            continue
+
+        key = (
+            fulfilled_time.date(),
+            get_shift_from_czech_datetime(fulfilled_time),
+            row.get('part_no') or '',
+            row['deliver_to'],
+            row.get('fulfillment_type') or ''
+        )
+        entry = rollups.get(key)
+        if entry is None:
+            entry = dict.fromkeys(ROLLUP_SUM_COLUMNS, 0)
+            entry['duration_min'] = None
+            entry['duration_max'] = None
+            rollups[key] = entry
+
+        duration = row.get('fulfillment_duration_minutes')
+        entry['fulfilled_count'] += 1
+        if duration is not None:
+            category = performance_category(duration)
+            entry[f'{category}_count'] += 1
+            entry[f'{category}_sum'] += duration
+            entry['duration_count'] += 1
+            entry['duration_sum'] += duration
+            if entry['duration_min'] is None or duration < entry['duration_min']:
+                entry['duration_min'] = duration
+            if entry['duration_max'] is None or duration > entry['duration_max']:
+                entry['duration_max'] = duration
+    return rollups
+
+async def write_history_rollups(cursor, rollups: Dict[tuple, Dict[str, Any]]):
+    """
+    Merge rollup entries into DROP_REQUESTS_HISTORY_ROLLUP on the caller's cursor,
+    so they commit or roll back together with the history rows they describe
     """
-    Log a fulfilled request to the REQUESTS_HISTORY table
+    if not rollups:
+        return
+    # Fixed key order so concurrent writers take their locks in the same order
+    params = [
+        list(key) + [rollups[key][column] for column in ROLLUP_SUM_COLUMNS + ['duration_min', 'duration_max']]
+        for key in sorted(rollups)
+    ]
+    await cursor.executemany(ROLLUP_MERGE_SQL, params)
+
+def performance_category_sql(prefix: str, column: str = 'fulfillment_duration_minutes') -> str:
+    """T-SQL condition matching performance_category(...) == prefix (false for NULL durations)"""
+    lower_bound = None
+    for upper_bound, category_prefix, _ in PERFORMANCE_CATEGORIES:
+        if category_prefix == prefix:
+            if upper_bound is None:
+                return f"{column} > {lower_bound}"
+            if lower_bound is None:
+                return f"{column} <= {upper_bound}"
+            return f"{column} > {lower_bound} AND {column} <= {upper_bound}"
+        lower_bound = upper_bound
+    raise KeyError(prefix)
+
+# How long a worker trusts its copy of DROP_REQUESTS_HISTORY_BACKFILL before reading it again
+HISTORY_BACKFILL_STATE_TTL_SECONDS = 60
+_history_backfill_state: Dict[str, Any] = {'expires': 0.0, 'tasks': {}}
+
+async def get_history_backfill_state() -> Dict[str, Dict[str, Any]]:
+    """
+    {task: row} of DROP_REQUESTS_HISTORY_BACKFILL (migrations 0009, 0010), cached per worker;
+    empty before the migration, i.e. no backfill counts as completed
     """
+    if _history_backfill_state['expires'] > time.monotonic():
+        return _history_backfill_state['tasks']
+    conn = await get_db_connection()
     try:
-        # Store fulfilled time in UTC (database should store in UTC)
-        fulfilled_time = datetime.utcnow()
-        
-        # Ensure req_time is in UTC for calculation
-        if req_time.tzinfo is None:
-            # If req_time is naive, assume it's already UTC (which it should be from our storage)
-            req_time_utc = req_time
-        else:
-            # Convert to UTC for calculation
-            req_time_utc = req_time.astimezone(pytz.UTC).replace(tzinfo=None)
-            
-        # Calculate fulfillment duration in minutes (should be positive)
-        duration_minutes = int((fulfilled_time - req_time_utc).total_seconds() / 60)
-        
-        # Log timing info for debugging
-        logger.info(f"History logging: req_time={req_time_utc}, fulfilled_time={fulfilled_time}, duration={duration_minutes}min")
-        
-        conn = await get_db_connection()
+        cursor = await conn.cursor()
+        await cursor.execute("""
+            IF OBJECT_ID('dbo.DROP_REQUESTS_HISTORY_BACKFILL', 'U') IS NOT NULL
+                SELECT * FROM DROP_REQUESTS_HISTORY_BACKFILL
+        """)
+        tasks = {}
+        if cursor.description:
+            columns = [column[0] for column in cursor.description]
+            tasks = {row[0]: dict(zip(columns, row)) for row in await cursor.fetchall()}
+        await conn.rollback()
+    finally:
+        await release_db_connection(conn)
+    _history_backfill_state.update(expires=time.monotonic() + HISTORY_BACKFILL_STATE_TTL_SECONDS, tasks=tasks)
+    return tasks
+
+async def history_backfill_completed(task: str) -> bool:
+    state = (await get_history_backfill_state()).get(task)
+    return state is not None and state['completed_at'] is not None
+
+async def rebuild_history_rollups() -> Dict[str, Any]:
+    """
+    Recompute DROP_REQUESTS_HISTORY_ROLLUP from DROP_REQUESTS_HISTORY (backfill / repair)
+    Aggregation runs server-side in one INSERT ... SELECT, with the shift assigned by
+    czech_shift_sql. History is read under a shared table lock, so writes made while
+    the rebuild runs wait for it instead of being counted twice or lost.
+    """
+    started = time.perf_counter()
+    duration = 'fulfillment_duration_minutes'
+    category_columns = ", ".join(
+        f"COUNT(CASE WHEN {performance_category_sql(prefix)} THEN 1 END), "
+        f"ISNULL(SUM(CASE WHEN {performance_category_sql(prefix)} THEN CAST({duration} AS BIGINT) END), 0)"
+        for _, prefix, _ in PERFORMANCE_CATEGORIES
+    )
+
+    conn = await get_db_connection()
+    try:
+        cursor = await conn.cursor()
         try:
-            cursor = await conn.cursor()
-            await cursor.execute("""
-                INSERT INTO DROP_REQUESTS_HISTORY
-                (req_id, serial_no, part_no, revision, quantity, location, deliver_to,
-                 req_time, fulfilled_time, fulfillment_duration_minutes, fulfillment_type, current_location)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (req_id, serial_no, part_no, revision, quantity, location, deliver_to,
-                  req_time, fulfilled_time, duration_minutes, fulfillment_type, current_location))
+            await cursor.execute("DELETE FROM DROP_REQUESTS_HISTORY_ROLLUP")
+            await cursor.execute(f"""
+                INSERT INTO DROP_REQUESTS_HISTORY_ROLLUP ({", ".join(ROLLUP_COLUMNS)})
+                SELECT
+                    CAST(h.fulfilled_time AS DATE), s.shift, ISNULL(h.part_no, ''), h.deliver_to, ISNULL(h.fulfillment_type, ''),
+                    COUNT(*), COUNT(h.{duration}), ISNULL(SUM(CAST(h.{duration} AS BIGINT)), 0),
+                    {category_columns},
+                    MIN(h.{duration}), MAX(h.{duration})
+                FROM DROP_REQUESTS_HISTORY h WITH (TABLOCK, HOLDLOCK)
+                CROSS APPLY (SELECT {czech_shift_sql('h.fulfilled_time')} AS shift) s
+                WHERE h.fulfilled_time IS NOT NULL AND h.deliver_to IS NOT NULL
+                GROUP BY CAST(h.fulfilled_time AS DATE), s.shift, ISNULL(h.part_no, ''), h.deliver_to, ISNULL(h.fulfillment_type, '')
+            """)
+            rollup_rows = cursor.rowcount
+            await cursor.execute("SELECT ISNULL(SUM(fulfilled_count), 0) FROM DROP_REQUESTS_HISTORY_ROLLUP")
+            row = await cursor.fetchone()
+            history_rows = row[0] if row else 0
+            # The rollups now cover all history: /api/history/stats may read them
+            await cursor.execute(
+                "UPDATE DROP_REQUESTS_HISTORY_BACKFILL SET completed_at = SYSUTCDATETIME() WHERE task = 'rollups'"
+            )
             await conn.commit()
-        finally:
-            await release_db_connection(conn)
-            
-        logger.info(f"📝 Logged request {serial_no} to history (fulfilled in {duration_minutes} minutes)")
-        return True
-        
-    except Exception as e:
-        logger.error(f"❌ Error logging request {serial_no} to history: {e}")
-        return False
+        except Exception:
+            await conn.rollback()
+            raise
+    finally:
+        await release_db_connection(conn)
+    _history_backfill_state['expires'] = 0.0
+    invalidate_history_caches('rebuild_history_rollups')
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"📊 Rebuilt history rollups: {history_rows} history rows -> {rollup_rows} rollup rows in {elapsed:.1f}s")
+    return {
+        'history_rows': history_rows,
+        'rollup_rows': rollup_rows,
+        'duration_seconds': round(elapsed, 2)
+    }
 
-# --- Automated Cleanup Functions ---
+# --- History Search Index ---
 
-async def check_container_current_location(serial_no: str) -> Optional[str]:
+# Trigram rows per INSERT (3 parameters per row, SQL Server allows 2100)
+HISTORY_NGRAM_BATCH_SIZE = 600
+
+async def write_history_ngrams(cursor, records: List[Dict[str, Any]]):
     """
-    Check the current location of a container by its serial number
-    Returns the current location or None if not found
+    Index the serial_no / part_no trigrams of new history rows on the caller's cursor,
+    so the index commits or rolls back together with the rows
+    """
+    rows = ngram_rows_for_history(records)
+    for i in range(0, len(rows), HISTORY_NGRAM_BATCH_SIZE):
+        batch = rows[i:i + HISTORY_NGRAM_BATCH_SIZE]
+        values = ", ".join("(?, ?, ?)" for _ in batch)
+        await cursor.execute(
+            f"INSERT INTO DROP_REQUESTS_HISTORY_NGRAM (field, gram, history_id) VALUES {values}",
+            [value for row in batch for value in row]
+        )
+
+async def backfill_history_ngrams(batch_size: int = 5000) -> Dict[str, Any]:
     """
+    Index history rows written before DROP_REQUESTS_HISTORY_NGRAM existed
+    Walks history in history_id order and commits per batch, so it can be stopped and rerun.
+    """
+    started = time.perf_counter()
+    last_id = 0
+    indexed_rows = 0
+    ngram_count = 0
+
+    conn = await get_db_connection()
     try:
-        container_data = await get_container_by_serial_no(serial_no)
-        
-        if container_data and len(container_data) > 0:
-            current_location = container_data[0].get('Location')
-            logger.info(f"📍 Container {serial_no} current location: {current_location}")
-            return current_location
-        else:
-            logger.warning(f"⚠️ Container {serial_no} not found in ERP system")
-            return None
-            
-    except Exception as e:
-        logger.error(f"❌ Error checking location for container {serial_no}: {e}")
-        return None
+        cursor = await conn.cursor()
+        while True:
+            await cursor.execute("""
+                SELECT TOP (?) h.history_id, h.serial_no, h.part_no
+                FROM DROP_REQUESTS_HISTORY h
+                WHERE h.history_id > ?
+                  AND NOT EXISTS (SELECT 1 FROM DROP_REQUESTS_HISTORY_NGRAM g WHERE g.history_id = h.history_id)
+                ORDER BY h.history_id
+            """, (batch_size, last_id))
+            rows = await cursor.fetchall()
+            if not rows:
+                break
 
-# COMMENTED OUT - Auto cleanup disabled
-# async def automated_container_cleanup():
-#     """
-#     Main automated cleanup function that runs every minute
-#     Checks if requested containers have moved to production locations and removes them
-#     """
-#     try:
-#        logger.info(f"🧹 Starting automated container cleanup...")
-#        
-#        # Get production locations
-#        prod_locations = await get_prod_locations()
-#        if not prod_locations:
-#            logger.error(f"🚨 CRITICAL: No production locations found! Aborting cleanup.")
-#            return
-#                
-#        # Get all active requests from database (async)
-#        conn = await get_db_connection()
-#        try:
-#            cursor = await conn.cursor()
-#            await cursor.execute("""
-#                SELECT req_id, serial_no, part_no, revision, quantity, location, deliver_to, req_time
-#                FROM DROP_REQUESTS
-#                ORDER BY req_time DESC
-#            """)
-#            active_requests = await cursor.fetchall()
-#        finally:
+            records = [{'history_id': row[0], 'serial_no': row[1], 'part_no': row[2]} for row in rows]
+            try:
+                await write_history_ngrams(cursor, records)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+
+            last_id = rows[-1][0]
+            indexed_rows += len(rows)
+            ngram_count += len(ngram_rows_for_history(records))
+            logger.info(f"🔎 Indexed history up to history_id {last_id} ({indexed_rows} rows)")
+
+        # Rows written from now on are indexed by their writers: searches may trust the whole index
+        await cursor.execute("""
+            UPDATE DROP_REQUESTS_HISTORY_BACKFILL SET watermark = NULL, completed_at = SYSUTCDATETIME()
+            WHERE task = 'ngrams'
+        """)
+        await conn.commit()
+    finally:
+        await release_db_connection(conn)
+    _history_backfill_state['expires'] = 0.0
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"🔎 History trigram backfill done: {indexed_rows} rows, {ngram_count} trigrams in {elapsed:.1f}s")
+    return {
+        'history_rows': indexed_rows,
+        'ngram_rows': ngram_count,
+        'duration_seconds': round(elapsed, 2)
+    }
+
+# --- History Retention ---
+
+HISTORY_PURGE_LOCK = 'drop_list_history_purge'
+HISTORY_PURGE_MODES = ('retention', 'clear_all')
+
+async def acquire_session_applock(cursor, resource: str, timeout_ms: int = 0) -> bool:
+    """Take an exclusive session-level sp_getapplock (survives commits); False if another session holds it"""
+    await cursor.execute("""
+        SET NOCOUNT ON;
+        DECLARE @result INT;
+        EXEC @result = sp_getapplock @Resource = ?, @LockMode = 'Exclusive',
+                                     @LockOwner = 'Session', @LockTimeout = ?;
+        SELECT @result;
+    """, (resource, timeout_ms))
+    row = await cursor.fetchone()
+    return row is not None and row[0] >= 0
+
+async def release_session_applock(cursor, resource: str):
+    await cursor.execute("EXEC sp_releaseapplock @Resource = ?, @LockOwner = 'Session'", (resource,))
+
+def history_retention_cutoff(days: int, now: Optional[datetime] = None) -> datetime:
+    """
+    UTC midnight `days` days ago. Purging whole UTC days means the rollup rows of those
+    days (rollup_date < cutoff) can be dropped exactly instead of being recomputed.
+    """
+    now = now or datetime.utcnow()
+    return datetime(now.year, now.month, now.day) - timedelta(days=days)
+
+def history_purge_predicate(mode: str, cutoff_time: Optional[datetime], max_history_id: Optional[int]):
+    """(WHERE clause, params, ORDER BY columns) selecting the history rows a purge run deletes"""
+    if mode == 'retention':
+        return "fulfilled_time < ?", [cutoff_time], ['fulfilled_time', 'history_id']
+    # clear_all: everything that existed when the run started, including rows without fulfilled_time
+    return "history_id <= ?", [max_history_id], ['history_id']
+
+async def _start_history_purge(cursor, mode: str, days: int) -> Dict[str, Any]:
+    """Resume this mode's interrupted run, or record a new one"""
+    await cursor.execute("""
+        SELECT TOP 1 purge_id, cutoff_time, max_history_id, deleted_rows, batches
+        FROM DROP_REQUESTS_HISTORY_PURGE
+        WHERE mode = ? AND status IN ('running', 'failed')
+        ORDER BY purge_id DESC
+    """, (mode,))
+    row = await cursor.fetchone()
+    if row:
+        run = {'purge_id': row[0], 'cutoff_time': row[1], 'max_history_id': row[2],
+               'deleted_rows': row[3], 'batches': row[4], 'resumed': True}
+    else:
+        cutoff_time = history_retention_cutoff(days) if mode == 'retention' else None
+        max_history_id = None
+        if mode == 'clear_all':
+            await cursor.execute("SELECT ISNULL(MAX(history_id), 0) FROM DROP_REQUESTS_HISTORY")
+            max_history_id = (await cursor.fetchone())[0]
+        await cursor.execute("""
+            INSERT INTO DROP_REQUESTS_HISTORY_PURGE (mode, cutoff_time, max_history_id, status)
+            OUTPUT INSERTED.purge_id
+            VALUES (?, ?, ?, 'running')
+        """, (mode, cutoff_time, max_history_id))
+        run = {'purge_id': (await cursor.fetchone())[0], 'cutoff_time': cutoff_time,
+               'max_history_id': max_history_id, 'deleted_rows': 0, 'batches': 0, 'resumed': False}
+
+    predicate, params, _ = history_purge_predicate(mode, run['cutoff_time'], run['max_history_id'])
+    await cursor.execute(f"SELECT COUNT(*) FROM DROP_REQUESTS_HISTORY WHERE {predicate}", params)
+    run['rows_to_delete'] = run['deleted_rows'] + (await cursor.fetchone())[0]
+    await cursor.execute("""
+        UPDATE DROP_REQUESTS_HISTORY_PURGE
+        SET status = 'running', rows_to_delete = ?, error = NULL, updated_at = SYSUTCDATETIME()
+        WHERE purge_id = ?
+    """, (run['rows_to_delete'], run['purge_id']))
+    return run
+
+async def purge_history(mode: str = 'retention', days: Optional[int] = None,
+                        batch_size: Optional[int] = None, pause_seconds: Optional[float] = None,
+                        started: Optional[asyncio.Future] = None) -> Dict[str, Any]:
+    """
+    Delete history in bounded batches instead of one long DELETE
+    Each batch deletes up to batch_size rows (oldest first, with their trigram index rows)
+    and records progress in DROP_REQUESTS_HISTORY_PURGE in the same transaction, then
+    pauses so /api/history queries are not starved. A run that is interrupted is resumed
+    with its original cutoff by the next purge of the same mode. Only one purge runs at a
+    time across all workers (sp_getapplock); others return status 'skipped'.
+
+    Args:
+        mode: 'retention' (fulfilled before the cutoff) or 'clear_all' (all rows existing at start)
+        days: Retention in days (AppConfig.HISTORY_RETENTION_DAYS when omitted)
+        batch_size: Rows per batch (AppConfig.HISTORY_PURGE_BATCH_SIZE when omitted)
+        pause_seconds: Pause between batches (AppConfig.HISTORY_PURGE_PAUSE_SECONDS when omitted)
+        started: Resolved with the recorded run (purge_id, rows_to_delete, ...) before the first
+            batch, or with the 'skipped' result
+    """
+    if mode not in HISTORY_PURGE_MODES:
+        raise ValueError(f"Unknown purge mode {mode!r}")
+    days = AppConfig.HISTORY_RETENTION_DAYS if days is None else days
+    batch_size = batch_size or AppConfig.HISTORY_PURGE_BATCH_SIZE
+    pause_seconds = AppConfig.HISTORY_PURGE_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+    run_started = time.perf_counter()
+
+    conn = await get_db_connection()
+    try:
+        cursor = await conn.cursor()
+        if not await acquire_session_applock(cursor, HISTORY_PURGE_LOCK):
+            await conn.rollback()
+            logger.info(f"⏭️ History purge ({mode}) already running elsewhere, skipping")
+            result = {'status': 'skipped', 'mode': mode}
+            if started is not None:
+                started.set_result(result)
+            return result
+
+        run = None
+        try:
+            run = await _start_history_purge(cursor, mode, days)
+            await conn.commit()
+            if started is not None:
+                started.set_result({'status': 'running', 'mode': mode, **run})
+            logger.info(f"🧹 History purge #{run['purge_id']} ({mode}) {'resumed' if run['resumed'] else 'started'}: "
+                        f"{run['rows_to_delete'] - run['deleted_rows']} rows to delete, cutoff {run['cutoff_time']}")
+
+            predicate, params, order_columns = history_purge_predicate(mode, run['cutoff_time'], run['max_history_id'])
+            batch_sql = f"""
+                SET NOCOUNT ON;
+                DECLARE @batch TABLE (history_id INT PRIMARY KEY, fulfilled_time DATETIME);
+                INSERT INTO @batch (history_id, fulfilled_time)
+                    SELECT TOP (?) history_id, fulfilled_time
+                    FROM DROP_REQUESTS_HISTORY
+                    WHERE {predicate}
+                    ORDER BY {", ".join(order_columns)};
+                DELETE g FROM DROP_REQUESTS_HISTORY_NGRAM g JOIN @batch b ON g.history_id = b.history_id;
+                DELETE h FROM DROP_REQUESTS_HISTORY h JOIN @batch b ON h.history_id = b.history_id;
+                DECLARE @deleted INT = @@ROWCOUNT;
+                UPDATE p SET
+                    deleted_rows = p.deleted_rows + @deleted,
+                    batches = p.batches + 1,
+                    last_fulfilled_time = ISNULL(k.fulfilled_time, p.last_fulfilled_time),
+                    last_history_id = ISNULL(k.history_id, p.last_history_id),
+                    updated_at = SYSUTCDATETIME()
+                FROM DROP_REQUESTS_HISTORY_PURGE p
+                OUTER APPLY (SELECT TOP 1 fulfilled_time, history_id FROM @batch
+                             ORDER BY {", ".join(f"{column} DESC" for column in order_columns)}) k
+                WHERE p.purge_id = ?;
+                SELECT @deleted;
+            """
+
+            while True:
+                await cursor.execute(batch_sql, [batch_size, *params, run['purge_id']])
+                deleted = (await cursor.fetchone())[0]
+                await conn.commit()
+                run['deleted_rows'] += deleted
+                run['batches'] += 1
+                if deleted:
+                    logger.info(f"🧹 History purge #{run['purge_id']}: {run['deleted_rows']}/{run['rows_to_delete']} rows deleted")
+                if deleted < batch_size:
+                    break
+                await asyncio.sleep(pause_seconds)
+
+            if mode == 'retention':
+                await cursor.execute("DELETE FROM DROP_REQUESTS_HISTORY_ROLLUP WHERE rollup_date < CAST(? AS DATE)",
+                                     (run['cutoff_time'],))
+                # The newest change log row stays: it carries the current active request list version
+                await cursor.execute("""
+                    DELETE FROM DROP_REQUESTS_CHANGELOG
+                    WHERE changed_at < ? AND version < (SELECT MAX(version) FROM DROP_REQUESTS_CHANGELOG)
+                """, (run['cutoff_time'],))
+            await cursor.execute("""
+                UPDATE DROP_REQUESTS_HISTORY_PURGE
+                SET status = 'completed', finished_at = SYSUTCDATETIME(), updated_at = SYSUTCDATETIME()
+                WHERE purge_id = ?
+            """, (run['purge_id'],))
+            await conn.commit()
+        except Exception as e:
+            await conn.rollback()
+            if run is not None:
+                try:
+                    await cursor.execute("""
+                        UPDATE DROP_REQUESTS_HISTORY_PURGE
+                        SET status = 'failed', error = ?, updated_at = SYSUTCDATETIME()
+                        WHERE purge_id = ?
+                    """, (str(e)[:4000], run['purge_id']))
+                    await conn.commit()
+                except Exception as update_error:
+                    logger.error(f"❌ Could not record history purge failure: {update_error}")
+            raise
+        finally:
+            invalidate_history_caches(f'purge_history_{mode}')
+            try:
+                await release_session_applock(cursor, HISTORY_PURGE_LOCK)
+                await conn.commit()
+            except Exception as release_error:
+                # Logged rather than raised so a failed batch's error is not masked. Closing the
+                # connection ends its session, which frees the lock instead of pooling it held.
+                logger.error(f"❌ Could not release the history purge lock: {release_error}")
+                try:
+                    await conn.close()
+                except Exception:
+                    pass
+    finally:
+        await release_db_connection(conn)
+
+    if mode == 'clear_all':
+        # Rows written while the purge ran are kept; recompute the rollups for exactly those
+        await rebuild_history_rollups()
+
+    elapsed = time.perf_counter() - run_started
+    logger.info(f"✅ History purge #{run['purge_id']} ({mode}) done: {run['deleted_rows']} rows in "
+                f"{run['batches']} batches, {elapsed:.1f}s")
+    return {
+        'status': 'completed',
+        'purge_id': run['purge_id'],
+        'mode': mode,
+        'resumed': run['resumed'],
+        'cutoff_time': run['cutoff_time'].isoformat() if run['cutoff_time'] else None,
+        'deleted_rows': run['deleted_rows'],
+        'batches': run['batches'],
+        'duration_seconds': round(elapsed, 2)
+    }
+
+async def get_history_purge_runs(limit: int = 10) -> List[Dict[str, Any]]:
+    """Most recent purge runs with their progress, newest first"""
+    conn = await get_db_connection()
+    try:
+        cursor = await conn.cursor()
+        await cursor.execute("""
+            SELECT TOP (?) purge_id, mode, cutoff_time, max_history_id, status, rows_to_delete, deleted_rows,
+                   batches, last_fulfilled_time, last_history_id, started_at, updated_at, finished_at, error
+            FROM DROP_REQUESTS_HISTORY_PURGE
+            ORDER BY purge_id DESC
+        """, (limit,))
+        columns = [column[0] for column in cursor.description]
+        rows = await cursor.fetchall()
+        await conn.rollback()
+    finally:
+        await release_db_connection(conn)
+
+    runs = []
+    for row in rows:
+        run = dict(zip(columns, row))
+        for key, value in run.items():
+            if isinstance(value, datetime):
+                run[key] = value.isoformat()
+        run['progress_percent'] = (round(100.0 * run['deleted_rows'] / run['rows_to_delete'], 1)
+                                   if run['rows_to_delete'] else None)
+        runs.append(run)
+    return runs
+
+# --- History Response Cache ---
+
+class ResponseCache:
+    """
+    In-process LRU cache for JSON response bodies, keyed by normalized query parameters.
+    Entries expire after max_age_seconds (the staleness bound for writes made by other
+    workers) and are all dropped by invalidate() when this worker writes history.
+    A result computed before an invalidation is not stored (generation check).
+    """
+
+    def __init__(self, name: str, max_entries: int, max_age_seconds: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.last_invalidation: Optional[str] = None
+        self.last_invalidation_reason: Optional[str] = None
+
+    def get(self, key: tuple) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._entries[key]
+            self.expired += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: tuple, value: Any, generation: int):
+        """Store value unless the cache was invalidated since generation was read"""
+        if generation != self.generation or self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.max_age_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, reason: str):
+        self._entries.clear()
+        self.generation += 1
+        self.invalidations += 1
+        self.last_invalidation = datetime.now().isoformat()
+        self.last_invalidation_reason = reason
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'name': self.name,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'max_age_seconds': self.max_age_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'last_invalidation': self.last_invalidation,
+            'last_invalidation_reason': self.last_invalidation_reason
+        }
+
+history_response_cache = ResponseCache(
+    'history', AppConfig.HISTORY_RESPONSE_CACHE_MAX_ENTRIES, AppConfig.HISTORY_RESPONSE_CACHE_SECONDS
+)
+
+def invalidate_history_caches(reason: str):
+    """Drop cached /api/history and /api/history/stats responses after a history write"""
+    history_response_cache.invalidate(reason)
+    _history_count_cache.clear()
+
+# --- History Logging Functions ---
+
+# Rows per DELETE/INSERT batch in fulfill_requests (2 parameters per row, SQL Server allows 2100)
+FULFILL_BATCH_SIZE = 500
+
+async def fulfill_requests(fulfillments: List[tuple], fulfillment_type: str) -> List[Dict[str, Any]]:
+    """
+    Move requests from DROP_REQUESTS to DROP_REQUESTS_HISTORY in one transaction
+    The rows are deleted with DELETE ... OUTPUT INTO and written to history with one
+    INSERT ... SELECT, with fulfilled_time and the duration computed in SQL. History
+    logging, the history rollups, the search index, the DROP_REQUESTS_CHANGELOG entries
+    and deletion commit or roll back together.
+
+    Args:
+        fulfillments: (serial_no, current_location) pairs
+        fulfillment_type: 'auto_cleanup', 'manual_cleanup' or 'manual_delete'
+
+    Returns:
+        The history rows that were written (serials without an active request are skipped)
+    """
+    current_locations = dict(fulfillments)  # one entry per serial, last location wins
+    if not current_locations:
+        return []
+
+    items = list(current_locations.items())
+    moved = []
+    conn = await get_db_connection()
+    try:
+        cursor = await conn.cursor()
+        try:
+            for i in range(0, len(items), FULFILL_BATCH_SIZE):
+                batch = items[i:i + FULFILL_BATCH_SIZE]
+                values = ", ".join("(?, ?)" for _ in batch)
+                params = [value for item in batch for value in item] + [fulfillment_type]
+                await cursor.execute(f"""
+                    SET NOCOUNT ON;
+                    DECLARE @now DATETIME = GETUTCDATE();
+                    DECLARE @moved TABLE (
+                        req_id INT, serial_no NVARCHAR(255), part_no NVARCHAR(255), revision NVARCHAR(50),
+                        quantity DECIMAL(10,2), location NVARCHAR(255), deliver_to NVARCHAR(255),
+                        req_time DATETIME, master_unit_no NVARCHAR(255), current_location NVARCHAR(255)
+                    );
+
+                    DELETE r
+                    OUTPUT DELETED.req_id, DELETED.serial_no, DELETED.part_no, DELETED.revision, DELETED.quantity,
+                           DELETED.location, DELETED.deliver_to, DELETED.req_time, DELETED.master_unit_no, v.current_location
+                    INTO @moved
+                    FROM DROP_REQUESTS r
+                    JOIN (VALUES {values}) AS v(serial_no, current_location) ON r.serial_no = v.serial_no;
+
+                    INSERT INTO DROP_REQUESTS_CHANGELOG (operation, req_id, serial_no)
+                    SELECT 'D', req_id, ISNULL(serial_no, '') FROM @moved;
+
+                    INSERT INTO DROP_REQUESTS_HISTORY
+                        (req_id, serial_no, part_no, revision, quantity, location, deliver_to, req_time,
+                         fulfilled_time, fulfillment_duration_minutes, fulfillment_type, current_location, master_unit_no)
+                    OUTPUT INSERTED.history_id, INSERTED.req_id, INSERTED.serial_no, INSERTED.part_no, INSERTED.revision,
+                           INSERTED.quantity, INSERTED.location, INSERTED.deliver_to, INSERTED.req_time,
+                           INSERTED.fulfilled_time, INSERTED.fulfillment_duration_minutes, INSERTED.fulfillment_type,
+                           INSERTED.current_location, INSERTED.master_unit_no
+                    SELECT req_id, serial_no, part_no, ISNULL(revision, ''), ISNULL(quantity, 0), location, deliver_to, req_time,
+                           @now, DATEDIFF(second, req_time, @now) / 60, ?, current_location, master_unit_no
+                    FROM @moved;
+                """, params)
+                columns = [column[0] for column in cursor.description]
+                moved.extend(dict(zip(columns, row)) for row in await cursor.fetchall())
+            await write_history_rollups(cursor, accumulate_history_rollups(moved))
+            await write_history_ngrams(cursor, moved)
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+    finally:
+        await release_db_connection(conn)
+
+    if moved:
+        invalidate_history_caches(f'fulfill_requests ({fulfillment_type})')
+
+    logger.info(f"📝 Moved {len(moved)}/{len(items)} requests to history ({fulfillment_type})")
+    return moved
+
+# --- Storage Backends ---
+
+# One VALUES row per serial; explicit types so rows with NULLs do not decide the column types
+BULK_REQUEST_ROW_SQL = ("(CAST(? AS NVARCHAR(255)), CAST(? AS NVARCHAR(50)), "
+                        "CAST(? AS DECIMAL(10,2)), CAST(? AS NVARCHAR(255)), CAST(? AS NVARCHAR(255)))")
+
+# Logs the rows captured in @inserted to DROP_REQUESTS_CHANGELOG (same batch and transaction as the insert)
+CHANGELOG_INSERTED_SQL = """
+    INSERT INTO DROP_REQUESTS_CHANGELOG (operation, req_id, serial_no)
+    SELECT 'I', req_id, ISNULL(serial_no, '') FROM @inserted;
+"""
+
+class AzureSqlStorage(StorageBackend):
+    """
+    Azure SQL storage (storage.py interface) on the aioodbc connection pool
+    Azure-only maintenance (rollups, trigram index, purges, migrations) stays in the
+    module-level functions above and is reached directly by the admin endpoints.
+    """
+
+    name = 'azure'
+
+    async def start(self):
+        conn = await get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES")
+            row = await cursor.fetchone()
+            table_count = row[0] if row else 0
+            logger.info(f"Connected successfully! Database has {table_count} tables.")
+
+            # Schema changes are applied by "python manage.py migrate" before the workers start;
+            # workers only check the recorded version
+            schema_version = await schema_migrations.get_schema_version(cursor)
+            await conn.rollback()
+        finally:
+            await release_db_connection(conn)
+
+        latest_schema_version = schema_migrations.latest_version()
+        if schema_version < latest_schema_version:
+            if AppConfig.MIGRATE_ON_STARTUP:
+                await run_schema_migrations()
+            else:
+                logger.warning(f"⚠️ Database schema is at version {schema_version}, latest migration is "
+                               f"{latest_schema_version}. Run \"python manage.py migrate\".")
+
+    async def close(self):
+        global connection_pool
+        if connection_pool:
+            connection_pool.close()
+            await connection_pool.wait_closed()
+            connection_pool = None
+
+    # --- Active requests ---
+
+    async def list_active_requests(self) -> List[Dict[str, Any]]:
+        conn = await get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute("""
+                SELECT *
+                FROM DROP_REQUESTS
+                ORDER BY req_time DESC
+            """)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in await cursor.fetchall()]
+        finally:
+            await release_db_connection(conn)
+
+    async def active_request_summary(self):
+        conn = await get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute("""
+                SELECT COUNT(*) as total_requests,
+                       MIN(req_time) as oldest_request,
+                       MAX(req_time) as newest_request
+                FROM DROP_REQUESTS
+            """)
+            row = await cursor.fetchone()
+        finally:
+            await release_db_connection(conn)
+        return tuple(row) if row else (0, None, None)
+
+    async def requested_serials(self, serial_nos):
+        return await get_requested_serials(serial_nos)
+
+    async def active_requests_version(self) -> int:
+        """
+        Newest committed DROP_REQUESTS_CHANGELOG version; rows of transactions still in
+        flight (at or above MIN_ACTIVE_ROWVERSION) are not counted until they commit
+        """
+        conn = await get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute("""
+                SELECT ISNULL(CAST(MAX(version) AS BIGINT), 0)
+                FROM DROP_REQUESTS_CHANGELOG
+                WHERE version < MIN_ACTIVE_ROWVERSION()
+            """)
+            row = await cursor.fetchone()
+            await conn.rollback()
+        finally:
+            await release_db_connection(conn)
+        return row[0]
+
+    async def active_request_changes(self, since_version: int) -> Optional[ActiveRequestChanges]:
+        """
+        Changes in (since_version, newest committed version]; versions are ROWVERSIONs as
+        BIGINT, compared as BINARY(8) so the change log primary key can be used
+        """
+        conn = await get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute("""
+                SELECT ISNULL(CAST(MAX(version) AS BIGINT), 0), ISNULL(CAST(MIN(version) AS BIGINT), 0)
+                FROM DROP_REQUESTS_CHANGELOG
+                WHERE version < MIN_ACTIVE_ROWVERSION()
+            """)
+            version, oldest = await cursor.fetchone()
+            if version == since_version:
+                return ActiveRequestChanges(version, [], [])
+            if version < since_version or oldest > since_version:
+                return None
+
+            await cursor.execute("""
+                SELECT r.*
+                FROM DROP_REQUESTS r
+                WHERE r.req_id IN (
+                    SELECT req_id FROM DROP_REQUESTS_CHANGELOG
+                    WHERE operation = 'I' AND version > CAST(? AS BINARY(8)) AND version <= CAST(? AS BINARY(8))
+                )
+            """, (since_version, version))
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in await cursor.fetchall()]
+
+            await cursor.execute("""
+                SELECT req_id FROM DROP_REQUESTS_CHANGELOG
+                WHERE operation = 'D' AND version > CAST(? AS BINARY(8)) AND version <= CAST(? AS BINARY(8))
+            """, (since_version, version))
+            deleted = [row[0] for row in await cursor.fetchall()]
+            return ActiveRequestChanges(version, rows, deleted)
+        finally:
+            await conn.rollback()
+            await release_db_connection(conn)
+
+    async def insert_request(self, part_no: str, deliver_to: str, req_time: datetime,
+                             record: RequestRecord) -> Optional[int]:
+        conn = await get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            # req_id comes from the DROP_REQUESTS_req_id_seq default, unique across workers
+            try:
+                await cursor.execute(f"""
+                    SET NOCOUNT ON;
+                    DECLARE @inserted TABLE (req_id INT, serial_no NVARCHAR(255));
+                    INSERT INTO DROP_REQUESTS (serial_no, part_no, revision, quantity, location, deliver_to, req_time, master_unit_no)
+                    OUTPUT INSERTED.req_id, INSERTED.serial_no INTO @inserted
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+                    {CHANGELOG_INSERTED_SQL}
+                    SELECT req_id FROM @inserted;
+                """, (record.serial_no, part_no, record.revision, record.quantity, record.location,
+                      deliver_to, req_time, record.master_unit_no))
+                row = await cursor.fetchone()
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+        finally:
+            await release_db_connection(conn)
+        return row[0] if row else None
+
+    async def insert_requests(self, part_no: str, deliver_to: str, req_time: datetime,
+                              records) -> Dict[str, int]:
+        """
+        All rows in a single INSERT ... SELECT FROM (VALUES ...); serials that already have an
+        active request are skipped by the same statement (NOT EXISTS under UPDLOCK/HOLDLOCK,
+        so two concurrent bulk requests cannot both insert a serial)
+        """
+        values = ", ".join(BULK_REQUEST_ROW_SQL for _ in records)
+        params = [part_no, deliver_to, req_time]
+        for record in records:
+            params.extend([record.serial_no, record.revision, record.quantity, record.location, record.master_unit_no])
+
+        conn = await get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            try:
+                await cursor.execute(f"""
+                    SET NOCOUNT ON;
+                    DECLARE @inserted TABLE (req_id INT, serial_no NVARCHAR(255));
+                    INSERT INTO DROP_REQUESTS (serial_no, part_no, revision, quantity, location, deliver_to, req_time, master_unit_no)
+                    OUTPUT INSERTED.req_id, INSERTED.serial_no INTO @inserted
+                    SELECT v.serial_no, p.part_no, v.revision, v.quantity, v.location, p.deliver_to, p.req_time, v.master_unit_no
+                    FROM (SELECT ? AS part_no, ? AS deliver_to, CAST(? AS DATETIME) AS req_time) AS p
+                    CROSS JOIN (VALUES {values}) AS v(serial_no, revision, quantity, location, master_unit_no)
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM DROP_REQUESTS d WITH (UPDLOCK, HOLDLOCK) WHERE d.serial_no = v.serial_no
+                    );
+                    {CHANGELOG_INSERTED_SQL}
+                    SELECT serial_no, req_id FROM @inserted;
+                """, params)
+                inserted = {row[0]: row[1] for row in await cursor.fetchall()}
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+        finally:
+            await release_db_connection(conn)
+        return inserted
+
+    # --- History writes ---
+
+    async def fulfill_requests(self, fulfillments: List[tuple], fulfillment_type: str) -> List[Dict[str, Any]]:
+        return await fulfill_requests(fulfillments, fulfillment_type)
+
+    async def clear_history(self) -> int:
+        # Chunked and throttled like the retention purge, so /api/history keeps responding meanwhile
+        result = await purge_history('clear_all')
+        if result['status'] == 'skipped':
+            raise StorageBusyError("A history purge is already running, try again when it finishes")
+        return result['deleted_rows']
+
+    # --- History queries ---
+
+    async def query_history(self, filters: HistoryFilters, limit: int, offset: int,
+                            keyset: Optional[tuple], count_mode: str):
+        # Build WHERE clause with filters
+        where_clauses = ["fulfilled_time >= DATEADD(day, -30, GETDATE())"]  # Only last 30 days
+        # Exclude TEST workcenter/deliver_to from history display
+        where_clauses.append(f"deliver_to != '{EXCLUDED_DELIVER_TO}'")
+        params = []
+
+        if filters.serial_no:
+            where_clauses.append("serial_no LIKE ?")
+            params.append(f"%{filters.serial_no}%")
+
+        if filters.part_no:
+            where_clauses.append("part_no LIKE ?")
+            params.append(f"%{filters.part_no}%")
+
+        # Narrow substring searches to candidate rows from the trigram index (LIKE above still decides).
+        # History up to the backfill watermark may not be indexed yet and is matched by LIKE alone.
+        ngram_state = None
+        if AppConfig.HISTORY_NGRAM_SEARCH and (search_trigrams(filters.serial_no) or search_trigrams(filters.part_no)):
+            ngram_state = (await get_history_backfill_state()).get('ngrams')
+        if ngram_state is not None:
+            watermark = None if ngram_state['completed_at'] is not None else ngram_state['watermark']
+            for field, term in ((FIELD_SERIAL_NO, filters.serial_no), (FIELD_PART_NO, filters.part_no)):
+                grams = search_trigrams(term)
+                if grams:
+                    candidate_sql, candidate_params = candidate_filter_sql(field, grams)
+                    if watermark is not None:
+                        candidate_sql = f"(history_id <= ? OR {candidate_sql})"
+                        candidate_params = [watermark] + candidate_params
+                    where_clauses.append(candidate_sql)
+                    params.extend(candidate_params)
+
+        if filters.fulfillment_type:
+            where_clauses.append("fulfillment_type = ?")
+            params.append(filters.fulfillment_type)
+
+        if filters.start_date:
+            where_clauses.append("fulfilled_time >= ?")
+            params.append(filters.start_date)
+
+        if filters.end_date:
+            where_clauses.append("fulfilled_time <= ?")
+            params.append(filters.end_date)
+
+        where_clause = " AND ".join(where_clauses)
+        count_cache_key = (where_clause, tuple(str(p) for p in params))
+
+        conn = await get_db_connection()
+        try:
+            db_cursor = await conn.cursor()
+
+            total_count = None
+            if count_mode != 'none':
+                total_count = await count_history_rows(db_cursor, where_clause, params, count_cache_key,
+                                                       count_mode == 'cached')
+
+            select_sql = f"SELECT {', '.join(HISTORY_COLUMNS)} FROM DROP_REQUESTS_HISTORY"
+            if keyset:
+                # CAST keeps the comparison in DATETIME precision (the cursor holds the DATETIME value)
+                data_sql = f"""
+                    {select_sql}
+                    WHERE {where_clause}
+                      AND (fulfilled_time < CAST(? AS DATETIME)
+                           OR (fulfilled_time = CAST(? AS DATETIME) AND history_id < ?))
+                    ORDER BY fulfilled_time DESC, history_id DESC
+                    OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+                """
+                data_params = params + [keyset[0], keyset[0], keyset[1], limit]
+            else:
+                data_sql = f"""
+                    {select_sql}
+                    WHERE {where_clause}
+                    ORDER BY fulfilled_time DESC, history_id DESC
+                    OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+                """
+                data_params = params + [offset, limit]
+            await db_cursor.execute(data_sql, data_params)
+
+            columns = [column[0] for column in db_cursor.description]
+            rows = [dict(zip(columns, row)) for row in await db_cursor.fetchall()]
+        finally:
+            await release_db_connection(conn)
+        return rows, total_count
+
+    async def history_stats(self, days: int, part_no: Optional[str], source: str, parallel: bool):
+        if source == 'rollup' and not await history_backfill_completed('rollups'):
+            source = 'raw'  # Existing history is not rolled up yet ("python manage.py rebuild-rollups")
+        if source == 'rollup':
+            queries = _history_stats_queries_from_rollups(days, part_no)
+        else:
+            queries = _history_stats_queries_from_history(days, part_no)
+        results, timings = await run_history_stats_queries(queries, parallel)
+        return results, timings, source
+
+def create_storage() -> StorageBackend:
+    """Storage backend selected by STORAGE_BACKEND"""
+    if AppConfig.STORAGE_BACKEND == 'sqlite':
+        return SQLiteStorage(
+            AppConfig.SQLITE_PATH,
+            shift_of=get_shift_from_czech_datetime,
+            performance_categories=PERFORMANCE_CATEGORIES,
+            on_history_change=invalidate_history_caches
+        )
+    if aioodbc is None:
+        raise ValueError("STORAGE_BACKEND=azure needs aioodbc and pyodbc (pip install -r requirements.txt)")
+    return AzureSqlStorage()
+
+storage = create_storage()
+
+# In-memory, indexed copy of DROP_REQUESTS kept current from the change log; serves the active request reads
+active_requests = ActiveRequestsView(storage, AppConfig.REQUESTS_VIEW_MAX_LAG_SECONDS)
+active_requests_task: Optional[asyncio.Task] = None
+
+# WebSocket clients connected to this worker; a coalesced backlog is replaced by a resync at the current seq
+websocket_hub = BroadcastHub(
+    AppConfig.WS_SEND_QUEUE_SIZE, AppConfig.WS_SLOW_CONSUMER_POLICY, AppConfig.WS_SEND_TIMEOUT_SECONDS,
+    resync_message=lambda: {'type': 'resync', 'seq': request_event_seq}
+)
+
+def create_broadcast_bus() -> BroadcastBus:
+    """Cross-worker bus selected by BROADCAST_BUS"""
+    if AppConfig.BROADCAST_BUS == 'unix':
+        if unix_bus_supported():
+            return UnixSocketBus(AppConfig.BROADCAST_BUS_SOCKET)
+        logger.warning("⚠️ Unix domain sockets are not available here, WebSocket messages stay within each worker")
+        return LocalBus()
+    if AppConfig.BROADCAST_BUS == 'local':
+        return LocalBus()
+    raise ValueError(f"Unknown BROADCAST_BUS {AppConfig.BROADCAST_BUS!r}, expected 'unix' or 'local'")
+
+broadcast_bus = create_broadcast_bus()
+
+def require_azure_storage(feature: str):
+    """Admin features built on Azure SQL (rollups, trigram index, purges, migrations) answer 501 on other backends"""
+    if storage.name != 'azure':
+        raise HTTPException(status_code=501, detail=f"{feature} is only available with STORAGE_BACKEND=azure")
+
+# --- Automated Cleanup Functions ---
+
+async def check_container_current_location(serial_no: str) -> Optional[str]:
+    """
+    Check the current location of a container by its serial number
+    Returns the current location or None if not found
+    """
+    try:
+        container_data = await get_container_by_serial_no(serial_no)
+        
+        if container_data and len(container_data) > 0:
+            current_location = container_data[0].get('Location')
+            logger.info(f"📍 Container {serial_no} current location: {current_location}")
+            return current_location
+        else:
+            logger.warning(f"⚠️ Container {serial_no} not found in ERP system")
+            return None
+            
+    except Exception as e:
+        logger.error(f"❌ Error checking location for container {serial_no}: {e}")
+        return None
+
+class TokenBucket:
+    """
+    Async token bucket rate limiter
+    Allows bursts of up to `capacity` calls, refilled at `rate` tokens per second
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class ErpCallLimiter:
+    """
+    Concurrency cap plus token-bucket rate limit shared by one batch of ERP calls
+    Tracks how many calls were made and the peak number in flight
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None,
+                 rate_per_second: Optional[float] = None,
+                 burst: Optional[int] = None):
+        self.max_concurrency = max_concurrency or AppConfig.CLEANUP_MAX_CONCURRENCY
+        self.rate_per_second = rate_per_second or AppConfig.CLEANUP_RATE_PER_SECOND
+        self.burst = burst or AppConfig.CLEANUP_RATE_BURST
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._bucket = TokenBucket(self.rate_per_second, self.burst)
+        self.calls = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def call(self, func, *args):
+        async with self._semaphore:
+            await self._bucket.acquire()
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                return await func(*args)
+            finally:
+                self.in_flight -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'max_concurrency': self.max_concurrency,
+            'peak_concurrency': self.peak_in_flight,
+            'rate_limit_per_second': self.rate_per_second,
+            'rate_limit_burst': self.burst
+        }
+
+async def resolve_container_locations(serial_nos: List[str], limiter: Optional[ErpCallLimiter] = None):
+    """
+    Check the current location of many containers concurrently (one datasource 4619 call each)
+    ERP calls are bounded by a concurrency cap and a token-bucket rate limit
+    instead of a fixed sleep between calls
+
+    Returns:
+        (locations, errors, stats): serial_no -> current location (None if unknown),
+        serial_no -> error message, and a stats dict with the achieved throughput
+    """
+    limiter = limiter or ErpCallLimiter()
+    unique_serials = list(dict.fromkeys(serial_nos))
+    locations: Dict[str, Optional[str]] = {}
+    errors: Dict[str, str] = {}
+
+    async def check(serial_no: str):
+        try:
+            locations[serial_no] = await limiter.call(check_container_current_location, serial_no)
+        except Exception as e:
+            locations[serial_no] = None
+            errors[serial_no] = str(e)
+
+    start = time.monotonic()
+    await asyncio.gather(*(check(serial_no) for serial_no in unique_serials))
+    elapsed = time.monotonic() - start
+
+    stats = {
+        'containers_checked': len(unique_serials),
+        'locations_found': sum(1 for location in locations.values() if location),
+        'errors': len(errors),
+        'erp_calls': len(unique_serials),
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_per_second': round(len(unique_serials) / elapsed, 2) if elapsed > 0 else None,
+        **limiter.get_stats()
+    }
+    return locations, errors, stats
+
+async def resolve_request_locations(requests: List[tuple], limiter: Optional[ErpCallLimiter] = None):
+    """
+    Resolve current locations for active requests grouped by part number
+    Datasource 8566 returns every container of a part with its Location, so one call
+    per distinct part resolves all of that part's serials. Serials missing from the
+    part result (or parts whose lookup failed) fall back to per-serial 4619 lookups.
+
+    Args:
+        requests: (serial_no, part_no) pairs
+
+    Returns:
+        (locations, errors, stats) like resolve_container_locations
+    """
+    limiter = limiter or ErpCallLimiter()
+    serials_by_part: Dict[str, List[str]] = {}
+    for serial_no, part_no in requests:
+        serials_by_part.setdefault(part_no, [])
+        if serial_no not in serials_by_part[part_no]:
+            serials_by_part[part_no].append(serial_no)
+
+    locations: Dict[str, Optional[str]] = {}
+    errors: Dict[str, str] = {}
+    fallback_serials: List[str] = []
+
+    async def resolve_part(part_no: str, serials: List[str]):
+        part_locations = None
+        if part_no:
+            try:
+                table = await limiter.call(fetch_containers_by_part_no, part_no)
+                if table is not None:
+                    part_locations = {
+                        str(serial): location
+                        for serial, location in zip(table.column('Serial_No'), table.column('Location'))
+                    }
+            except Exception as e:
+                logger.error(f"❌ Error fetching containers for part {part_no}: {e}")
+        if part_locations is None:
+            fallback_serials.extend(serials)
+            return
+
+        for serial_no in serials:
+            if str(serial_no) in part_locations:
+                locations[serial_no] = part_locations[str(serial_no)]
+            else:
+                fallback_serials.append(serial_no)
+
+    start = time.monotonic()
+    await asyncio.gather(*(resolve_part(part_no, serials) for part_no, serials in serials_by_part.items()))
+    part_calls = limiter.calls
+
+    if fallback_serials:
+        fallback_locations, fallback_errors, _ = await resolve_container_locations(fallback_serials, limiter)
+        locations.update(fallback_locations)
+        errors.update(fallback_errors)
+    elapsed = time.monotonic() - start
+
+    containers_checked = len(locations)
+    stats = {
+        'containers_checked': containers_checked,
+        'locations_found': sum(1 for location in locations.values() if location),
+        'errors': len(errors),
+        'distinct_parts': len(serials_by_part),
+        'part_lookups': part_calls,
+        'serial_fallback_lookups': limiter.calls - part_calls,
+        'erp_calls': limiter.calls,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_per_second': round(containers_checked / elapsed, 2) if elapsed > 0 else None,
+        **limiter.get_stats()
+    }
+    logger.info(
+        f"📍 Location check: {containers_checked} containers via {stats['erp_calls']} ERP calls "
+        f"({stats['part_lookups']} part, {stats['serial_fallback_lookups']} serial) in {stats['elapsed_seconds']}s"
+    )
+    return locations, errors, stats
+
+# COMMENTED OUT - Auto cleanup disabled
+# async def automated_container_cleanup():
+#     """
+#     Main automated cleanup function that runs every minute
+#     Checks if requested containers have moved to production locations and removes them
+#     """
+#     try:
+#        logger.info(f"🧹 Starting automated container cleanup...")
+#        
+#        # Get production locations
+#        prod_locations = await get_prod_locations()
+#        if not prod_locations:
+#            logger.error(f"🚨 CRITICAL: No production locations found! Aborting cleanup.")
+#            return
+#                
+#        # Get all active requests from database (async)
+#        conn = await get_db_connection()
+#        try:
+#            cursor = await conn.cursor()
+#            await cursor.execute("""
+#                SELECT req_id, serial_no, part_no, revision, quantity, location, deliver_to, req_time
+#                FROM DROP_REQUESTS
+#                ORDER BY req_time DESC
+#            """)
+#            active_requests = await cursor.fetchall()
+#        finally:
 #            await release_db_connection(conn)
 #            
 #        logger.info(f"📊 Found {len(active_requests)} active requests to check")
@@ -964,46 +2604,13 @@ async def check_container_current_location(serial_no: str) -> Optional[str]:
 #                logger.error(f"🚨 This could indicate a system error. Aborting cleanup for safety.")
 #                return
 #            
-#            conn = await get_db_connection()
-#            try:
-#                cursor = await conn.cursor()
-#                successful_deletions = 0
-#                
-#                for container in containers_to_remove:
-#                    container_serial = container['serial_no']
-#                    
-#                    try:
-#                        # Log to history before deleting
-#                        history_logged = await log_request_to_history(
-#                            req_id=container['req_id'],
-#                            serial_no=container['serial_no'],
-#                            part_no=container['part_no'],
-#                            revision=container['revision'] or '',
-#                            quantity=float(container['quantity']) if container['quantity'] else 0.0,
-#                            location=container['stored_location'],
-#                            deliver_to=container['deliver_to'],
-#                            req_time=container['req_time'],
-#                            current_location=container['current_location'],
-#                            fulfillment_type='auto_cleanup'
-#                        )
-#                        
-#                        if history_logged:
-#                            # Only delete from DROP_REQUESTS if history logging succeeded
-#                            await cursor.execute("DELETE FROM DROP_REQUESTS WHERE req_id = ?", (container['req_id'],))
-#                            successful_deletions += 1
-#                            
-#                            logger.warning(f"✅ DELETED: Container {container_serial} (moved to {container['current_location']})")
-#                        else:
-#                            logger.error(f"⚠️ SKIPPED: Container {container_serial} (history logging failed)")
-#                            
-#                    except Exception as e:
-#                        logger.error(f"❌ ERROR: Failed to delete container {container_serial}: {e}")
-#                
-#                await conn.commit()
-#                logger.info(f"✅ Deletion complete: {successful_deletions}/{len(containers_to_remove)} successful")
-#                
-#            finally:
-#                await release_db_connection(conn)
+#            # Move them to history in one transaction
+#            moved = await storage.fulfill_requests(
+#                [(c['serial_no'], c['current_location']) for c in containers_to_remove],
+#                'auto_cleanup'
+#            )
+#            await publish_requests_removed(moved, 'auto_cleanup')
+#            logger.info(f"✅ Deletion complete: {len(moved)}/{len(containers_to_remove)} moved to history")
 #        else:
 #            logger.info("✅ No containers need to be removed at this time")
 #        
@@ -1073,18 +2680,12 @@ async def manual_container_cleanup():
         # Get active requests (async)
         try:
             logger.info("🗄️ Fetching active requests from database...")
-            conn = await get_db_connection()
-            try:
-                cursor = await conn.cursor()
-                await cursor.execute("""
-                    SELECT req_id, serial_no, part_no, revision, quantity, location, deliver_to, req_time
-                    FROM DROP_REQUESTS
-                    ORDER BY req_time DESC
-                """)
-                active_requests = await cursor.fetchall()
-            finally:
-                await release_db_connection(conn)
-                
+            active_requests = [
+                (r['req_id'], r['serial_no'], r['part_no'], r['revision'], r['quantity'], r['location'],
+                 r['deliver_to'], r['req_time'])
+                for r in await storage.list_active_requests()
+            ]
+
             results['checked_requests'] = len(active_requests)
             logger.info(f"📊 Found {len(active_requests)} active requests to check")
         except Exception as e:
@@ -1100,10 +2701,20 @@ async def manual_container_cleanup():
         
         containers_to_remove = []
         
+        # Resolve current locations concurrently, one ERP call per distinct part number
+        current_locations, location_errors, location_stats = await resolve_request_locations(
+            [(row[1], row[2]) for row in active_requests]
+        )
+        results['location_check'] = location_stats
+        for serial_no, error in location_errors.items():
+            error_msg = f"Error checking container {serial_no}: {error}"
+            logger.error(error_msg)
+            results['errors'].append(error_msg)
+        
         # Check each request
         for req_id, serial_no, part_no, revision, quantity, stored_location, deliver_to, req_time in active_requests:
             try:
-                current_location = await check_container_current_location(serial_no)
+                current_location = current_locations.get(serial_no)
                 
                 if current_location and current_location in prod_locations:
                     container_info = {
@@ -1124,54 +2735,23 @@ async def manual_container_cleanup():
                 error_msg = f"Error checking container {serial_no}: {str(e)}"
                 logger.error(error_msg)
                 results['errors'].append(error_msg)
-            
-            await asyncio.sleep(0.5)  # Shorter delay for manual testing
         print("------ containers_to_remove ------", containers_to_remove)
-        # Remove containers (async)
+        # Move fulfilled containers to history in one transaction
+        removed_count = 0
         if containers_to_remove:
-            conn = await get_db_connection()
             try:
-                cursor = await conn.cursor()
-
-                for container in containers_to_remove:
-                    try:
-                        # Convert req_time back to datetime if it's a string
-                        req_time_dt = container['req_time']
-                        if isinstance(req_time_dt, str):
-                            try:
-                                req_time_dt = datetime.fromisoformat(req_time_dt)
-                            except:
-                                req_time_dt = datetime.now()  # Fallback
-
-                        # Log to history before deleting
-                        history_logged = await log_request_to_history(
-                            req_id=container['req_id'],
-                            serial_no=container['serial_no'],
-                            part_no=container['part_no'],
-                            revision=container['revision'] or '',
-                            quantity=float(container['quantity']) if container['quantity'] else 0.0,
-                            location=container['stored_location'],
-                            deliver_to=container['deliver_to'],
-                            req_time=req_time_dt,
-                            current_location=container['current_location'],
-                            fulfillment_type='manual_cleanup'
-                        )
-                        
-                        if history_logged:
-                            await cursor.execute("DELETE FROM DROP_REQUESTS WHERE req_id = ?", (container['req_id'],))
-                        else:
-                            error_msg = f"Failed to log container {container['serial_no']} to history, skipping deletion"
-                            results['errors'].append(error_msg)
-
-                    except Exception as e:
-                        error_msg = f"Error removing container {container['serial_no']}: {str(e)}"
-                        results['errors'].append(error_msg)
-
-                await conn.commit()
-            finally:
-                await release_db_connection(conn)
+                moved = await storage.fulfill_requests(
+                    [(c['serial_no'], c['current_location']) for c in containers_to_remove],
+                    'manual_cleanup'
+                )
+                removed_count = len(moved)
+                await publish_requests_removed(moved, 'manual_cleanup')
+            except Exception as e:
+                error_msg = f"Error moving {len(containers_to_remove)} containers to history, nothing was removed: {str(e)}"
+                logger.error(error_msg)
+                results['errors'].append(error_msg)
         
-        results['removed_containers'] = len(containers_to_remove)
+        results['removed_containers'] = removed_count
         
         return results
         
@@ -1184,52 +2764,21 @@ async def manual_container_cleanup():
             'removed_containers': 0
         }
 
-# async def automated_history_cleanup():
-#     """
-#     Automated function to clean up history records older than 30 days
-#     Runs daily to maintain database performance
-#     """
-#     try:
-#         logger.info("🧹 Starting automated history cleanup...")
-#         
-#         conn = await get_db_connection()
-#         try:
-#             cursor = await conn.cursor()
-#             
-#             # Count records that will be deleted
-#             await cursor.execute("""
-#                 SELECT COUNT(*)
-#                 FROM DROP_REQUESTS_HISTORY
-#                 WHERE fulfilled_time < DATEADD(day, -30, GETDATE())
-#             """)
-#             row = await cursor.fetchone()
-#             records_to_delete = row[0] if row else 0
-# 
-#             if records_to_delete > 0:
-#                 # Delete records older than 30 days
-#                 await cursor.execute("""
-#                     DELETE FROM DROP_REQUESTS_HISTORY
-#                     WHERE fulfilled_time < DATEADD(day, -30, GETDATE())
-#                 """)
-#                 await conn.commit()
-# 
-#                 logger.info(f"✅ Cleaned up {records_to_delete} old history records (>30 days)")
-#             else:
-#                 logger.info("✅ No old history records to clean up")
-# 
-#             # Get current statistics after cleanup
-#             await cursor.execute("SELECT COUNT(*) FROM DROP_REQUESTS_HISTORY")
-#             row = await cursor.fetchone()
-#             remaining_records = row[0] if row else 0
-#             logger.info(f"📊 History table now contains {remaining_records} records")
-#         finally:
-#             await release_db_connection(conn)
-#         
-#     except Exception as e:
-#         logger.error(f"❌ Error in automated history cleanup: {e}")
-#         import traceback
-#         logger.error(f"📋 Traceback: {traceback.format_exc()}")
-# 
+async def automated_history_cleanup():
+    """
+    Automated function to clean up history records older than HISTORY_RETENTION_DAYS
+    Runs daily to maintain database performance (deletes in throttled batches, see purge_history)
+    """
+    try:
+        logger.info("🧹 Starting automated history cleanup...")
+        result = await purge_history('retention')
+        if result['status'] == 'completed':
+            logger.info(f"✅ Cleaned up {result['deleted_rows']} old history records (>{AppConfig.HISTORY_RETENTION_DAYS} days)")
+    except Exception as e:
+        logger.error(f"❌ Error in automated history cleanup: {e}")
+        import traceback
+        logger.error(f"📋 Traceback: {traceback.format_exc()}")
+
 # # --- API Routes ---
 # 
 # active_connections = []
@@ -1274,59 +2823,116 @@ async def get_containers(request: Request, part_no: str):
         print(f"[get_containers] Returning error response: {error_response}")
         return JSONResponse(content=error_response, status_code=500)
 
+def parse_req_time(req_time_str: Optional[str]) -> datetime:
+    """Client ISO timestamp as naive UTC (current UTC time if missing or unparseable)"""
+    try:
+        req_time = datetime.fromisoformat(req_time_str.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return datetime.utcnow()
+    if req_time.tzinfo is not None:
+        return req_time.astimezone(pytz.UTC).replace(tzinfo=None)
+    return req_time
+
 @app.post("/part/{part_no}/{serial_no}", response_class=JSONResponse)
 async def request_serial_no(request: Request, part_no: str, serial_no: str):
-    global req_id
     print("part_no", part_no)
     print("serial_no", serial_no)
     data = await request.json()
-    print("req_id", req_id)
     print("data", data)
 
     try:
         # Parse the req_time from ISO string and ensure it's stored consistently
         req_time_str = data['req_time']
-        try:
-            # Parse ISO string to datetime object
-            req_time = datetime.fromisoformat(req_time_str.replace('Z', '+00:00'))
-            # Convert to UTC if it has timezone info, otherwise assume it's already UTC
-            if req_time.tzinfo is not None:
-                req_time_utc = req_time.astimezone(pytz.UTC).replace(tzinfo=None)
-            else:
-                req_time_utc = req_time
-        except:
-            # Fallback to current UTC time if parsing fails
-            req_time_utc = datetime.utcnow()
+        req_time_utc = parse_req_time(req_time_str)
 
         print(f"Original req_time: {req_time_str}, Stored as UTC: {req_time_utc}")
 
         # Get master_unit_no from data if present (optional field)
         master_unit_no = data.get('master_unit_no', None)
 
-        conn = await get_db_connection()
-        try:
-            cursor = await conn.cursor()
-            await cursor.execute("INSERT INTO DROP_REQUESTS (req_id, serial_no, part_no, revision, quantity, location, deliver_to, req_time, master_unit_no) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (req_id, serial_no, part_no, data['revision'], data['quantity'], data['location'], data['workcenter'], req_time_utc, master_unit_no))
-            await conn.commit()
+        # req_id is allocated by the database, unique across workers
+        record = RequestRecord(serial_no, data['revision'], data['quantity'], data['location'], master_unit_no)
+        new_req_id = await storage.insert_request(part_no, data['workcenter'], req_time_utc, record)
 
-            if cursor.rowcount == 1:
-                print("Request inserted successfully")
-                req_id += 1
-            else:
-                print("Request insertion failed")
-        finally:
-            await release_db_connection(conn)
+        if new_req_id is not None:
+            print(f"Request inserted successfully with req_id: {new_req_id}")
+            await publish_request_event('request_added', requests=[
+                new_request_row(new_req_id, part_no, data['workcenter'], req_time_utc, record)
+            ])
+        else:
+            print("Request insertion failed")
 
     except Exception as e:
         print(f"Error inserting request: {e}")
         return JSONResponse(content={"message": "Error"})
 
-    return JSONResponse(content={"message": "Success"})
+    return JSONResponse(content={"message": "Success", "req_id": new_req_id})
+
+# 5 parameters per serial in one INSERT (SQL Server allows 2100 per statement)
+BULK_REQUEST_MAX_SERIALS = 300
+
+@app.post("/api/requests/bulk", response_class=JSONResponse)
+async def request_serial_nos_bulk(payload: BulkSerialRequest):
+    """
+    Request several containers of one part for the same workcenter in one round trip
+    All new rows are inserted in one transaction; serials that already have an active
+    request are skipped (see storage.insert_requests).
+
+    Returns per-serial status: requested, already_requested or duplicate (repeated in the payload)
+    """
+    if not payload.serials:
+        raise HTTPException(status_code=400, detail="serials must not be empty")
+    if len(payload.serials) > BULK_REQUEST_MAX_SERIALS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_REQUEST_MAX_SERIALS} serials per request")
+
+    results = []
+    unique_items = []
+    seen = set()
+    for item in payload.serials:
+        if item.serial_no in seen:
+            results.append({'serial_no': item.serial_no, 'status': 'duplicate'})
+            continue
+        seen.add(item.serial_no)
+        unique_items.append(item)
+        results.append({'serial_no': item.serial_no, 'status': None})
+
+    records = [RequestRecord(item.serial_no, item.revision, item.quantity, item.location, item.master_unit_no)
+               for item in unique_items]
+    req_time_utc = parse_req_time(payload.req_time)
+    try:
+        inserted = await storage.insert_requests(payload.part_no, payload.workcenter, req_time_utc, records)
+    except Exception as e:
+        logger.error(f"❌ Error inserting bulk request for part {payload.part_no}: {e}")
+        return JSONResponse(content={"message": "Error", "error": str(e)}, status_code=500)
+
+    if inserted:
+        await publish_request_event('request_added', requests=[
+            new_request_row(inserted[record.serial_no], payload.part_no, payload.workcenter, req_time_utc, record)
+            for record in records if record.serial_no in inserted
+        ])
+
+    for result in results:
+        if result['status'] is None:
+            if result['serial_no'] in inserted:
+                result['status'] = 'requested'
+                result['req_id'] = inserted[result['serial_no']]
+            else:
+                result['status'] = 'already_requested'
+
+    requested_count = sum(1 for result in results if result['status'] == 'requested')
+    logger.info(f"📦 Bulk request for part {payload.part_no} -> {payload.workcenter}: "
+                f"{requested_count}/{len(payload.serials)} serials requested")
+    return JSONResponse(content={
+        "message": "Success",
+        "requested": requested_count,
+        "already_requested": sum(1 for result in results if result['status'] == 'already_requested'),
+        "duplicates": sum(1 for result in results if result['status'] == 'duplicate'),
+        "results": results
+    })
 
 @app.post("/{serial_no}", response_class=JSONResponse)
 async def request_serial_no(request: Request, serial_no: str):
     try:
-        global req_id
         print("serial_no", serial_no)
         container = await get_container_by_serial_no(serial_no)
         print("-----container-----", container)
@@ -1378,7 +2984,6 @@ async def request_master_unit(request: Request, master_unit: str):
     Request an entire master unit as a single entity
     This creates ONE request entry that groups all containers
     """
-    global req_id
     try:
         print(f"[request_master_unit] Processing master_unit: {master_unit}")
         data = await request.json()
@@ -1402,15 +3007,7 @@ async def request_master_unit(request: Request, master_unit: str):
             return JSONResponse(content={"message": "All containers already requested"}, status_code=400)
 
         # Parse req_time
-        req_time_str = data['req_time']
-        try:
-            req_time = datetime.fromisoformat(req_time_str.replace('Z', '+00:00'))
-            if req_time.tzinfo is not None:
-                req_time_utc = req_time.astimezone(pytz.UTC).replace(tzinfo=None)
-            else:
-                req_time_utc = req_time
-        except:
-            req_time_utc = datetime.utcnow()
+        req_time_utc = parse_req_time(data['req_time'])
 
         # Calculate total quantity across all containers
         total_quantity = sum(float(c.get('Quantity', 0)) for c in available_containers)
@@ -1427,30 +3024,28 @@ async def request_master_unit(request: Request, master_unit: str):
         locations = list(set([c.get('Location', '') for c in available_containers]))
         location_str = ', '.join(locations) if len(locations) <= 3 else f"{locations[0]} (+{len(locations)-1} more)"
 
-        conn = await get_db_connection()
-        try:
-            cursor = await conn.cursor()
-            # Insert single master unit request
-            await cursor.execute("""
-                INSERT INTO DROP_REQUESTS (req_id, serial_no, part_no, revision, quantity, location, deliver_to, req_time, master_unit_no)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (req_id, master_serial_no, part_no, revision, total_quantity, location_str, data['workcenter'], req_time_utc, master_unit))
-            await conn.commit()
-
-            if cursor.rowcount == 1:
-                print(f"[request_master_unit] Master unit request inserted successfully with req_id: {req_id}")
-                req_id += 1
-                return JSONResponse(content={
-                    "message": "Success",
-                    "master_unit": master_unit,
-                    "containers_count": len(available_containers),
-                    "total_quantity": total_quantity
-                })
-            else:
-                print("[request_master_unit] Request insertion failed")
-                return JSONResponse(content={"message": "Error inserting request"}, status_code=500)
-        finally:
-            await release_db_connection(conn)
+        # Insert single master unit request
+        record = RequestRecord(master_serial_no, revision, total_quantity, location_str, master_unit)
+        new_req_id = await storage.insert_request(part_no, data['workcenter'], req_time_utc, record)
+
+        if new_req_id is not None:
+            print(f"[request_master_unit] Master unit request inserted successfully with req_id: {new_req_id}")
+            await publish_request_event(
+                'master_unit_requested',
+                requests=[new_request_row(new_req_id, part_no, data['workcenter'], req_time_utc, record)],
+                master_unit=master_unit,
+                containers_count=len(available_containers)
+            )
+            return JSONResponse(content={
+                "message": "Success",
+                "req_id": new_req_id,
+                "master_unit": master_unit,
+                "containers_count": len(available_containers),
+                "total_quantity": total_quantity
+            })
+        else:
+            print("[request_master_unit] Request insertion failed")
+            return JSONResponse(content={"message": "Error inserting request"}, status_code=500)
 
     except Exception as e:
         print(f"[request_master_unit] ERROR: {str(e)}")
@@ -1498,16 +3093,23 @@ async def get_database_debug_view(request: Request):
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    active_connections.append(websocket)
+    # Clients take the hello seq as the base for gap detection, then load /api/requests;
+    # the hello is queued before any event can reach this connection
+    connection = websocket_hub.connect(websocket, {
+        'type': 'hello',
+        'seq': request_event_seq,
+        'fallback_poll_seconds': AppConfig.REQUESTS_FALLBACK_POLL_SECONDS
+    })
     try:
         while True:
             data = await websocket.receive_text()
-            # Send to all other users (broadcast style)
-            for conn in active_connections:
-                if conn != websocket:
-                    await conn.send_text(data)
+            # Send to all other users (broadcast style), in every worker
+            websocket_hub.broadcast(data, exclude=connection)
+            await publish_to_bus('message', data)
     except WebSocketDisconnect:
-        active_connections.remove(websocket)
+        pass
+    finally:
+        websocket_hub.disconnect(connection)
 
 @app.get("/barcode/{location}", response_class=JSONResponse)
 async def get_barcode(location: str):
@@ -1526,43 +3128,35 @@ async def get_barcode(location: str):
         print(f"Error fetching barcode: {e}")
         return JSONResponse(content={"barcode": "N/A"})
 
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check with weak comparison (a W/ prefix is ignored on both sides)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque_tag = etag.removeprefix('W/')
+    return any(tag.strip().removeprefix('W/') == opaque_tag for tag in if_none_match.split(','))
+
 @app.get("/api/requests", response_class=JSONResponse)
-async def get_all_requests():
-    try:
-        print("Attempting to connect to database...")
-        conn = await get_db_connection()
-        try:
-            print("Connected to database successfully")
-            cursor = await conn.cursor()
-            print("Executing SQL query...")
-            await cursor.execute("""
-                SELECT *
-                FROM DROP_REQUESTS
-                ORDER BY req_time DESC
-            """)
-            print("Query executed successfully")
-            columns = [column[0] for column in cursor.description]
-            print(f"Columns found: {columns}")
-            requests = []
-            rows = await cursor.fetchall()
-            print(f"Number of rows fetched: {len(rows)}")
-            
-            for row in rows:
-                # Convert row to dict and handle datetime serialization
-                request_dict = {}
-                for i, value in enumerate(row):
-                    if isinstance(value, datetime):
-                        request_dict[columns[i]] = value.isoformat()
-                    elif isinstance(value, Decimal):
-                        request_dict[columns[i]] = float(value)
-                    else:
-                        request_dict[columns[i]] = value
-                requests.append(request_dict)
-            
-            print("Successfully processed all rows")
-            return JSONResponse(content=requests)
-        finally:
-            await release_db_connection(conn)
+async def get_all_requests(request: Request, part_no: Optional[str] = None, deliver_to: Optional[str] = None):
+    """
+    All active requests, newest first, optionally only one part_no and/or deliver_to
+    Served from the worker's active requests view. The ETag is the view's change log
+    version (see storage.active_requests_version); a matching If-None-Match is answered with 304.
+    """
+    try:
+        version, rows = await active_requests.list_requests(part_no, deliver_to)
+        etag = f'W/"{version}"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(request.headers.get('if-none-match'), etag):
+            return Response(status_code=304, headers=headers)
+
+        print(f"Number of rows fetched: {len(rows)}")
+
+        requests = [format_request_row(row) for row in rows]
+
+        print("Successfully processed all rows")
+        return JSONResponse(content=requests, headers=headers)
     except Exception as e:
         print(f"Error fetching requests: {str(e)}")
         print(f"Error type: {type(e)}")
@@ -1573,49 +3167,15 @@ async def get_all_requests():
 @app.delete("/api/requests/{serial_no}", response_class=JSONResponse)
 async def delete_request(serial_no: str):
     try:
-        conn = await get_db_connection()
-        try:
-            cursor = await conn.cursor()
-            
-            # First, get the request data before deleting for history logging
-            await cursor.execute("""
-                SELECT req_id, serial_no, part_no, revision, quantity, location, deliver_to, req_time
-                FROM DROP_REQUESTS
-                WHERE serial_no = ?
-            """, (serial_no,))
-            request_data = await cursor.fetchone()
-            
-            if not request_data:
-                raise HTTPException(status_code=404, detail="Request not found")
-            
-            # Extract the request data
-            req_id, serial_no_db, part_no, revision, quantity, location, deliver_to, req_time = request_data
-            
-            # Log to history before deleting (manual delete - no current_location since we don't know where it went)
-            history_logged = await log_request_to_history(
-                req_id=req_id,
-                serial_no=serial_no_db,
-                part_no=part_no,
-                revision=revision or '',
-                quantity=float(quantity) if quantity else 0.0,
-                location=location,
-                deliver_to=deliver_to,
-                req_time=req_time,
-                current_location='Unknown (Manual Delete)',
-                fulfillment_type='manual_delete'
-            )
-            
-            if not history_logged:
-                logger.warning(f"⚠️ Failed to log request {serial_no} to history, but proceeding with deletion")
-
-            # Delete from DROP_REQUESTS table
-            await cursor.execute("DELETE FROM DROP_REQUESTS WHERE serial_no = ?", (serial_no,))
-            await conn.commit()
-            
-            logger.info(f"🗑️ Manual delete: Request {serial_no} removed by user")
-            return JSONResponse(content={"message": "Request deleted successfully"})
-        finally:
-            await release_db_connection(conn)
+        # Move to history and delete in one transaction (manual delete - no current_location since we don't know where it went)
+        moved = await storage.fulfill_requests([(serial_no, 'Unknown (Manual Delete)')], 'manual_delete')
+        
+        if not moved:
+            raise HTTPException(status_code=404, detail="Request not found")
+        await publish_requests_removed(moved, 'manual_delete')
+        
+        logger.info(f"🗑️ Manual delete: Request {serial_no} removed by user")
+        return JSONResponse(content={"message": "Request deleted successfully"})
             
     except HTTPException as he:
         raise he
@@ -1693,15 +3253,7 @@ async def get_cleanup_status():
         }
         
         # Get current database statistics
-        conn = await get_db_connection()
-        try:
-            cursor = await conn.cursor()
-            await cursor.execute("SELECT COUNT(*) FROM DROP_REQUESTS")
-            row = await cursor.fetchone()
-            active_requests_count = row[0] if row else 0
-        finally:
-            await release_db_connection(conn)
-            
+        active_requests_count, _, _ = await active_requests.summary()
         status_info['active_requests_count'] = active_requests_count
         
         return JSONResponse(content=status_info)
@@ -1722,24 +3274,13 @@ async def get_cleanup_logs():
         
         prod_locations = await get_prod_locations()
         
-        conn = await get_db_connection()
-        try:
-            cursor = await conn.cursor()
-            await cursor.execute("""
-                SELECT COUNT(*) as total_requests,
-                       MIN(req_time) as oldest_request,
-                       MAX(req_time) as newest_request
-                FROM DROP_REQUESTS
-            """)
-            stats = await cursor.fetchone()
-        finally:
-            await release_db_connection(conn)
+        total_requests, oldest_request, newest_request = await active_requests.summary()
         
         return JSONResponse(content={
             'production_locations': prod_locations,
-            'total_active_requests': stats[0] if stats else 0,
-            'oldest_request': stats[1].isoformat() if stats and stats[1] else None,
-            'newest_request': stats[2].isoformat() if stats and stats[2] else None,
+            'total_active_requests': total_requests,
+            'oldest_request': oldest_request.isoformat() if oldest_request else None,
+            'newest_request': newest_request.isoformat() if newest_request else None,
             'system_time': datetime.now().isoformat()
         })
         
@@ -1747,8 +3288,225 @@ async def get_cleanup_logs():
         logger.error(f"Error getting cleanup logs: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- Admin API Endpoints ---
+
+@app.post("/api/admin/prod-locations/refresh", response_class=JSONResponse)
+async def refresh_prod_locations():
+    """
+    Force a refresh of the cached production locations from Plex
+    On failure the last good value stays in the cache
+    """
+    refreshed = await prod_locations_cache.refresh()
+    stats = prod_locations_cache.get_stats()
+    if refreshed:
+        logger.info(f"🔄 Production locations refreshed: {stats['entries']} locations")
+    else:
+        logger.error(f"❌ Production locations refresh failed: {stats['last_error']}")
+
+    return JSONResponse(content={
+        'status': 'success' if refreshed else 'error',
+        'cache': stats
+    }, status_code=200 if refreshed else 502)
+
+@app.post("/api/admin/history-ngrams/backfill", response_class=JSONResponse)
+async def backfill_history_ngrams_endpoint():
+    """
+    Add history rows that are missing from the trigram search index
+    """
+    require_azure_storage("The history search index")
+    try:
+        result = await backfill_history_ngrams()
+        return JSONResponse(content={'status': 'success', **result})
+    except Exception as e:
+        logger.error(f"❌ Error backfilling history search index: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/admin/history-rollups/rebuild", response_class=JSONResponse)
+async def rebuild_history_rollups_endpoint():
+    """
+    Recompute the history stats rollups from DROP_REQUESTS_HISTORY
+    History writes wait until the rebuild commits
+    """
+    require_azure_storage("History rollups")
+    try:
+        result = await rebuild_history_rollups()
+        return JSONResponse(content={'status': 'success', **result})
+    except Exception as e:
+        logger.error(f"❌ Error rebuilding history rollups: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Purge started from an endpoint in this worker (runs in the background)
+history_purge_task: Optional[asyncio.Task] = None
+
+async def start_history_purge_task(mode: str, **options) -> Dict[str, Any]:
+    """
+    Run purge_history in the background of this worker and return once its run is recorded
+    (purge_id, rows_to_delete, ...); 409 if a purge is already running in any worker
+    """
+    global history_purge_task
+    if history_purge_task is not None and not history_purge_task.done():
+        raise HTTPException(status_code=409, detail="A history purge is already running in this worker")
+    started = asyncio.get_running_loop().create_future()
+
+    async def run():
+        try:
+            await purge_history(mode, started=started, **options)
+        except Exception as e:
+            logger.error(f"❌ History purge ({mode}) failed: {e}")
+            if not started.done():
+                started.set_exception(e)
+
+    history_purge_task = asyncio.ensure_future(run())
+    run_info = await started
+    if run_info['status'] == 'skipped':
+        raise HTTPException(status_code=409, detail="A history purge is already running, try again when it finishes")
+    return {
+        'status': 'started',
+        'purge_id': run_info['purge_id'],
+        'mode': mode,
+        'resumed': run_info['resumed'],
+        'rows_to_delete': run_info['rows_to_delete'] - run_info['deleted_rows']
+    }
+
+@app.post("/api/admin/history-purge/run", response_class=JSONResponse)
+async def run_history_purge(days: Optional[int] = None, batch_size: Optional[int] = None,
+                            pause_seconds: Optional[float] = None):
+    """
+    Start a retention purge of history older than `days` (HISTORY_RETENTION_DAYS by default)
+    Runs in the background; follow it with GET /api/admin/history-purge
+    """
+    require_azure_storage("Batched history purges")
+    if days is not None and days < 1:
+        raise HTTPException(status_code=400, detail="days must be at least 1")
+    if batch_size is not None and batch_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size must be at least 1")
+
+    try:
+        result = await start_history_purge_task('retention', days=days, batch_size=batch_size,
+                                                pause_seconds=pause_seconds)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error starting history purge: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return JSONResponse(content={
+        **result,
+        'retention_days': AppConfig.HISTORY_RETENTION_DAYS if days is None else days
+    }, status_code=202)
+
+@app.get("/api/admin/history-purge", response_class=JSONResponse)
+async def get_history_purge_status(limit: int = 10):
+    """Progress of the most recent history purge runs (retention and clear-all)"""
+    require_azure_storage("Batched history purges")
+    try:
+        runs = await get_history_purge_runs(limit=max(1, min(limit, 100)))
+        return JSONResponse(content={
+            'running_in_this_worker': history_purge_task is not None and not history_purge_task.done(),
+            'runs': runs
+        })
+    except Exception as e:
+        logger.error(f"❌ Error reading history purge status: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# --- Metrics API Endpoints ---
+
+@app.get("/api/metrics/erp", response_class=JSONResponse)
+async def get_erp_metrics():
+    """
+    ERP request coalescing counters (per worker process)
+    coalesced_calls counts callers that shared an in-flight upstream request
+    """
+    return JSONResponse(content={
+        'coalescing': erp_single_flight.get_stats(),
+        'prod_locations_cache': prod_locations_cache.get_stats(),
+        'system_time': datetime.now().isoformat()
+    })
+
+@app.get("/api/metrics/db-pool", response_class=JSONResponse)
+async def get_db_pool_metrics():
+    """
+    Database connection pool usage (per worker process)
+    holders lists the call sites currently holding a connection, longest first
+    """
+    return JSONResponse(content={
+        'storage_backend': storage.name,
+        'pool': connection_pool.get_stats() if connection_pool else None,
+        'system_time': datetime.now().isoformat()
+    })
+
+@app.get("/api/metrics/websocket", response_class=JSONResponse)
+async def get_websocket_metrics():
+    """
+    WebSocket fan-out state (per worker process)
+    Per connection: queue depth, lag_seconds (age of the oldest unsent message), sent / dropped / coalesced counters
+    """
+    return JSONResponse(content={
+        'hub': websocket_hub.get_stats(),
+        'request_event_seq': request_event_seq,
+        'bus': broadcast_bus.get_stats(),
+        'system_time': datetime.now().isoformat()
+    })
+
+@app.get("/api/metrics/requests-view", response_class=JSONResponse)
+async def get_requests_view_metrics():
+    """
+    Active requests view state (per worker process)
+    lag_seconds is how old the data currently held is; max_served_lag_seconds the oldest data any read was answered from
+    """
+    return JSONResponse(content={
+        'requests_view': active_requests.get_stats(),
+        'refresh_seconds': AppConfig.REQUESTS_VIEW_REFRESH_SECONDS,
+        'system_time': datetime.now().isoformat()
+    })
+
+@app.get("/api/metrics/cache", response_class=JSONResponse)
+async def get_cache_metrics():
+    """
+    Hit/miss counters of the /api/history and /api/history/stats response cache (per worker process)
+    """
+    return JSONResponse(content={
+        'history_responses': history_response_cache.get_stats(),
+        'history_count_entries': len(_history_count_cache),
+        'system_time': datetime.now().isoformat()
+    })
+
 # --- History API Endpoints ---
 
+# Cached COUNT(*) results for /api/history, keyed by the normalized filters
+_history_count_cache: Dict[tuple, tuple] = {}
+HISTORY_COUNT_CACHE_MAX_ENTRIES = 256
+
+def encode_history_cursor(fulfilled_time: datetime, history_id: int) -> str:
+    """Opaque keyset cursor for /api/history: position after (fulfilled_time, history_id)"""
+    raw = json.dumps({'t': fulfilled_time.isoformat(), 'id': history_id})
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_history_cursor(cursor: str) -> tuple:
+    """Inverse of encode_history_cursor, raises ValueError on a malformed cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(raw['t']), int(raw['id'])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+async def count_history_rows(cursor, where_clause: str, params: list, cache_key: tuple, use_cache: bool) -> int:
+    """COUNT(*) for the history filters, reusing a recent result for the same filters when use_cache is set"""
+    now = time.monotonic()
+    if use_cache:
+        cached = _history_count_cache.get(cache_key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    await cursor.execute(f"SELECT COUNT(*) FROM DROP_REQUESTS_HISTORY WHERE {where_clause}", params)
+    row = await cursor.fetchone()
+    total_count = row[0] if row else 0
+
+    if len(_history_count_cache) >= HISTORY_COUNT_CACHE_MAX_ENTRIES:
+        _history_count_cache.clear()
+    _history_count_cache[cache_key] = (now + AppConfig.HISTORY_COUNT_CACHE_SECONDS, total_count)
+    return total_count
+
 @app.get("/api/history", response_class=JSONResponse)
 async def get_history(
     page: int = 1,
@@ -1757,10 +3515,24 @@ async def get_history(
     part_no: Optional[str] = None,
     fulfillment_type: Optional[str] = None,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    total: str = 'exact'
 ):
     """
     Get paginated history of fulfilled requests with optional filtering
+    
+    Two pagination modes share the same response shape:
+    - page/limit (OFFSET/FETCH), kept for existing clients
+    - cursor: pass pagination.next_cursor from the previous response to seek directly
+      to the next page on (fulfilled_time, history_id), which stays fast on deep pages
+    
+    total controls pagination.total_records: 'exact' (default) counts on every request,
+    'cached' reuses a count for the same filters for up to HISTORY_COUNT_CACHE_SECONDS
+    (invalidated per worker, so other workers' writes may be missing meanwhile),
+    'none' skips counting (total_records/total_pages are null)
+
+    Except with total='exact', whole responses are cached per worker (see history_response_cache)
     """
     try:
         # Validate pagination parameters
@@ -1768,331 +3540,489 @@ async def get_history(
             page = 1
         if limit < 1 or limit > 500:  # Max 500 records per page
             limit = 50
+        if total not in ('exact', 'cached', 'none'):
+            total = 'exact'
             
         offset = (page - 1) * limit
         
-        # Build WHERE clause with filters
-        where_clauses = ["fulfilled_time >= DATEADD(day, -30, GETDATE())"]  # Only last 30 days
-        # Exclude TEST workcenter/deliver_to from history display
-        where_clauses.append("deliver_to != 'TEST'")
-        params = []
+        keyset = None
+        if cursor:
+            try:
+                keyset = decode_history_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
         
-        if serial_no:
-            where_clauses.append("serial_no LIKE ?")
-            params.append(f"%{serial_no}%")
+        use_response_cache = total != 'exact'
+        response_cache_key = ('history', None if keyset else page, limit, serial_no, part_no,
+                              fulfillment_type, start_date, end_date, cursor, total)
+        if use_response_cache:
+            cached = history_response_cache.get(response_cache_key)
+            if cached is not None:
+                return JSONResponse(content=cached)
+        cache_generation = history_response_cache.generation
+        
+        filters = HistoryFilters(serial_no, part_no, fulfillment_type)
+        for name, value in (('start_date', start_date), ('end_date', end_date)):
+            if value:
+                try:
+                    filters = filters._replace(**{name: datetime.fromisoformat(value)})
+                except ValueError:
+                    pass  # Invalid date format, skip filter
+
+        # Get one extra row to know whether there is a next page
+        rows, total_count = await storage.query_history(filters, limit + 1, offset, keyset, total)
+        
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        
+        next_cursor = None
+        if has_next and rows:
+            next_cursor = encode_history_cursor(rows[-1]['fulfilled_time'], rows[-1]['history_id'])
+        
+        history_records = []
+        for row in rows:
+            record = {}
+            for column, value in row.items():
+                if isinstance(value, datetime):
+                    # Convert datetime fields to Czech timezone
+                    if column in ['req_time', 'fulfilled_time']:
+                        record[column] = convert_to_czech_timezone(value)
+                    else:
+                        record[column] = value.isoformat()
+                elif isinstance(value, Decimal):
+                    record[column] = float(value)
+                else:
+                    record[column] = value
+            history_records.append(record)
+        
+        # Calculate pagination info
+        total_pages = (total_count + limit - 1) // limit if total_count is not None else None
+        
+        content = {
+            'data': history_records,
+            'pagination': {
+                'current_page': None if keyset else page,
+                'total_pages': total_pages,
+                'total_records': total_count,
+                'total_mode': total,
+                'limit': limit,
+                'has_next': has_next,
+                'has_prev': bool(keyset) or page > 1,
+                'next_cursor': next_cursor
+            },
+            'filters': {
+                'serial_no': serial_no,
+                'part_no': part_no,
+                'fulfillment_type': fulfillment_type,
+                'start_date': start_date,
+                'end_date': end_date
+            }
+        }
+        if use_response_cache:
+            history_response_cache.put(response_cache_key, content, cache_generation)
+        return JSONResponse(content=content)
             
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting history: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+SHIFT_TIME_RANGES = {
+    'Morning': 'Morning (6:00-14:00)',
+    'Evening': 'Evening (14:00-22:00)',
+    'Night': 'Night (22:00-6:00)'
+}
+
+def _history_stats_queries_from_history(days: int, part_no: Optional[str]) -> Dict[str, Callable]:
+    """
+    /api/history/stats queries aggregating DROP_REQUESTS_HISTORY directly (the pre-rollup path)
+    Each query is an independent coroutine function taking a cursor.
+    """
+    # Build WHERE clause
+    where_clauses = [f"fulfilled_time >= DATEADD(day, -{days}, GETDATE())"]
+    # Exclude TEST workcenter/deliver_to from calculations
+    where_clauses.append("deliver_to != 'TEST'")
+    params = []
+
+    if part_no:
+        where_clauses.append("part_no = ?")
+        params.append(part_no)
+
+    where_clause = " AND ".join(where_clauses)
+
+    async def overall(cursor):
+        # Overall statistics (exclude manual_delete from performance calculations)
+        await cursor.execute(f"""
+            SELECT
+                COUNT(CASE WHEN fulfillment_type != 'manual_delete' THEN 1 END) as total_fulfilled,
+                AVG(CASE WHEN fulfillment_type != 'manual_delete' THEN CAST(fulfillment_duration_minutes AS FLOAT) END) as avg_fulfillment_minutes,
+                MIN(CASE WHEN fulfillment_type != 'manual_delete' THEN fulfillment_duration_minutes END) as min_fulfillment_minutes,
+                MAX(CASE WHEN fulfillment_type != 'manual_delete' THEN fulfillment_duration_minutes END) as max_fulfillment_minutes,
+                COUNT(CASE WHEN fulfillment_type = 'auto_cleanup' THEN 1 END) as auto_fulfilled,
+                COUNT(CASE WHEN fulfillment_type = 'manual_cleanup' THEN 1 END) as manual_cleanup,
+                COUNT(CASE WHEN fulfillment_type = 'manual_delete' THEN 1 END) as manual_delete
+            FROM DROP_REQUESTS_HISTORY
+            WHERE {where_clause}
+        """, params)
+        return await cursor.fetchone()
+
+    async def by_part_number(cursor):
+        # Statistics by part number (exclude manual_delete from performance calculations)
+        await cursor.execute(f"""
+            SELECT
+                part_no,
+                COUNT(CASE WHEN fulfillment_type != 'manual_delete' THEN 1 END) as fulfilled_count,
+                AVG(CASE WHEN fulfillment_type != 'manual_delete' THEN CAST(fulfillment_duration_minutes AS FLOAT) END) as avg_fulfillment_minutes,
+                MIN(CASE WHEN fulfillment_type != 'manual_delete' THEN fulfillment_duration_minutes END) as min_fulfillment_minutes,
+                MAX(CASE WHEN fulfillment_type != 'manual_delete' THEN fulfillment_duration_minutes END) as max_fulfillment_minutes
+            FROM DROP_REQUESTS_HISTORY
+            WHERE {where_clause}
+            GROUP BY part_no
+            HAVING COUNT(CASE WHEN fulfillment_type != 'manual_delete' THEN 1 END) > 0
+            ORDER BY fulfilled_count DESC, avg_fulfillment_minutes ASC
+        """, params)
+        return await cursor.fetchall()
+
+    async def daily_trends(cursor):
+        # Daily fulfillment trend (last 7 days for performance, exclude manual_delete)
+        trend_days = min(days, 7)
+        await cursor.execute(f"""
+            SELECT
+                CAST(fulfilled_time AS DATE) as fulfillment_date,
+                COUNT(CASE WHEN fulfillment_type != 'manual_delete' THEN 1 END) as fulfilled_count,
+                AVG(CASE WHEN fulfillment_type != 'manual_delete' THEN CAST(fulfillment_duration_minutes AS FLOAT) END) as avg_duration
+            FROM DROP_REQUESTS_HISTORY
+            WHERE fulfilled_time >= DATEADD(day, -{trend_days}, GETDATE()) AND deliver_to != 'TEST'
+            {(" AND " + " AND ".join(where_clauses[2:])) if len(where_clauses) > 2 else ""}
+            GROUP BY CAST(fulfilled_time AS DATE)
+            HAVING COUNT(CASE WHEN fulfillment_type != 'manual_delete' THEN 1 END) > 0
+            ORDER BY fulfillment_date DESC
+        """, params[1:] if part_no else [])
+        return await cursor.fetchall()
+
+    async def performance_breakdown(cursor):
+        # Performance categories (fast, medium, slow, exclude manual_delete and unknown durations)
+        await cursor.execute(f"""
+            SELECT
+                CASE
+                    WHEN fulfillment_duration_minutes <= 60 THEN 'Fast (≤1 hour)'
+                    WHEN fulfillment_duration_minutes <= 480 THEN 'Medium (1-8 hours)'
+                    WHEN fulfillment_duration_minutes <= 1440 THEN 'Slow (8-24 hours)'
+                    ELSE 'Very Slow (>24 hours)'
+                END as performance_category,
+                COUNT(*) as count,
+                AVG(CAST(fulfillment_duration_minutes AS FLOAT)) as avg_minutes
+            FROM DROP_REQUESTS_HISTORY
+            WHERE {where_clause} AND fulfillment_type != 'manual_delete' AND fulfillment_duration_minutes IS NOT NULL
+            GROUP BY
+                CASE
+                    WHEN fulfillment_duration_minutes <= 60 THEN 'Fast (≤1 hour)'
+                    WHEN fulfillment_duration_minutes <= 480 THEN 'Medium (1-8 hours)'
+                    WHEN fulfillment_duration_minutes <= 1440 THEN 'Slow (8-24 hours)'
+                    ELSE 'Very Slow (>24 hours)'
+                END
+            ORDER BY avg_minutes ASC
+        """, params)
+        return await cursor.fetchall()
+
+    async def by_shift(cursor):
+        # Shift breakdown, bucketed by Czech local time in SQL (exclude manual_delete)
+        await cursor.execute(f"""
+            SELECT
+                s.shift,
+                COUNT(*) as fulfilled_count,
+                AVG(CAST(fulfillment_duration_minutes AS FLOAT)) as avg_fulfillment_minutes,
+                MIN(fulfillment_duration_minutes) as min_fulfillment_minutes,
+                MAX(fulfillment_duration_minutes) as max_fulfillment_minutes,
+                COUNT(CASE WHEN fulfillment_type = 'auto_cleanup' THEN 1 END) as auto_fulfilled,
+                COUNT(CASE WHEN fulfillment_type = 'manual_cleanup' THEN 1 END) as manual_cleanup,
+                COUNT(CASE WHEN fulfillment_type = 'manual_delete' THEN 1 END) as manual_delete
+            FROM DROP_REQUESTS_HISTORY
+            CROSS APPLY (SELECT {czech_shift_sql('fulfilled_time')} AS shift) s
+            WHERE {where_clause} AND fulfillment_type != 'manual_delete'
+            GROUP BY s.shift
+        """, params)
+        return {row[0]: tuple(row[1:]) for row in await cursor.fetchall()}
+
+    return {
+        'overall': overall,
+        'by_part_number': by_part_number,
+        'daily_trends': daily_trends,
+        'performance_breakdown': performance_breakdown,
+        'by_shift': by_shift
+    }
+
+def _history_stats_queries_from_rollups(days: int, part_no: Optional[str]) -> Dict[str, Callable]:
+    """
+    /api/history/stats queries over DROP_REQUESTS_HISTORY_ROLLUP
+    Rollups are per UTC day, so the window covers whole days back from today.
+    """
+    def window(window_days: int):
+        clauses = [f"rollup_date >= CAST(DATEADD(day, -{window_days}, GETUTCDATE()) AS DATE)", "deliver_to != 'TEST'"]
+        params = []
         if part_no:
-            where_clauses.append("part_no LIKE ?")
-            params.append(f"%{part_no}%")
-            
-        if fulfillment_type:
-            where_clauses.append("fulfillment_type = ?")
-            params.append(fulfillment_type)
-            
-        if start_date:
-            try:
-                start_dt = datetime.fromisoformat(start_date)
-                where_clauses.append("fulfilled_time >= ?")
-                params.append(start_dt)
-            except:
-                pass  # Invalid date format, skip filter
-                
-        if end_date:
+            clauses.append("part_no = ?")
+            params.append(part_no)
+        return " AND ".join(clauses), params
+
+    where_clause, params = window(days)
+    performed = "fulfillment_type != 'manual_delete'"
+    avg_minutes = (f"SUM(CASE WHEN {performed} THEN CAST(duration_sum AS FLOAT) END)"
+                   f" / NULLIF(SUM(CASE WHEN {performed} THEN duration_count END), 0)")
+
+    async def overall(cursor):
+        await cursor.execute(f"""
+            SELECT
+                ISNULL(SUM(CASE WHEN {performed} THEN fulfilled_count END), 0) as total_fulfilled,
+                {avg_minutes} as avg_fulfillment_minutes,
+                MIN(CASE WHEN {performed} THEN duration_min END) as min_fulfillment_minutes,
+                MAX(CASE WHEN {performed} THEN duration_max END) as max_fulfillment_minutes,
+                ISNULL(SUM(CASE WHEN fulfillment_type = 'auto_cleanup' THEN fulfilled_count END), 0) as auto_fulfilled,
+                ISNULL(SUM(CASE WHEN fulfillment_type = 'manual_cleanup' THEN fulfilled_count END), 0) as manual_cleanup,
+                ISNULL(SUM(CASE WHEN fulfillment_type = 'manual_delete' THEN fulfilled_count END), 0) as manual_delete
+            FROM DROP_REQUESTS_HISTORY_ROLLUP
+            WHERE {where_clause}
+        """, params)
+        return await cursor.fetchone()
+
+    async def by_part_number(cursor):
+        await cursor.execute(f"""
+            SELECT
+                NULLIF(part_no, '') as part_no,
+                ISNULL(SUM(CASE WHEN {performed} THEN fulfilled_count END), 0) as fulfilled_count,
+                {avg_minutes} as avg_fulfillment_minutes,
+                MIN(CASE WHEN {performed} THEN duration_min END) as min_fulfillment_minutes,
+                MAX(CASE WHEN {performed} THEN duration_max END) as max_fulfillment_minutes
+            FROM DROP_REQUESTS_HISTORY_ROLLUP
+            WHERE {where_clause}
+            GROUP BY part_no
+            HAVING SUM(CASE WHEN {performed} THEN fulfilled_count END) > 0
+            ORDER BY fulfilled_count DESC, avg_fulfillment_minutes ASC
+        """, params)
+        return await cursor.fetchall()
+
+    async def daily_trends(cursor):
+        trend_clause, trend_params = window(min(days, 7))
+        await cursor.execute(f"""
+            SELECT
+                rollup_date as fulfillment_date,
+                ISNULL(SUM(CASE WHEN {performed} THEN fulfilled_count END), 0) as fulfilled_count,
+                {avg_minutes} as avg_duration
+            FROM DROP_REQUESTS_HISTORY_ROLLUP
+            WHERE {trend_clause}
+            GROUP BY rollup_date
+            HAVING SUM(CASE WHEN {performed} THEN fulfilled_count END) > 0
+            ORDER BY fulfillment_date DESC
+        """, trend_params)
+        return await cursor.fetchall()
+
+    async def performance_breakdown(cursor):
+        await cursor.execute(f"""
+            SELECT {", ".join(f"SUM({prefix}_count), SUM(CAST({prefix}_sum AS FLOAT))" for _, prefix, _ in PERFORMANCE_CATEGORIES)}
+            FROM DROP_REQUESTS_HISTORY_ROLLUP
+            WHERE {where_clause} AND {performed}
+        """, params)
+        category_sums = await cursor.fetchone()
+        performance_categories = []
+        for index, (_, _, label) in enumerate(PERFORMANCE_CATEGORIES):
+            count, total = (category_sums[2 * index], category_sums[2 * index + 1]) if category_sums else (None, None)
+            if count:
+                performance_categories.append((label, count, (total or 0) / count))
+        performance_categories.sort(key=lambda row: row[2])
+        return performance_categories
+
+    async def by_shift(cursor):
+        await cursor.execute(f"""
+            SELECT
+                shift,
+                SUM(fulfilled_count),
+                SUM(CAST(duration_sum AS FLOAT)) / NULLIF(SUM(duration_count), 0),
+                MIN(duration_min),
+                MAX(duration_max),
+                SUM(CASE WHEN fulfillment_type = 'auto_cleanup' THEN fulfilled_count ELSE 0 END),
+                SUM(CASE WHEN fulfillment_type = 'manual_cleanup' THEN fulfilled_count ELSE 0 END),
+                SUM(CASE WHEN fulfillment_type = 'manual_delete' THEN fulfilled_count ELSE 0 END)
+            FROM DROP_REQUESTS_HISTORY_ROLLUP
+            WHERE {where_clause} AND {performed}
+            GROUP BY shift
+        """, params)
+        return {row[0]: tuple(row[1:]) for row in await cursor.fetchall()}
+
+    return {
+        'overall': overall,
+        'by_part_number': by_part_number,
+        'daily_trends': daily_trends,
+        'performance_breakdown': performance_breakdown,
+        'by_shift': by_shift
+    }
+
+# Caps the pooled connections held by parallel stats queries across all requests of this worker
+history_stats_connections = asyncio.Semaphore(max(1, AppConfig.HISTORY_STATS_MAX_CONNECTIONS))
+
+async def _timed_stats_query(name: str, query: Callable, cursor=None):
+    """Run one stats query, on its own pooled connection unless a cursor is given"""
+    started = time.perf_counter()
+    if cursor is None:
+        async with history_stats_connections:
+            conn = await get_db_connection()
             try:
-                end_dt = datetime.fromisoformat(end_date)
-                where_clauses.append("fulfilled_time <= ?")
-                params.append(end_dt)
-            except:
-                pass  # Invalid date format, skip filter
-        
-        where_clause = " AND ".join(where_clauses)
-        
+                result = await query(await conn.cursor())
+            finally:
+                await release_db_connection(conn)
+    else:
+        result = await query(cursor)
+    return name, result, (time.perf_counter() - started) * 1000
+
+async def run_history_stats_queries(queries: Dict[str, Callable], parallel: bool):
+    """
+    Run independent stats queries, either concurrently on separate pooled connections
+    or one after another on a single connection
+
+    Returns:
+        (results by query name, elapsed milliseconds by query name)
+    """
+    if parallel:
+        outcomes = await asyncio.gather(*(_timed_stats_query(name, query) for name, query in queries.items()))
+    else:
         conn = await get_db_connection()
         try:
             cursor = await conn.cursor()
-
-            # Get total count for pagination info
-            count_sql = f"SELECT COUNT(*) FROM DROP_REQUESTS_HISTORY WHERE {where_clause}"
-            await cursor.execute(count_sql, params)
-            row = await cursor.fetchone()
-            total_count = row[0] if row else 0
-
-            # Get paginated results
-            data_sql = f"""
-                SELECT history_id, req_id, serial_no, part_no, revision, quantity,
-                       location, deliver_to, req_time, fulfilled_time,
-                       fulfillment_duration_minutes, fulfillment_type, current_location
-                FROM DROP_REQUESTS_HISTORY
-                WHERE {where_clause}
-                ORDER BY fulfilled_time DESC
-                OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-            """
-            await cursor.execute(data_sql, params + [offset, limit])
-            
-            columns = [column[0] for column in cursor.description]
-            history_records = []
-            
-            rows = await cursor.fetchall()
-            for row in rows:
-                record = {}
-                for i, value in enumerate(row):
-                    if isinstance(value, datetime):
-                        # Convert datetime fields to Czech timezone
-                        if columns[i] in ['req_time', 'fulfilled_time']:
-                            record[columns[i]] = convert_to_czech_timezone(value)
-                        else:
-                            record[columns[i]] = value.isoformat()
-                    elif isinstance(value, Decimal):
-                        record[columns[i]] = float(value)
-                    else:
-                        record[columns[i]] = value
-                history_records.append(record)
+            outcomes = [await _timed_stats_query(name, query, cursor) for name, query in queries.items()]
         finally:
             await release_db_connection(conn)
-            
-            # Calculate pagination info
-            total_pages = (total_count + limit - 1) // limit
-            
-            return JSONResponse(content={
-                'data': history_records,
-                'pagination': {
-                    'current_page': page,
-                    'total_pages': total_pages,
-                    'total_records': total_count,
-                    'limit': limit,
-                    'has_next': page < total_pages,
-                    'has_prev': page > 1
-                },
-                'filters': {
-                    'serial_no': serial_no,
-                    'part_no': part_no,
-                    'fulfillment_type': fulfillment_type,
-                    'start_date': start_date,
-                    'end_date': end_date
-                }
-            })
-            
-    except Exception as e:
-        logger.error(f"Error getting history: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+
+    results = {name: result for name, result, _ in outcomes}
+    timings = {name: round(elapsed_ms, 2) for name, _, elapsed_ms in outcomes}
+    return results, timings
 
 @app.get("/api/history/stats", response_class=JSONResponse)
 async def get_history_stats(
     days: int = 30,
-    part_no: Optional[str] = None
+    part_no: Optional[str] = None,
+    source: Optional[str] = None,
+    parallel: Optional[bool] = None,
+    debug: bool = False
 ):
     """
     Get fulfillment statistics and analytics for the specified period (in days)
     Fulfillment durations are tracked in minutes
+
+    source: 'rollup' reads the pre-aggregated DROP_REQUESTS_HISTORY_ROLLUP table,
+    'raw' aggregates DROP_REQUESTS_HISTORY directly (default: HISTORY_STATS_SOURCE);
+    the SQLite backend has no rollups and always answers 'raw', and so does Azure SQL
+    until the existing history has been rolled up (the response names the source used)
+    parallel: run the five aggregate queries concurrently on separate pooled connections,
+    at most HISTORY_STATS_MAX_CONNECTIONS per worker (default: HISTORY_STATS_PARALLEL)
+    debug: add per-query timings to the response (bypasses the response cache)
     """
     try:
         # Validate days parameter
         if days < 1 or days > 365:  # Max 1 year
             days = 30
-            
-        conn = await get_db_connection()
-        try:
-            cursor = await conn.cursor()
-            
-            # Build WHERE clause
-            where_clauses = [f"fulfilled_time >= DATEADD(day, -{days}, GETDATE())"]
-            # Exclude TEST workcenter/deliver_to from calculations
-            where_clauses.append("deliver_to != 'TEST'")
-            params = []
-            
-            if part_no:
-                where_clauses.append("part_no = ?")
-                params.append(part_no)
-                
-            where_clause = " AND ".join(where_clauses)
-            
-            # Overall statistics (exclude manual_delete from performance calculations)
-            await cursor.execute(f"""
-                SELECT
-                    COUNT(CASE WHEN fulfillment_type != 'manual_delete' THEN 1 END) as total_fulfilled,
-                    AVG(CASE WHEN fulfillment_type != 'manual_delete' THEN CAST(fulfillment_duration_minutes AS FLOAT) END) as avg_fulfillment_minutes,
-                    MIN(CASE WHEN fulfillment_type != 'manual_delete' THEN fulfillment_duration_minutes END) as min_fulfillment_minutes,
-                    MAX(CASE WHEN fulfillment_type != 'manual_delete' THEN fulfillment_duration_minutes END) as max_fulfillment_minutes,
-                    COUNT(CASE WHEN fulfillment_type = 'auto_cleanup' THEN 1 END) as auto_fulfilled,
-                    COUNT(CASE WHEN fulfillment_type = 'manual_cleanup' THEN 1 END) as manual_cleanup,
-                    COUNT(CASE WHEN fulfillment_type = 'manual_delete' THEN 1 END) as manual_delete
-                FROM DROP_REQUESTS_HISTORY
-                WHERE {where_clause}
-            """, params)
-            overall_stats = await cursor.fetchone()
-            
-            # Statistics by part number (exclude manual_delete from performance calculations)
-            await cursor.execute(f"""
-                SELECT
-                    part_no,
-                    COUNT(CASE WHEN fulfillment_type != 'manual_delete' THEN 1 END) as fulfilled_count,
-                    AVG(CASE WHEN fulfillment_type != 'manual_delete' THEN CAST(fulfillment_duration_minutes AS FLOAT) END) as avg_fulfillment_minutes,
-                    MIN(CASE WHEN fulfillment_type != 'manual_delete' THEN fulfillment_duration_minutes END) as min_fulfillment_minutes,
-                    MAX(CASE WHEN fulfillment_type != 'manual_delete' THEN fulfillment_duration_minutes END) as max_fulfillment_minutes
-                FROM DROP_REQUESTS_HISTORY
-                WHERE {where_clause}
-                GROUP BY part_no
-                HAVING COUNT(CASE WHEN fulfillment_type != 'manual_delete' THEN 1 END) > 0
-                ORDER BY fulfilled_count DESC, avg_fulfillment_minutes ASC
-            """, params)
-            part_stats = await cursor.fetchall()
-            
-            # Daily fulfillment trend (last 7 days for performance, exclude manual_delete)
-            trend_days = min(days, 7)
-            await cursor.execute(f"""
-                SELECT
-                    CAST(fulfilled_time AS DATE) as fulfillment_date,
-                    COUNT(CASE WHEN fulfillment_type != 'manual_delete' THEN 1 END) as fulfilled_count,
-                    AVG(CASE WHEN fulfillment_type != 'manual_delete' THEN CAST(fulfillment_duration_minutes AS FLOAT) END) as avg_duration
-                FROM DROP_REQUESTS_HISTORY
-                WHERE fulfilled_time >= DATEADD(day, -{trend_days}, GETDATE()) AND deliver_to != 'TEST'
-                {(" AND " + " AND ".join(where_clauses[2:])) if len(where_clauses) > 2 else ""}
-                GROUP BY CAST(fulfilled_time AS DATE)
-                HAVING COUNT(CASE WHEN fulfillment_type != 'manual_delete' THEN 1 END) > 0
-                ORDER BY fulfillment_date DESC
-            """, params[1:] if part_no else [])
-            daily_trend = await cursor.fetchall()
-            
-            # Performance categories (fast, medium, slow, exclude manual_delete)
-            await cursor.execute(f"""
-                SELECT
-                    CASE
-                        WHEN fulfillment_duration_minutes <= 60 THEN 'Fast (≤1 hour)'
-                        WHEN fulfillment_duration_minutes <= 480 THEN 'Medium (1-8 hours)'
-                        WHEN fulfillment_duration_minutes <= 1440 THEN 'Slow (8-24 hours)'
-                        ELSE 'Very Slow (>24 hours)'
-                    END as performance_category,
-                    COUNT(*) as count,
-                    AVG(CAST(fulfillment_duration_minutes AS FLOAT)) as avg_minutes
-                FROM DROP_REQUESTS_HISTORY
-                WHERE {where_clause} AND fulfillment_type != 'manual_delete'
-                GROUP BY
-                    CASE
-                        WHEN fulfillment_duration_minutes <= 60 THEN 'Fast (≤1 hour)'
-                        WHEN fulfillment_duration_minutes <= 480 THEN 'Medium (1-8 hours)'
-                        WHEN fulfillment_duration_minutes <= 1440 THEN 'Slow (8-24 hours)'
-                        ELSE 'Very Slow (>24 hours)'
-                    END
-                ORDER BY avg_minutes ASC
-            """, params)
-            performance_categories = await cursor.fetchall()
-            
-            # Get all history records for shift analysis (exclude manual_delete)
-            await cursor.execute(f"""
-                SELECT fulfilled_time, fulfillment_duration_minutes, fulfillment_type
-                FROM DROP_REQUESTS_HISTORY
-                WHERE {where_clause} AND fulfillment_type != 'manual_delete'
-            """, params)
-            shift_raw_data = await cursor.fetchall()
-            
-            # Calculate shift-based statistics
-            shift_data = {'Morning': [], 'Evening': [], 'Night': []}
-            
-            for row in shift_raw_data:
-                fulfilled_time, duration_minutes, fulfillment_type = row
-                shift = get_shift_from_czech_datetime(fulfilled_time)
-                if shift in shift_data:
-                    shift_data[shift].append({
-                        'duration': duration_minutes,
-                        'type': fulfillment_type
-                    })
-            
-            by_shift = []
-            for shift_name, records in shift_data.items():
-                if records:
-                    durations = [r['duration'] for r in records]
-                    auto_count = sum(1 for r in records if r['type'] == 'auto_cleanup')
-                    manual_cleanup_count = sum(1 for r in records if r['type'] == 'manual_cleanup')
-                    manual_delete_count = sum(1 for r in records if r['type'] == 'manual_delete')
-                    
-                    by_shift.append({
-                        'shift': shift_name,
-                        'time_range': 'Morning (6:00-14:00)' if shift_name == 'Morning' 
-                                     else 'Evening (14:00-22:00)' if shift_name == 'Evening' 
-                                     else 'Night (22:00-6:00)',
-                        'fulfilled_count': len(records),
-                        'avg_fulfillment_minutes': round(sum(durations) / len(durations), 2),
-                        'avg_fulfillment_hours': round((sum(durations) / len(durations)) / 60, 2),
-                        'min_fulfillment_minutes': min(durations),
-                        'max_fulfillment_minutes': max(durations),
-                        'auto_fulfilled': auto_count,
-                        'manual_cleanup': manual_cleanup_count,
-                        'manual_delete': manual_delete_count
-                    })
-                else:
-                    by_shift.append({
-                        'shift': shift_name,
-                        'time_range': 'Morning (6:00-14:00)' if shift_name == 'Morning' 
-                                     else 'Evening (14:00-22:00)' if shift_name == 'Evening' 
-                                     else 'Night (22:00-6:00)',
-                        'fulfilled_count': 0,
-                        'avg_fulfillment_minutes': 0,
-                        'avg_fulfillment_hours': 0,
-                        'min_fulfillment_minutes': 0,
-                        'max_fulfillment_minutes': 0,
-                        'auto_fulfilled': 0,
-                        'manual_cleanup': 0,
-                        'manual_delete': 0
-                    })
-            
-            # Sort by shift order: Morning, Evening, Night
-            shift_order = {'Morning': 0, 'Evening': 1, 'Night': 2}
-            by_shift.sort(key=lambda x: shift_order.get(x['shift'], 3))
-            
-            # Format results
-            overall = {
-                'total_fulfilled': overall_stats[0] if overall_stats else 0,
-                'avg_fulfillment_minutes': round(overall_stats[1], 2) if overall_stats and overall_stats[1] else 0,
-                'avg_fulfillment_hours': round(overall_stats[1] / 60, 2) if overall_stats and overall_stats[1] else 0,
-                'min_fulfillment_minutes': overall_stats[2] if overall_stats else 0,
-                'max_fulfillment_minutes': overall_stats[3] if overall_stats else 0,
-                'auto_fulfilled': overall_stats[4] if overall_stats else 0,
-                'manual_cleanup': overall_stats[5] if overall_stats else 0,
-                'manual_delete': overall_stats[6] if overall_stats else 0
-            }
-            
-            by_part_number = []
-            for row in part_stats:
-                by_part_number.append({
-                    'part_no': row[0],
-                    'fulfilled_count': row[1],
-                    'avg_fulfillment_minutes': round(row[2], 2) if row[2] else 0,
-                    'avg_fulfillment_hours': round(row[2] / 60, 2) if row[2] else 0,
-                    'min_fulfillment_minutes': row[3],
-                    'max_fulfillment_minutes': row[4]
-                })
-            
-            daily_trends = []
-            for row in daily_trend:
-                daily_trends.append({
-                    'date': row[0].isoformat() if row[0] else None,
-                    'fulfilled_count': row[1],
-                    'avg_duration_minutes': round(row[2], 2) if row[2] else 0,
-                    'avg_duration_hours': round(row[2] / 60, 2) if row[2] else 0
-                })
-            
-            performance_breakdown = []
-            for row in performance_categories:
-                performance_breakdown.append({
-                    'category': row[0],
-                    'count': row[1],
-                    'avg_minutes': round(row[2], 2) if row[2] else 0,
-                    'percentage': round((row[1] / overall['total_fulfilled']) * 100, 1) if overall['total_fulfilled'] > 0 else 0
-                })
-            
-            return JSONResponse(content={
-                'period_days': days,
-                'part_no_filter': part_no,
-                'overall': overall,
-                'by_part_number': by_part_number,
-                'by_shift': by_shift,
-                'daily_trends': daily_trends,
-                'performance_breakdown': performance_breakdown,
-                'generated_at': datetime.now().isoformat()
+
+        source = source or AppConfig.HISTORY_STATS_SOURCE
+        if source not in ('rollup', 'raw'):
+            raise HTTPException(status_code=400, detail="source must be 'rollup' or 'raw'")
+
+        if parallel is None:
+            parallel = AppConfig.HISTORY_STATS_PARALLEL
+
+        response_cache_key = ('stats', days, part_no, source)
+        if not debug:
+            cached = history_response_cache.get(response_cache_key)
+            if cached is not None:
+                return JSONResponse(content=cached)
+        cache_generation = history_response_cache.generation
+
+        started = time.perf_counter()
+        stats, timings, source = await storage.history_stats(days, part_no, source, parallel)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        overall_stats = stats['overall']
+
+        # Format results
+        overall = {
+            'total_fulfilled': overall_stats[0] if overall_stats else 0,
+            'avg_fulfillment_minutes': round(overall_stats[1], 2) if overall_stats and overall_stats[1] else 0,
+            'avg_fulfillment_hours': round(overall_stats[1] / 60, 2) if overall_stats and overall_stats[1] else 0,
+            'min_fulfillment_minutes': overall_stats[2] if overall_stats else 0,
+            'max_fulfillment_minutes': overall_stats[3] if overall_stats else 0,
+            'auto_fulfilled': overall_stats[4] if overall_stats else 0,
+            'manual_cleanup': overall_stats[5] if overall_stats else 0,
+            'manual_delete': overall_stats[6] if overall_stats else 0
+        }
+
+        by_part_number = []
+        for row in stats['by_part_number']:
+            by_part_number.append({
+                'part_no': row[0],
+                'fulfilled_count': row[1],
+                'avg_fulfillment_minutes': round(row[2], 2) if row[2] else 0,
+                'avg_fulfillment_hours': round(row[2] / 60, 2) if row[2] else 0,
+                'min_fulfillment_minutes': row[3],
+                'max_fulfillment_minutes': row[4]
             })
-        finally:
-            await release_db_connection(conn)
-            
+
+        # Shifts are always listed Morning, Evening, Night, with zeros for shifts without fulfillments
+        by_shift = []
+        for shift_name, time_range in SHIFT_TIME_RANGES.items():
+            row = stats['by_shift'].get(shift_name)
+            count, avg, min_minutes, max_minutes, auto_count, manual_cleanup_count, manual_delete_count = row or (0,) * 7
+            by_shift.append({
+                'shift': shift_name,
+                'time_range': time_range,
+                'fulfilled_count': count,
+                'avg_fulfillment_minutes': round(avg, 2) if avg else 0,
+                'avg_fulfillment_hours': round(avg / 60, 2) if avg else 0,
+                'min_fulfillment_minutes': min_minutes if min_minutes is not None else 0,
+                'max_fulfillment_minutes': max_minutes if max_minutes is not None else 0,
+                'auto_fulfilled': auto_count,
+                'manual_cleanup': manual_cleanup_count,
+                'manual_delete': manual_delete_count
+            })
+
+        daily_trends = []
+        for row in stats['daily_trends']:
+            daily_trends.append({
+                'date': row[0].isoformat() if row[0] else None,
+                'fulfilled_count': row[1],
+                'avg_duration_minutes': round(row[2], 2) if row[2] else 0,
+                'avg_duration_hours': round(row[2] / 60, 2) if row[2] else 0
+            })
+
+        performance_breakdown = []
+        for row in stats['performance_breakdown']:
+            performance_breakdown.append({
+                'category': row[0],
+                'count': row[1],
+                'avg_minutes': round(row[2], 2) if row[2] else 0,
+                'percentage': round((row[1] / overall['total_fulfilled']) * 100, 1) if overall['total_fulfilled'] > 0 else 0
+            })
+
+        content = {
+            'period_days': days,
+            'part_no_filter': part_no,
+            'source': source,
+            'overall': overall,
+            'by_part_number': by_part_number,
+            'by_shift': by_shift,
+            'daily_trends': daily_trends,
+            'performance_breakdown': performance_breakdown,
+            'generated_at': datetime.now().isoformat()
+        }
+        if debug:
+            content['debug'] = {
+                'mode': 'parallel' if parallel else 'sequential',
+                'timings_ms': timings,
+                'total_ms': round(total_ms, 2)
+            }
+        else:
+            history_response_cache.put(response_cache_key, content, cache_generation)
+        return JSONResponse(content=content)
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting history stats: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -2102,39 +4032,31 @@ async def clear_all_history():
     """
     Delete all records from the REQUESTS_HISTORY table
     This is a destructive operation and should be used with caution
+
+    On Azure SQL the rows are deleted by a background purge run (batched like the retention
+    purge): answers 202 with its purge_id, follow it with GET /api/admin/history-purge
     """
     try:
-        conn = await get_db_connection()
-        try:
-            cursor = await conn.cursor()
-
-            # Count records before deletion
-            await cursor.execute("SELECT COUNT(*) FROM DROP_REQUESTS_HISTORY")
-            row = await cursor.fetchone()
-            count_before = row[0] if row else 0
-
-            if count_before == 0:
-                return JSONResponse(content={
-                    'status': 'success',
-                    'message': 'History was already empty',
-                    'deleted_count': 0
-                })
-
-            # Delete all records
-            await cursor.execute("DELETE FROM DROP_REQUESTS_HISTORY")
-            deleted_count = cursor.rowcount
-            await conn.commit()
+        if storage.name == 'azure':
+            result = await start_history_purge_task('clear_all')
+            logger.info(f"🗑️ Clearing all history in the background (purge #{result['purge_id']}, "
+                        f"{result['rows_to_delete']} records)")
+            return JSONResponse(content=result, status_code=202)
 
-            logger.info(f"🗑️ Cleared all history: {deleted_count} records deleted")
-        finally:
-            await release_db_connection(conn)
+        try:
+            deleted_count = await storage.clear_history()
+        except StorageBusyError as e:
+            raise HTTPException(status_code=409, detail=str(e))
 
-            return JSONResponse(content={
-                'status': 'success',
-                'message': f'Successfully deleted all history records',
-                'deleted_count': deleted_count
-            })
+        logger.info(f"🗑️ Cleared all history: {deleted_count} records deleted")
+        return JSONResponse(content={
+            'status': 'success',
+            'message': 'History was already empty' if deleted_count == 0 else 'Successfully deleted all history records',
+            'deleted_count': deleted_count
+        })
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error clearing history: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to clear history: {str(e)}")
@@ -2145,6 +4067,7 @@ async def check_database_schema():
     Check if the database has the master_unit_no column
     This is useful for debugging deployment issues
     """
+    require_azure_storage("Schema checks")
     try:
         conn = await get_db_connection()
         try:
@@ -2166,8 +4089,11 @@ async def check_database_schema():
             """)
             history_columns = [row[0] for row in await cursor.fetchall()]
 
+            migration_status = await schema_migrations.get_migration_status(conn)
+
             return JSONResponse(content={
                 'status': 'success',
+                'schema_version': migration_status,
                 'drop_requests_table': {
                     'exists': len(requests_columns) > 0,
                     'columns': requests_columns,
@@ -2192,14 +4118,21 @@ async def check_database_schema():
 @app.post("/api/database/migrate", response_class=JSONResponse)
 async def manual_database_migration():
     """
-    Manually trigger database migration to add master_unit_no column
-    This is safe to run multiple times - it will only add the column if it doesn't exist
+    Manually apply pending schema migrations (same as "python manage.py migrate")
+    This is safe to run multiple times - applied migrations are recorded in schema_version and never re-run
     """
+    require_azure_storage("Schema migrations (SQLite creates its tables on startup)")
     try:
         logger.info("🔧 Manual database migration triggered")
 
-        # Run the migration
-        await create_history_table()
+        # Run the migrations, waiting briefly if another process is already applying them
+        migration = await run_schema_migrations(wait_seconds=30)
+        if migration['status'] == 'skipped':
+            return JSONResponse(content={
+                'status': 'locked',
+                'message': 'Another process is applying migrations, try again shortly',
+                'migration': migration
+            }, status_code=409)
 
         # Verify the migration
         conn = await get_db_connection()
@@ -2226,6 +4159,7 @@ async def manual_database_migration():
                 return JSONResponse(content={
                     'status': 'success',
                     'message': 'Database migration completed successfully',
+                    'migration': migration,
                     'drop_requests_table_migrated': True,
                     'drop_requests_history_table_migrated': True
                 })
@@ -2234,6 +4168,7 @@ async def manual_database_migration():
                 return JSONResponse(content={
                     'status': 'partial',
                     'message': 'Migration ran but columns may not have been added',
+                    'migration': migration,
                     'drop_requests_table_migrated': requests_has_column,
                     'drop_requests_history_table_migrated': history_has_column
                 }, status_code=500)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the Drop List database
+
+Usage:
+    python manage.py migrate [--status] [--wait 60]
+    python manage.py rebuild-rollups
+    python manage.py backfill-ngrams [--batch-size 5000]
+    python manage.py purge-history [--days 30] [--batch-size 2000] [--pause 0.5]
+
+Uses the same environment variables (AZURE_SQL_SERVER, AZURE_SQL_DATABASE, ...) as the app.
+All commands work on Azure SQL; with STORAGE_BACKEND=sqlite there is nothing to maintain
+(the SQLite backend creates its tables itself) and they exit without doing anything.
+"""
+
+import argparse
+import asyncio
+
+import main as app_main
+import schema_migrations
+
+
+async def migrate(args):
+    """Apply pending migrations from migrations/ (or list them with --status)"""
+    if args.status:
+        conn = await app_main.get_db_connection()
+        try:
+            status = await schema_migrations.get_migration_status(conn)
+        finally:
+            await app_main.release_db_connection(conn)
+        print(f"📋 Schema version {status['current_version']} (latest {status['latest_version']})")
+        for name in status['pending']:
+            print(f"   pending:  {name}")
+        for name in status['modified']:
+            print(f"   ⚠️ modified after it was applied: {name}")
+        return
+
+    result = await app_main.run_schema_migrations(wait_seconds=args.wait)
+    if result['status'] == 'skipped':
+        print(f"⏭️ Another process held the migration lock for {args.wait}s, nothing applied")
+    elif result['status'] == 'applied':
+        print(f"✅ Applied {', '.join(result['applied'])}; schema is at version {result['current_version']}")
+    else:
+        print(f"✅ Schema is up to date (version {result['current_version']})")
+
+    if result['status'] != 'skipped' and not await app_main.history_backfill_completed('rollups'):
+        # /api/history/stats reads raw history until the rollups cover it
+        result = await app_main.rebuild_history_rollups()
+        print(f"✅ Rolled up {result['history_rows']} existing history rows for /api/history/stats "
+              f"in {result['duration_seconds']}s")
+
+
+async def ensure_schema():
+    """Maintenance commands need the latest tables; apply anything pending first"""
+    await app_main.run_schema_migrations(wait_seconds=60)
+
+
+async def rebuild_rollups(args):
+    """Backfill DROP_REQUESTS_HISTORY_ROLLUP from the existing history"""
+    await ensure_schema()
+    result = await app_main.rebuild_history_rollups()
+    print(f"✅ Rolled up {result['history_rows']} history rows into {result['rollup_rows']} rollup rows "
+          f"in {result['duration_seconds']}s")
+
+
+async def backfill_ngrams(args):
+    """Add existing history rows to the serial_no / part_no trigram search index"""
+    await ensure_schema()
+    result = await app_main.backfill_history_ngrams(batch_size=args.batch_size)
+    print(f"✅ Indexed {result['history_rows']} history rows ({result['ngram_rows']} trigrams) "
+          f"in {result['duration_seconds']}s")
+
+
+async def purge_history(args):
+    """Delete history older than the retention period in throttled batches (resumes an interrupted purge)"""
+    await ensure_schema()
+    result = await app_main.purge_history('retention', days=args.days, batch_size=args.batch_size,
+                                          pause_seconds=args.pause)
+    if result['status'] == 'skipped':
+        print("⏭️ Another history purge is running, nothing deleted")
+        return
+    print(f"✅ {'Resumed purge' if result['resumed'] else 'Purged'} history before {result['cutoff_time']}: "
+          f"{result['deleted_rows']} rows in {result['batches']} batches, {result['duration_seconds']}s")
+
+
+async def run(args):
+    if app_main.storage.name != 'azure':
+        print(f"⏭️ STORAGE_BACKEND={app_main.storage.name}: {args.command_name} only applies to Azure SQL, nothing to do")
+        return
+    try:
+        await args.command(args)
+    finally:
+        await app_main.storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drop List maintenance commands")
+    subparsers = parser.add_subparsers(dest='command_name', required=True)
+
+    migrate_parser = subparsers.add_parser('migrate', help="Apply pending schema migrations")
+    migrate_parser.add_argument('--status', action='store_true', help="Show applied/pending migrations without applying")
+    migrate_parser.add_argument('--wait', type=float, default=60,
+                                help="Seconds to wait if another process is applying migrations (default 60)")
+    migrate_parser.set_defaults(command=migrate)
+
+    rollups = subparsers.add_parser('rebuild-rollups', help="Backfill/rebuild the history stats rollups")
+    rollups.set_defaults(command=rebuild_rollups)
+
+    ngrams = subparsers.add_parser('backfill-ngrams', help="Index existing history for serial/part substring search")
+    ngrams.add_argument('--batch-size', type=int, default=5000, help="History rows indexed per transaction")
+    ngrams.set_defaults(command=backfill_ngrams)
+
+    purge = subparsers.add_parser('purge-history', help="Delete history older than the retention period")
+    purge.add_argument('--days', type=int, help="Retention in days (default HISTORY_RETENTION_DAYS)")
+    purge.add_argument('--batch-size', type=int, help="Rows deleted per transaction (default HISTORY_PURGE_BATCH_SIZE)")
+    purge.add_argument('--pause', type=float, help="Seconds between batches (default HISTORY_PURGE_PAUSE_SECONDS)")
+    purge.set_defaults(command=purge_history)
+
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+-- Fulfilled request history
+-- Guarded with IF NOT EXISTS so databases created before schema_version existed adopt it as-is
+IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'DROP_REQUESTS_HISTORY')
+BEGIN
+    CREATE TABLE DROP_REQUESTS_HISTORY (
+        history_id INT IDENTITY(1,1) PRIMARY KEY,
+        req_id INT,
+        serial_no NVARCHAR(255),
+        part_no NVARCHAR(255),
+        revision NVARCHAR(50),
+        quantity DECIMAL(10,2),
+        location NVARCHAR(255),
+        deliver_to NVARCHAR(255),
+        req_time DATETIME,
+        fulfilled_time DATETIME,
+        fulfillment_duration_minutes INT,
+        fulfillment_type NVARCHAR(50),
+        current_location NVARCHAR(255)
+    );
+
+    -- Create indexes for better performance
+    CREATE INDEX IX_DROP_REQUESTS_HISTORY_serial_no ON DROP_REQUESTS_HISTORY(serial_no);
+    CREATE INDEX IX_DROP_REQUESTS_HISTORY_part_no ON DROP_REQUESTS_HISTORY(part_no);
+    CREATE INDEX IX_DROP_REQUESTS_HISTORY_req_time ON DROP_REQUESTS_HISTORY(req_time);
+    CREATE INDEX IX_DROP_REQUESTS_HISTORY_fulfilled_time ON DROP_REQUESTS_HISTORY(fulfilled_time);
+END
@@ -0,0 +1,10 @@
+-- Master unit number on active requests and history
+IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'DROP_REQUESTS' AND COLUMN_NAME = 'master_unit_no')
+BEGIN
+    ALTER TABLE DROP_REQUESTS ADD master_unit_no NVARCHAR(255);
+END
+
+IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'DROP_REQUESTS_HISTORY' AND COLUMN_NAME = 'master_unit_no')
+BEGIN
+    ALTER TABLE DROP_REQUESTS_HISTORY ADD master_unit_no NVARCHAR(255);
+END
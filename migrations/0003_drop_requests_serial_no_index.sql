@@ -0,0 +1,5 @@
+-- Index for the isRequested lookups (serial_no IN (...)) on active requests
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_DROP_REQUESTS_serial_no' AND object_id = OBJECT_ID('DROP_REQUESTS'))
+BEGIN
+    CREATE INDEX IX_DROP_REQUESTS_serial_no ON DROP_REQUESTS(serial_no);
+END
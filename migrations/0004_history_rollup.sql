@@ -0,0 +1,29 @@
+-- Pre-aggregated history for /api/history/stats, maintained on every history write
+-- (rows with a NULL deliver_to are never counted by the stats, so they are not rolled up)
+-- Backfill existing history afterwards with: python manage.py rebuild-rollups
+IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'DROP_REQUESTS_HISTORY_ROLLUP')
+BEGIN
+    CREATE TABLE DROP_REQUESTS_HISTORY_ROLLUP (
+        rollup_date DATE NOT NULL,
+        shift NVARCHAR(10) NOT NULL,
+        part_no NVARCHAR(255) NOT NULL,
+        deliver_to NVARCHAR(255) NOT NULL,
+        fulfillment_type NVARCHAR(50) NOT NULL,
+        fulfilled_count INT NOT NULL,
+        duration_count INT NOT NULL,
+        duration_sum BIGINT NOT NULL,
+        duration_min INT NULL,
+        duration_max INT NULL,
+        fast_count INT NOT NULL,
+        fast_sum BIGINT NOT NULL,
+        medium_count INT NOT NULL,
+        medium_sum BIGINT NOT NULL,
+        slow_count INT NOT NULL,
+        slow_sum BIGINT NOT NULL,
+        very_slow_count INT NOT NULL,
+        very_slow_sum BIGINT NOT NULL,
+        CONSTRAINT UQ_DROP_REQUESTS_HISTORY_ROLLUP UNIQUE NONCLUSTERED (rollup_date, shift, part_no, deliver_to, fulfillment_type)
+    );
+
+    CREATE CLUSTERED INDEX IX_DROP_REQUESTS_HISTORY_ROLLUP_date ON DROP_REQUESTS_HISTORY_ROLLUP(rollup_date);
+END
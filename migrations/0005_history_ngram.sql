@@ -0,0 +1,13 @@
+-- Trigram index for the serial_no / part_no substring filters of /api/history (see history_search.py)
+-- Index existing history afterwards with: python manage.py backfill-ngrams
+IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'DROP_REQUESTS_HISTORY_NGRAM')
+BEGIN
+    CREATE TABLE DROP_REQUESTS_HISTORY_NGRAM (
+        field CHAR(1) NOT NULL,
+        gram NVARCHAR(3) NOT NULL,
+        history_id INT NOT NULL,
+        CONSTRAINT PK_DROP_REQUESTS_HISTORY_NGRAM PRIMARY KEY (field, gram, history_id)
+    );
+
+    CREATE INDEX IX_DROP_REQUESTS_HISTORY_NGRAM_history_id ON DROP_REQUESTS_HISTORY_NGRAM(history_id);
+END
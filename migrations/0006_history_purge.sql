@@ -0,0 +1,21 @@
+-- Progress of chunked history purges (retention / clear-all), one row per run
+-- A run left in 'running' or 'failed' state is resumed with the same cutoff by the next purge
+IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'DROP_REQUESTS_HISTORY_PURGE')
+BEGIN
+    CREATE TABLE DROP_REQUESTS_HISTORY_PURGE (
+        purge_id INT IDENTITY(1,1) PRIMARY KEY,
+        mode NVARCHAR(20) NOT NULL,
+        cutoff_time DATETIME NULL,
+        max_history_id INT NULL,
+        status NVARCHAR(20) NOT NULL,
+        rows_to_delete INT NULL,
+        deleted_rows INT NOT NULL DEFAULT 0,
+        batches INT NOT NULL DEFAULT 0,
+        last_fulfilled_time DATETIME NULL,
+        last_history_id INT NULL,
+        started_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        updated_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        finished_at DATETIME2 NULL,
+        error NVARCHAR(4000) NULL
+    );
+END
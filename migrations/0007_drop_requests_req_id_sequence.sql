@@ -0,0 +1,28 @@
+-- Database-allocated req_id: a SEQUENCE feeding a DEFAULT on DROP_REQUESTS.req_id
+-- (an existing column cannot be turned into an IDENTITY in place).
+-- Starts above every req_id already used in DROP_REQUESTS and DROP_REQUESTS_HISTORY.
+IF OBJECT_ID('dbo.DROP_REQUESTS_req_id_seq', 'SO') IS NULL
+BEGIN
+    DECLARE @start BIGINT = (
+        SELECT ISNULL(MAX(req_id), 0) + 1
+        FROM (SELECT req_id FROM DROP_REQUESTS UNION ALL SELECT req_id FROM DROP_REQUESTS_HISTORY) AS used
+    );
+    DECLARE @sql NVARCHAR(200) = N'CREATE SEQUENCE dbo.DROP_REQUESTS_req_id_seq AS INT START WITH '
+        + CAST(@start AS NVARCHAR(20)) + N' INCREMENT BY 1 CACHE 50';
+    EXEC(@sql);
+END
+GO
+
+-- Active rows carry per-worker counter values that collide; give them fresh ids.
+-- (History keeps its old values: they were copied from these rows when fulfilled.)
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'UX_DROP_REQUESTS_req_id' AND object_id = OBJECT_ID('DROP_REQUESTS'))
+BEGIN
+    UPDATE DROP_REQUESTS SET req_id = NEXT VALUE FOR dbo.DROP_REQUESTS_req_id_seq;
+    CREATE UNIQUE INDEX UX_DROP_REQUESTS_req_id ON DROP_REQUESTS(req_id) WHERE req_id IS NOT NULL;
+END
+
+IF NOT EXISTS (SELECT * FROM sys.default_constraints WHERE name = 'DF_DROP_REQUESTS_req_id')
+BEGIN
+    ALTER TABLE DROP_REQUESTS ADD CONSTRAINT DF_DROP_REQUESTS_req_id
+        DEFAULT (NEXT VALUE FOR dbo.DROP_REQUESTS_req_id_seq) FOR req_id;
+END
@@ -0,0 +1,14 @@
+-- Change log of DROP_REQUESTS: one row per inserted ('I') or deleted ('D') request,
+-- written by the app in the same transaction as the change (a trigger would break the
+-- OUTPUT clauses of the inserts). The newest committed version is the version of the
+-- active request list (ETag of /api/requests).
+IF OBJECT_ID('dbo.DROP_REQUESTS_CHANGELOG', 'U') IS NULL
+BEGIN
+    CREATE TABLE DROP_REQUESTS_CHANGELOG (
+        version ROWVERSION NOT NULL CONSTRAINT PK_DROP_REQUESTS_CHANGELOG PRIMARY KEY,
+        operation CHAR(1) NOT NULL,
+        req_id INT NULL,
+        serial_no NVARCHAR(255) NOT NULL,
+        changed_at DATETIME NOT NULL CONSTRAINT DF_DROP_REQUESTS_CHANGELOG_changed_at DEFAULT GETUTCDATE()
+    );
+END
@@ -0,0 +1,15 @@
+-- Completion markers of the one-off backfills of tables that are maintained on every history write
+-- (task 'rollups': DROP_REQUESTS_HISTORY_ROLLUP, completed by "python manage.py rebuild-rollups").
+-- Until a task is completed the app does not rely on its table for existing history.
+IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'DROP_REQUESTS_HISTORY_BACKFILL')
+BEGIN
+    CREATE TABLE DROP_REQUESTS_HISTORY_BACKFILL (
+        task NVARCHAR(50) NOT NULL PRIMARY KEY,
+        completed_at DATETIME2 NULL
+    );
+END
+GO
+-- Nothing to backfill on a database without history
+IF NOT EXISTS (SELECT * FROM DROP_REQUESTS_HISTORY_BACKFILL WHERE task = 'rollups')
+    INSERT INTO DROP_REQUESTS_HISTORY_BACKFILL (task, completed_at)
+    SELECT 'rollups', CASE WHEN EXISTS (SELECT 1 FROM DROP_REQUESTS_HISTORY) THEN NULL ELSE SYSUTCDATETIME() END;
@@ -0,0 +1,15 @@
+-- Trigram index backfill state (task 'ngrams', completed by "python manage.py backfill-ngrams"):
+-- watermark is the highest history_id that may be missing from DROP_REQUESTS_HISTORY_NGRAM.
+-- Rows above it were indexed when they were written; searches only trust the index for those.
+IF COL_LENGTH('dbo.DROP_REQUESTS_HISTORY_BACKFILL', 'watermark') IS NULL
+    ALTER TABLE DROP_REQUESTS_HISTORY_BACKFILL ADD watermark INT NULL;
+GO
+IF NOT EXISTS (SELECT * FROM DROP_REQUESTS_HISTORY_BACKFILL WHERE task = 'ngrams')
+    INSERT INTO DROP_REQUESTS_HISTORY_BACKFILL (task, watermark, completed_at)
+    SELECT 'ngrams', unindexed.max_id, CASE WHEN unindexed.max_id IS NULL THEN SYSUTCDATETIME() END
+    FROM (
+        SELECT MAX(h.history_id) AS max_id
+        FROM DROP_REQUESTS_HISTORY h
+        WHERE (LEN(h.serial_no) >= 3 OR LEN(h.part_no) >= 3)
+          AND NOT EXISTS (SELECT 1 FROM DROP_REQUESTS_HISTORY_NGRAM g WHERE g.history_id = h.history_id)
+    ) unindexed;
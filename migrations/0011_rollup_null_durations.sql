@@ -0,0 +1,6 @@
+-- History rows without a fulfillment duration used to be counted in the very_slow bucket.
+-- Every one of them is in fulfilled_count but not in duration_count, so take that
+-- difference back out; very_slow_sum never included them.
+UPDATE DROP_REQUESTS_HISTORY_ROLLUP
+SET very_slow_count = very_slow_count - (fulfilled_count - duration_count)
+WHERE fulfilled_count > duration_count;
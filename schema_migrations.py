@@ -0,0 +1,227 @@
+"""
+Versioned, run-once schema migrations for the Drop List database
+
+Migrations are the migrations/NNNN_name.sql files, applied in version order. Each one
+runs in its own transaction together with the schema_version row recording it, so a
+failed migration leaves no trace and is retried on the next run.
+
+Only one process applies migrations at a time: the runner holds a session-level
+sp_getapplock while it works. Other processes (e.g. the remaining gunicorn workers)
+ask for the lock without waiting and skip immediately if it is taken.
+"""
+
+import hashlib
+import os
+import re
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE_PATTERN = re.compile(r'^(\d{4})_([a-z0-9_]+)\.sql$')
+
+# Batch separator (SSMS/sqlcmd style): a line containing only GO, outside string literals,
+# quoted identifiers and block comments
+BATCH_SEPARATOR = re.compile(r'^\s*GO\s*$', re.IGNORECASE)
+
+# Opening quote -> closing quote of T-SQL string literals and quoted identifiers
+QUOTES = {"'": "'", '"': '"', '[': ']'}
+
+APPLOCK_RESOURCE = 'drop_list_schema_migrations'
+
+CREATE_SCHEMA_VERSION_SQL = """
+IF OBJECT_ID('dbo.schema_version', 'U') IS NULL
+BEGIN
+    CREATE TABLE schema_version (
+        version INT NOT NULL PRIMARY KEY,
+        name NVARCHAR(255) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        applied_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        duration_ms INT NOT NULL
+    );
+END
+"""
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    checksum: str
+    batches: List[str]
+
+
+def _scan_line(line: str, quote: Optional[str], comment_depth: int) -> Tuple[Optional[str], int]:
+    """
+    Lexer state at the end of line, given the state at its start
+
+    Returns:
+        (closing quote of the open string/identifier or None, depth of nested /* */ comments)
+    """
+    i = 0
+    while i < len(line):
+        pair = line[i:i + 2]
+        if comment_depth:
+            if pair in ('/*', '*/'):
+                comment_depth += 1 if pair == '/*' else -1
+                i += 1
+        elif quote:
+            if line[i] == quote:
+                if line[i + 1:i + 2] == quote:
+                    i += 1  # Doubled quote is an escaped quote
+                else:
+                    quote = None
+        elif pair == '--':
+            break
+        elif pair == '/*':
+            comment_depth = 1
+            i += 1
+        elif line[i] in QUOTES:
+            quote = QUOTES[line[i]]
+        i += 1
+    return quote, comment_depth
+
+
+def split_batches(script: str) -> List[str]:
+    """Split a script on GO lines, dropping empty batches"""
+    batches = []
+    lines = []
+    quote, comment_depth = None, 0
+    for line in script.splitlines():
+        if quote is None and not comment_depth and BATCH_SEPARATOR.match(line):
+            batches.append('\n'.join(lines))
+            lines = []
+            continue
+        lines.append(line)
+        quote, comment_depth = _scan_line(line, quote, comment_depth)
+    batches.append('\n'.join(lines))
+    return [batch.strip() for batch in batches if batch.strip()]
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """All migration files in version order"""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            script = f.read()
+        migrations.append(Migration(
+            version=int(match.group(1)),
+            name=match.group(2),
+            checksum=hashlib.sha256(script.encode('utf-8')).hexdigest(),
+            batches=split_batches(script),
+        ))
+
+    versions = [migration.version for migration in migrations]
+    duplicates = sorted({version for version in versions if versions.count(version) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate migration versions in {directory}: {duplicates}")
+    return migrations
+
+
+def latest_version(migrations: List[Migration] = None) -> int:
+    migrations = load_migrations() if migrations is None else migrations
+    return migrations[-1].version if migrations else 0
+
+
+async def get_applied_versions(cursor) -> Dict[int, str]:
+    """{version: checksum} of applied migrations (empty before the first migration run)"""
+    await cursor.execute("""
+        IF OBJECT_ID('dbo.schema_version', 'U') IS NOT NULL
+            SELECT version, checksum FROM schema_version
+        ELSE
+            SELECT CAST(NULL AS INT) AS version, CAST(NULL AS CHAR(64)) AS checksum WHERE 1 = 0
+    """)
+    return {row[0]: row[1] for row in await cursor.fetchall()}
+
+
+async def get_schema_version(cursor) -> int:
+    """Highest applied migration version, 0 if none"""
+    applied = await get_applied_versions(cursor)
+    return max(applied) if applied else 0
+
+
+async def get_migration_status(conn) -> dict:
+    """Applied and pending migrations, without taking the lock"""
+    migrations = load_migrations()
+    cursor = await conn.cursor()
+    try:
+        applied = await get_applied_versions(cursor)
+    finally:
+        await cursor.close()
+    await conn.rollback()
+
+    return {
+        'current_version': max(applied) if applied else 0,
+        'latest_version': latest_version(migrations),
+        'pending': [f"{m.version:04d}_{m.name}" for m in migrations if m.version not in applied],
+        'modified': [f"{m.version:04d}_{m.name}" for m in migrations
+                     if m.version in applied and applied[m.version] != m.checksum],
+    }
+
+
+async def apply_pending_migrations(conn, wait_seconds: float = 0) -> dict:
+    """
+    Apply pending migrations on conn, unless another process is already doing so
+
+    Args:
+        conn: Database connection (autocommit off)
+        wait_seconds: How long to wait for the migration lock; 0 skips immediately if it is held
+
+    Returns:
+        {'status': 'applied' | 'up_to_date' | 'skipped', 'applied': [...], 'current_version', 'latest_version'}
+    """
+    migrations = load_migrations()
+    target = latest_version(migrations)
+    cursor = await conn.cursor()
+    try:
+        # Session-owned lock: survives the per-migration commits below
+        await cursor.execute("""
+            SET NOCOUNT ON;
+            DECLARE @result INT;
+            EXEC @result = sp_getapplock @Resource = ?, @LockMode = 'Exclusive',
+                                         @LockOwner = 'Session', @LockTimeout = ?;
+            SELECT @result;
+        """, (APPLOCK_RESOURCE, int(wait_seconds * 1000)))
+        lock_result = (await cursor.fetchone())[0]
+        if lock_result < 0:
+            await conn.rollback()
+            return {'status': 'skipped', 'applied': [], 'current_version': None, 'latest_version': target}
+
+        applied_now = []
+        try:
+            await cursor.execute(CREATE_SCHEMA_VERSION_SQL)
+            await conn.commit()
+
+            # Re-read under the lock: whoever held it before us may have applied everything
+            applied = await get_applied_versions(cursor)
+            for migration in migrations:
+                if migration.version in applied:
+                    continue
+                started = time.perf_counter()
+                try:
+                    for batch in migration.batches:
+                        await cursor.execute(batch)
+                    await cursor.execute(
+                        "INSERT INTO schema_version (version, name, checksum, duration_ms) VALUES (?, ?, ?, ?)",
+                        (migration.version, migration.name, migration.checksum,
+                         int((time.perf_counter() - started) * 1000))
+                    )
+                    await conn.commit()
+                except Exception as e:
+                    await conn.rollback()
+                    raise RuntimeError(f"Migration {migration.version:04d}_{migration.name} failed: {e}") from e
+                applied_now.append(f"{migration.version:04d}_{migration.name}")
+                applied[migration.version] = migration.checksum
+        finally:
+            await cursor.execute("EXEC sp_releaseapplock @Resource = ?, @LockOwner = 'Session'", (APPLOCK_RESOURCE,))
+            await conn.commit()
+
+        return {
+            'status': 'applied' if applied_now else 'up_to_date',
+            'applied': applied_now,
+            'current_version': max(applied) if applied else 0,
+            'latest_version': target,
+        }
+    finally:
+        await cursor.close()
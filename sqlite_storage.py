@@ -0,0 +1,458 @@
+"""
+Embedded SQLite implementation of the storage interface (see storage.py)
+
+One database file, no ODBC driver or network needed: for running the whole app and
+its load tests on one machine, and for small sites without a cloud database.
+Datetimes are stored as 'YYYY-MM-DD HH:MM:SS.ffffff' UTC text, which sorts and compares
+like the DATETIME columns on Azure SQL. sqlite3 calls run in a worker thread, one at a
+time on a single connection (SQLite allows one writer anyway).
+
+Azure-only features (stats rollups, trigram search index, chunked purge, schema
+migrations) are not needed at this scale: stats always aggregate the history table
+and substring searches scan it.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from storage import (EXCLUDED_DELIVER_TO, HISTORY_COLUMNS, HISTORY_DISPLAY_DAYS, ActiveRequestChanges,
+                     HistoryFilters, RequestRecord, StorageBackend)
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS DROP_REQUESTS (
+    req_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    serial_no TEXT,
+    part_no TEXT,
+    revision TEXT,
+    quantity REAL,
+    location TEXT,
+    deliver_to TEXT,
+    req_time TEXT,
+    master_unit_no TEXT
+);
+CREATE INDEX IF NOT EXISTS IX_DROP_REQUESTS_serial_no ON DROP_REQUESTS(serial_no);
+
+CREATE TABLE IF NOT EXISTS DROP_REQUESTS_CHANGELOG (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    operation TEXT NOT NULL,
+    req_id INTEGER,
+    serial_no TEXT NOT NULL,
+    changed_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS DROP_REQUESTS_HISTORY (
+    history_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    req_id INTEGER,
+    serial_no TEXT,
+    part_no TEXT,
+    revision TEXT,
+    quantity REAL,
+    location TEXT,
+    deliver_to TEXT,
+    req_time TEXT,
+    fulfilled_time TEXT,
+    fulfillment_duration_minutes INTEGER,
+    fulfillment_type TEXT,
+    current_location TEXT,
+    master_unit_no TEXT
+);
+CREATE INDEX IF NOT EXISTS IX_DROP_REQUESTS_HISTORY_fulfilled_time ON DROP_REQUESTS_HISTORY(fulfilled_time, history_id);
+CREATE INDEX IF NOT EXISTS IX_DROP_REQUESTS_HISTORY_serial_no ON DROP_REQUESTS_HISTORY(serial_no);
+CREATE INDEX IF NOT EXISTS IX_DROP_REQUESTS_HISTORY_part_no ON DROP_REQUESTS_HISTORY(part_no);
+"""
+
+REQUEST_COLUMNS = ['req_id', 'serial_no', 'part_no', 'revision', 'quantity', 'location', 'deliver_to',
+                   'req_time', 'master_unit_no']
+DATETIME_COLUMNS = {'req_time', 'fulfilled_time'}
+
+# Host parameters per IN (...) list (SQLite builds before 3.32 allow 999)
+SQLITE_IN_BATCH_SIZE = 900
+
+# Change log rows older than this are pruned (at startup and at most every CHANGELOG_PRUNE_INTERVAL_SECONDS
+# on fulfillment); a view further behind than that reloads the whole list instead
+CHANGELOG_RETENTION = timedelta(days=1)
+CHANGELOG_PRUNE_INTERVAL_SECONDS = 3600
+
+
+def to_db_time(value: Optional[datetime]) -> Optional[str]:
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f') if value is not None else None
+
+
+def from_db_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Args:
+        path: Database file (':memory:' for a throwaway database)
+        shift_of: Czech shift name for a UTC datetime (main.get_shift_from_czech_datetime)
+        performance_categories: (upper bound minutes or None, prefix, label) duration buckets
+        on_history_change: Called with a reason after history is written or cleared
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str, shift_of: Callable[[Optional[datetime]], str],
+                 performance_categories: List[tuple], on_history_change: Optional[Callable[[str], None]] = None):
+        self.path = path
+        self.shift_of = shift_of
+        self.performance_categories = performance_categories
+        self.on_history_change = on_history_change
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._changelog_pruned_at: Optional[float] = None
+
+    # --- Plumbing ---
+
+    def _open(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA busy_timeout = 5000")
+            conn.create_function(
+                'czech_shift', 1, lambda value: self.shift_of(from_db_time(value)), deterministic=True
+            )
+            conn.executescript(SCHEMA_SQL)
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        def call():
+            with self._lock:
+                return func(self._open())
+        return await asyncio.to_thread(call)
+
+    async def _transaction(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run func inside BEGIN IMMEDIATE ... COMMIT (rolled back on error)"""
+        def call(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+        return await self._run(call)
+
+    @staticmethod
+    def _rows_as_dicts(cursor: sqlite3.Cursor) -> List[Dict[str, Any]]:
+        columns = [column[0] for column in cursor.description]
+        records = []
+        for row in cursor.fetchall():
+            record = dict(zip(columns, row))
+            for column in DATETIME_COLUMNS & record.keys():
+                record[column] = from_db_time(record[column])
+            records.append(record)
+        return records
+
+    def _history_changed(self, reason: str):
+        if self.on_history_change:
+            self.on_history_change(reason)
+
+    async def start(self):
+        await self._transaction(self._prune_changelog)
+
+    async def close(self):
+        def close(_conn):
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await self._run(close)
+
+    # --- Active requests ---
+
+    async def list_active_requests(self) -> List[Dict[str, Any]]:
+        return await self._run(lambda conn: self._rows_as_dicts(
+            conn.execute("SELECT * FROM DROP_REQUESTS ORDER BY req_time DESC")
+        ))
+
+    async def active_request_summary(self) -> Tuple[int, Optional[datetime], Optional[datetime]]:
+        row = await self._run(lambda conn: conn.execute(
+            "SELECT COUNT(*), MIN(req_time), MAX(req_time) FROM DROP_REQUESTS"
+        ).fetchone())
+        return row[0], from_db_time(row[1]), from_db_time(row[2])
+
+    async def requested_serials(self, serial_nos: Sequence[Any]) -> Set[str]:
+        unique_serials = list(dict.fromkeys(str(s) for s in serial_nos if s is not None))
+
+        def lookup(conn):
+            requested = set()
+            for i in range(0, len(unique_serials), SQLITE_IN_BATCH_SIZE):
+                batch = unique_serials[i:i + SQLITE_IN_BATCH_SIZE]
+                placeholders = ", ".join("?" for _ in batch)
+                requested.update(row[0] for row in conn.execute(
+                    f"SELECT serial_no FROM DROP_REQUESTS WHERE serial_no IN ({placeholders})", batch
+                ))
+            return requested
+        return await self._run(lookup) if unique_serials else set()
+
+    async def active_requests_version(self) -> int:
+        # Writers are serialized, so the highest committed version has no uncommitted gaps below it
+        row = await self._run(lambda conn: conn.execute("SELECT MAX(version) FROM DROP_REQUESTS_CHANGELOG").fetchone())
+        return row[0] or 0
+
+    async def active_request_changes(self, since_version: int) -> Optional[ActiveRequestChanges]:
+        def read(conn):
+            version, oldest = conn.execute(
+                "SELECT MAX(version), MIN(version) FROM DROP_REQUESTS_CHANGELOG"
+            ).fetchone()
+            version = version or 0
+            if version == since_version:
+                return ActiveRequestChanges(version, [], [])
+            if version < since_version or oldest > since_version:
+                return None
+            rows = self._rows_as_dicts(conn.execute("""
+                SELECT * FROM DROP_REQUESTS
+                WHERE req_id IN (SELECT req_id FROM DROP_REQUESTS_CHANGELOG
+                                 WHERE operation = 'I' AND version > ? AND version <= ?)
+            """, (since_version, version)))
+            deleted = [row[0] for row in conn.execute("""
+                SELECT req_id FROM DROP_REQUESTS_CHANGELOG
+                WHERE operation = 'D' AND version > ? AND version <= ?
+            """, (since_version, version))]
+            return ActiveRequestChanges(version, rows, deleted)
+        return await self._run(read)
+
+    def _prune_changelog(self, conn):
+        """Delete change log rows older than CHANGELOG_RETENTION, keeping the newest (the list version)"""
+        conn.execute("""
+            DELETE FROM DROP_REQUESTS_CHANGELOG
+            WHERE changed_at < ? AND version < (SELECT MAX(version) FROM DROP_REQUESTS_CHANGELOG)
+        """, (to_db_time(datetime.utcnow() - CHANGELOG_RETENTION),))
+        self._changelog_pruned_at = time.monotonic()
+
+    @staticmethod
+    def _log_change(conn, operation: str, req_id: int, serial_no: str):
+        conn.execute(
+            "INSERT INTO DROP_REQUESTS_CHANGELOG (operation, req_id, serial_no, changed_at) VALUES (?, ?, ?, ?)",
+            (operation, req_id, serial_no or '', to_db_time(datetime.utcnow()))
+        )
+
+    @classmethod
+    def _insert_request(cls, conn, part_no: str, deliver_to: str, req_time: datetime, record: RequestRecord) -> int:
+        cursor = conn.execute("""
+            INSERT INTO DROP_REQUESTS (serial_no, part_no, revision, quantity, location, deliver_to, req_time, master_unit_no)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (record.serial_no, part_no, record.revision,
+              float(record.quantity) if record.quantity is not None else None,
+              record.location, deliver_to, to_db_time(req_time), record.master_unit_no))
+        cls._log_change(conn, 'I', cursor.lastrowid, record.serial_no)
+        return cursor.lastrowid
+
+    async def insert_request(self, part_no: str, deliver_to: str, req_time: datetime,
+                             record: RequestRecord) -> Optional[int]:
+        return await self._transaction(lambda conn: self._insert_request(conn, part_no, deliver_to, req_time, record))
+
+    async def insert_requests(self, part_no: str, deliver_to: str, req_time: datetime,
+                              records: Sequence[RequestRecord]) -> Dict[str, int]:
+        def insert(conn):
+            serials = [record.serial_no for record in records]
+            existing = set()
+            for i in range(0, len(serials), SQLITE_IN_BATCH_SIZE):
+                batch = serials[i:i + SQLITE_IN_BATCH_SIZE]
+                placeholders = ", ".join("?" for _ in batch)
+                existing.update(row[0] for row in conn.execute(
+                    f"SELECT serial_no FROM DROP_REQUESTS WHERE serial_no IN ({placeholders})", batch
+                ))
+            return {
+                record.serial_no: self._insert_request(conn, part_no, deliver_to, req_time, record)
+                for record in records if record.serial_no not in existing
+            }
+        return await self._transaction(insert)
+
+    # --- History writes ---
+
+    async def fulfill_requests(self, fulfillments: List[tuple], fulfillment_type: str) -> List[Dict[str, Any]]:
+        current_locations = dict(fulfillments)  # one entry per serial, last location wins
+        if not current_locations:
+            return []
+
+        def move(conn):
+            now = datetime.utcnow()
+            moved = []
+            serials = list(current_locations)
+            for i in range(0, len(serials), SQLITE_IN_BATCH_SIZE):
+                batch = serials[i:i + SQLITE_IN_BATCH_SIZE]
+                placeholders = ", ".join("?" for _ in batch)
+                requests = self._rows_as_dicts(conn.execute(
+                    f"SELECT {', '.join(REQUEST_COLUMNS)} FROM DROP_REQUESTS WHERE serial_no IN ({placeholders})", batch
+                ))
+                conn.execute(f"DELETE FROM DROP_REQUESTS WHERE serial_no IN ({placeholders})", batch)
+                for request in requests:
+                    self._log_change(conn, 'D', request['req_id'], request['serial_no'])
+                    record = {
+                        'req_id': request['req_id'],
+                        'serial_no': request['serial_no'],
+                        'part_no': request['part_no'],
+                        'revision': request['revision'] or '',
+                        'quantity': request['quantity'] or 0,
+                        'location': request['location'],
+                        'deliver_to': request['deliver_to'],
+                        'req_time': request['req_time'],
+                        'fulfilled_time': now,
+                        'fulfillment_duration_minutes': (
+                            int((now - request['req_time']).total_seconds() // 60) if request['req_time'] else None
+                        ),
+                        'fulfillment_type': fulfillment_type,
+                        'current_location': current_locations[request['serial_no']],
+                        'master_unit_no': request['master_unit_no']
+                    }
+                    columns = list(record)
+                    cursor = conn.execute(
+                        f"INSERT INTO DROP_REQUESTS_HISTORY ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                        [to_db_time(value) if isinstance(value, datetime) else value for value in record.values()]
+                    )
+                    moved.append({'history_id': cursor.lastrowid, **record})
+            if (self._changelog_pruned_at is None
+                    or time.monotonic() - self._changelog_pruned_at > CHANGELOG_PRUNE_INTERVAL_SECONDS):
+                self._prune_changelog(conn)
+            return moved
+
+        moved = await self._transaction(move)
+        if moved:
+            self._history_changed(f'fulfill_requests ({fulfillment_type})')
+        return moved
+
+    async def clear_history(self) -> int:
+        deleted = await self._transaction(lambda conn: conn.execute("DELETE FROM DROP_REQUESTS_HISTORY").rowcount)
+        self._history_changed('clear_all_history')
+        return deleted
+
+    # --- History queries ---
+
+    async def query_history(self, filters: HistoryFilters, limit: int, offset: int,
+                            keyset: Optional[Tuple[datetime, int]], count_mode: str
+                            ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        where_clauses = ["fulfilled_time >= ?", "deliver_to != ?"]
+        params: List[Any] = [to_db_time(datetime.utcnow() - timedelta(days=HISTORY_DISPLAY_DAYS)), EXCLUDED_DELIVER_TO]
+        if filters.serial_no:
+            where_clauses.append("serial_no LIKE ?")
+            params.append(f"%{filters.serial_no}%")
+        if filters.part_no:
+            where_clauses.append("part_no LIKE ?")
+            params.append(f"%{filters.part_no}%")
+        if filters.fulfillment_type:
+            where_clauses.append("fulfillment_type = ?")
+            params.append(filters.fulfillment_type)
+        if filters.start_date:
+            where_clauses.append("fulfilled_time >= ?")
+            params.append(to_db_time(filters.start_date))
+        if filters.end_date:
+            where_clauses.append("fulfilled_time <= ?")
+            params.append(to_db_time(filters.end_date))
+        where_clause = " AND ".join(where_clauses)
+
+        if keyset:
+            page_sql = "AND (fulfilled_time < ? OR (fulfilled_time = ? AND history_id < ?)) ORDER BY fulfilled_time DESC, history_id DESC LIMIT ?"
+            page_params = [to_db_time(keyset[0]), to_db_time(keyset[0]), keyset[1], limit]
+        else:
+            page_sql = "ORDER BY fulfilled_time DESC, history_id DESC LIMIT ? OFFSET ?"
+            page_params = [limit, offset]
+
+        def query(conn):
+            total_count = None
+            if count_mode != 'none':
+                total_count = conn.execute(f"SELECT COUNT(*) FROM DROP_REQUESTS_HISTORY WHERE {where_clause}", params).fetchone()[0]
+            rows = self._rows_as_dicts(conn.execute(
+                f"SELECT {', '.join(HISTORY_COLUMNS)} FROM DROP_REQUESTS_HISTORY WHERE {where_clause} {page_sql}",
+                params + page_params
+            ))
+            return rows, total_count
+        return await self._run(query)
+
+    def _performance_case_sql(self, column: str = 'fulfillment_duration_minutes') -> str:
+        whens = [f"WHEN {column} <= {upper_bound} THEN '{label}'"
+                 for upper_bound, _, label in self.performance_categories if upper_bound is not None]
+        fallback = next(label for upper_bound, _, label in self.performance_categories if upper_bound is None)
+        return f"CASE {' '.join(whens)} ELSE '{fallback}' END"
+
+    async def history_stats(self, days: int, part_no: Optional[str], source: str,
+                            parallel: bool) -> Tuple[Dict[str, Any], Dict[str, float], str]:
+        def window(window_days: int):
+            clauses = ["fulfilled_time >= ?", "deliver_to != ?"]
+            params = [to_db_time(datetime.utcnow() - timedelta(days=window_days)), EXCLUDED_DELIVER_TO]
+            if part_no:
+                clauses.append("part_no = ?")
+                params.append(part_no)
+            return " AND ".join(clauses), params
+
+        where_clause, params = window(days)
+        trend_clause, trend_params = window(min(days, 7))
+        performed = "fulfillment_type != 'manual_delete'"
+        queries = {
+            'overall': (f"""
+                SELECT
+                    COUNT(CASE WHEN {performed} THEN 1 END),
+                    AVG(CASE WHEN {performed} THEN CAST(fulfillment_duration_minutes AS REAL) END),
+                    MIN(CASE WHEN {performed} THEN fulfillment_duration_minutes END),
+                    MAX(CASE WHEN {performed} THEN fulfillment_duration_minutes END),
+                    COUNT(CASE WHEN fulfillment_type = 'auto_cleanup' THEN 1 END),
+                    COUNT(CASE WHEN fulfillment_type = 'manual_cleanup' THEN 1 END),
+                    COUNT(CASE WHEN fulfillment_type = 'manual_delete' THEN 1 END)
+                FROM DROP_REQUESTS_HISTORY WHERE {where_clause}
+            """, params),
+            'by_part_number': (f"""
+                SELECT
+                    part_no,
+                    COUNT(CASE WHEN {performed} THEN 1 END) AS fulfilled_count,
+                    AVG(CASE WHEN {performed} THEN CAST(fulfillment_duration_minutes AS REAL) END) AS avg_minutes,
+                    MIN(CASE WHEN {performed} THEN fulfillment_duration_minutes END),
+                    MAX(CASE WHEN {performed} THEN fulfillment_duration_minutes END)
+                FROM DROP_REQUESTS_HISTORY WHERE {where_clause}
+                GROUP BY part_no
+                HAVING COUNT(CASE WHEN {performed} THEN 1 END) > 0
+                ORDER BY fulfilled_count DESC, avg_minutes ASC
+            """, params),
+            'daily_trends': (f"""
+                SELECT
+                    substr(fulfilled_time, 1, 10) AS fulfillment_date,
+                    COUNT(CASE WHEN {performed} THEN 1 END),
+                    AVG(CASE WHEN {performed} THEN CAST(fulfillment_duration_minutes AS REAL) END)
+                FROM DROP_REQUESTS_HISTORY WHERE {trend_clause}
+                GROUP BY fulfillment_date
+                HAVING COUNT(CASE WHEN {performed} THEN 1 END) > 0
+                ORDER BY fulfillment_date DESC
+            """, trend_params),
+            'performance_breakdown': (f"""
+                SELECT {self._performance_case_sql()} AS category, COUNT(*), AVG(CAST(fulfillment_duration_minutes AS REAL)) AS avg_minutes
+                FROM DROP_REQUESTS_HISTORY
+                WHERE {where_clause} AND {performed} AND fulfillment_duration_minutes IS NOT NULL
+                GROUP BY category
+                ORDER BY avg_minutes ASC
+            """, params),
+            'by_shift': (f"""
+                SELECT
+                    czech_shift(fulfilled_time) AS shift,
+                    COUNT(*),
+                    AVG(CAST(fulfillment_duration_minutes AS REAL)),
+                    MIN(fulfillment_duration_minutes),
+                    MAX(fulfillment_duration_minutes),
+                    COUNT(CASE WHEN fulfillment_type = 'auto_cleanup' THEN 1 END),
+                    COUNT(CASE WHEN fulfillment_type = 'manual_cleanup' THEN 1 END),
+                    COUNT(CASE WHEN fulfillment_type = 'manual_delete' THEN 1 END)
+                FROM DROP_REQUESTS_HISTORY WHERE {where_clause} AND {performed}
+                GROUP BY shift
+            """, params),
+        }
+
+        def run(conn):
+            results, timings = {}, {}
+            for name, (sql, query_params) in queries.items():
+                started = time.perf_counter()
+                results[name] = conn.execute(sql, query_params).fetchall()
+                timings[name] = round((time.perf_counter() - started) * 1000, 2)
+            return results, timings
+
+        results, timings = await self._run(run)
+        results['overall'] = results['overall'][0]
+        results['daily_trends'] = [(date.fromisoformat(row[0]), *row[1:]) for row in results['daily_trends']]
+        results['by_shift'] = {row[0]: tuple(row[1:]) for row in results['by_shift']}
+        # No rollup table here: every source aggregates the history table
+        return results, timings, 'raw'
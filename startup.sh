@@ -4,5 +4,8 @@
 # Install requirements if needed
 pip install -r requirements.txt
 
+# Apply pending schema migrations once, before the workers start
+python manage.py migrate || echo "Schema migration failed, starting anyway"
+
 # Start the application
 gunicorn --bind 0.0.0.0:$PORT --worker-class uvicorn.workers.UvicornWorker --workers 1 main:app
\ No newline at end of file
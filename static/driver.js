@@ -12,6 +12,7 @@ function getBarcodeUrl(location) {
 function createRowElement(data) {
     const row = document.createElement("tr");
     row.classList.add("adding-row");
+    row.dataset.serialNo = data.serial_no;
 
     // Check if this is a master unit (serial_no starts with "MU-")
     const isMasterUnit = data.serial_no && data.serial_no.startsWith('MU-');
@@ -228,11 +229,36 @@ function showAlert(title, message, type) {
     }, 5000);
 }
 
+// ETag of the request list currently on screen (the server's active request version)
+let requestsEtag = null;
+
+// Sequence number of the last request event applied (null until the server's hello)
+let lastEventSeq = null;
+
+// Request events received while /api/requests is being re-read; applied once it is on screen
+let pendingEvents = null;
+let resyncAgain = false;
+
+// Request deltas pushed by the server over the WebSocket
+const REQUEST_EVENT_TYPES = new Set(['request_added', 'master_unit_requested', 'request_fulfilled', 'request_deleted']);
+
 // Function to fetch and display requests
 async function fetchAndDisplayRequests() {
     try {
-        const response = await fetch('/api/requests');
+        // Conditional GET: the server answers 304 without a body while nothing changed.
+        // no-store keeps the browser cache out of it, so a 304 reaches this code as-is.
+        const response = await fetch('/api/requests', {
+            cache: 'no-store',
+            headers: requestsEtag ? { 'If-None-Match': requestsEtag } : {}
+        });
+        if (response.status === 304) {
+            return; // Table is up to date
+        }
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
         const requests = await response.json();
+        requestsEtag = response.headers.get('ETag');
         
         const tbody = document.getElementById("containerTableBody");
         tbody.innerHTML = ''; // Clear existing rows
@@ -246,15 +272,96 @@ async function fetchAndDisplayRequests() {
     }
 }
 
+// Re-read the whole list, holding back events that arrive meanwhile and replaying them after.
+// Replaying is safe: adds replace a row with the same serial, removals of missing rows do nothing.
+async function resyncRequests() {
+    if (pendingEvents) {
+        // Already re-reading, but that read may predate what prompted this call: read again after it
+        resyncAgain = true;
+        return;
+    }
+    pendingEvents = [];
+    try {
+        await fetchAndDisplayRequests();
+    } finally {
+        const buffered = pendingEvents;
+        pendingEvents = null;
+        buffered.forEach(applyRequestEvent);
+    }
+    if (resyncAgain) {
+        resyncAgain = false;
+        resyncRequests();
+    }
+}
+
+// Function to find the table row of a serial number
+function findRequestRow(serialNo) {
+    return document.querySelector(`#containerTableBody tr[data-serial-no="${CSS.escape(serialNo)}"]`);
+}
+
+// Function to apply one request event to the table
+function applyRequestEvent(event) {
+    const tbody = document.getElementById("containerTableBody");
+
+    (event.requests || []).forEach(data => {
+        const row = createRowElement(data);
+        const existing = findRequestRow(data.serial_no);
+        if (existing) {
+            existing.replaceWith(row);
+        } else {
+            tbody.prepend(row); // Newest request first, like /api/requests
+        }
+    });
+
+    (event.serial_nos || []).forEach(serialNo => {
+        const row = findRequestRow(serialNo);
+        if (row) {
+            row.removeAttribute('data-serial-no');
+            row.style.transition = 'opacity 0.3s ease';
+            row.style.opacity = '0';
+            setTimeout(() => row.remove(), 300);
+        }
+    });
+}
+
+// Function to handle request events, re-reading the list when one was missed
+function handleRequestEvent(event) {
+    if (lastEventSeq !== null && event.seq !== lastEventSeq + 1) {
+        console.warn(`Missed request events (expected seq ${lastEventSeq + 1}, got ${event.seq}) - reloading requests`);
+        resyncRequests();
+    }
+    lastEventSeq = event.seq;
+
+    if (pendingEvents) {
+        pendingEvents.push(event);
+    } else {
+        applyRequestEvent(event);
+    }
+}
+
 // Fetch requests when page loads
-document.addEventListener('DOMContentLoaded', fetchAndDisplayRequests);
+document.addEventListener('DOMContentLoaded', resyncRequests);
+
+// Fallback polling (conditional, usually a 304) for events this page may have missed.
+// Goes through resyncRequests, so an event applied while the poll is in flight is replayed
+// over its response instead of being overwritten by an older list; a re-read already in
+// flight covers the tick. Runs every 5 seconds until the server's hello sets the interval.
+function pollRequests() {
+    if (!pendingEvents) {
+        resyncRequests();
+    }
+}
 
-// Set up polling to refresh data every 5 seconds
-setInterval(fetchAndDisplayRequests, 5000);
+let fallbackPollTimer = setInterval(pollRequests, 5000);
+
+function setFallbackPollInterval(seconds) {
+    clearInterval(fallbackPollTimer);
+    fallbackPollTimer = setInterval(pollRequests, seconds * 1000);
+}
 
 // WebSocket event handlers
 socket.onopen = function(e) {
-    console.log("WebSocket connection established for cleanup notifications");
+    console.log("WebSocket connection established for request updates and cleanup notifications");
 };
 
 socket.onclose = function(event) {
@@ -271,6 +378,27 @@ socket.onerror = function(error) {
 socket.onmessage = function(event) {
     try {
         const data = JSON.parse(event.data);
+
+        if (data.type === 'hello') {
+            // Events from here on follow data.seq; catch up on anything changed before the connection
+            lastEventSeq = data.seq;
+            if (data.fallback_poll_seconds) {
+                setFallbackPollInterval(data.fallback_poll_seconds);
+            }
+            resyncRequests();
+            return;
+        }
+        if (data.type === 'resync') {
+            // This page fell behind and the server dropped its queued events: reload, continue from data.seq
+            lastEventSeq = data.seq;
+            resyncRequests();
+            return;
+        }
+        if (REQUEST_EVENT_TYPES.has(data.type)) {
+            handleRequestEvent(data);
+            return;
+        }
+
         console.log("Received cleanup notification:", data);
         
         if (data.type === 'auto_cleanup_complete') {
@@ -279,7 +407,7 @@ socket.onmessage = function(event) {
             showAutoCleanupError(data);
         }
         // Refresh the table after cleanup notifications
-        setTimeout(fetchAndDisplayRequests, 1000);
+        setTimeout(resyncRequests, 1000);
     } catch (error) {
         console.error('Error parsing WebSocket message:', error);
     }
@@ -399,7 +527,7 @@ async function triggerManualCleanup() {
         displayCleanupResults(results);
         
         // Refresh the table to show removed items
-        setTimeout(fetchAndDisplayRequests, 1000);
+        setTimeout(resyncRequests, 1000);
         
     } catch (error) {
         console.error('❌ Error during manual cleanup:', error);
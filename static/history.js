@@ -109,10 +109,11 @@ class HistoryManager {
         try {
             console.log(`📋 Loading history data (page ${this.currentPage}, size ${this.pageSize})...`);
             
-            // Build query parameters
+            // Build query parameters (a cached total lets the server answer repeat loads from its response cache)
             const params = new URLSearchParams({
                 page: this.currentPage.toString(),
                 limit: this.pageSize.toString(),
+                total: 'cached',
                 ...this.currentFilters
             });
             
@@ -632,12 +633,14 @@ class HistoryManager {
                 // Export current filtered data
                 params = new URLSearchParams({
                     limit: '10000', // Large limit to get all filtered data
+                    total: 'none', // The export does not show a record count
                     ...this.currentFilters
                 });
             } else {
                 // Export all data (last 30 days)
                 params = new URLSearchParams({
-                    limit: '10000'
+                    limit: '10000',
+                    total: 'none'
                 });
             }
             
@@ -792,7 +795,12 @@ class HistoryManager {
             const result = await response.json();
             console.log('✅ Clear all history result:', result);
             
-            if (result.status === 'success') {
+            if (result.status === 'started') {
+                // Large histories are deleted in batches by a background purge run
+                this.showSuccess(`Deleting ${result.rows_to_delete} history records in the background`);
+                
+                await this.loadInitialData();
+            } else if (result.status === 'success') {
                 this.showSuccess(`Successfully deleted ${result.deleted_count} history records`);
                 
                 // Refresh all data to show empty state
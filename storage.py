@@ -0,0 +1,163 @@
+"""
+Storage backend interface for the Drop List app
+
+main.py talks to persistence only through a StorageBackend: active requests, history
+writes, history queries and history stats. Two implementations exist:
+
+    AzureSqlStorage  (main.py)           aioodbc against Azure SQL, the production backend
+    SQLiteStorage    (sqlite_storage.py) embedded, single file, no network or ODBC driver
+
+The backend is chosen with the STORAGE_BACKEND environment variable ('azure' or 'sqlite').
+Values are returned in the shapes the endpoints format: datetimes as naive UTC datetime
+objects, quantities as numbers, stats results as the tuples documented on history_stats.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+# /api/history only lists fulfillments from the last 30 days
+HISTORY_DISPLAY_DAYS = 30
+
+# Workcenter used for testing; excluded from history listings and stats
+EXCLUDED_DELIVER_TO = 'TEST'
+
+HISTORY_COLUMNS = [
+    'history_id', 'req_id', 'serial_no', 'part_no', 'revision', 'quantity', 'location', 'deliver_to',
+    'req_time', 'fulfilled_time', 'fulfillment_duration_minutes', 'fulfillment_type', 'current_location'
+]
+
+
+class StorageBusyError(Exception):
+    """Another process holds the data the operation needs (e.g. a history purge is running)"""
+
+
+class HistoryFilters(NamedTuple):
+    serial_no: Optional[str] = None         # substring
+    part_no: Optional[str] = None           # substring
+    fulfillment_type: Optional[str] = None  # exact
+    start_date: Optional[datetime] = None   # fulfilled_time >= start_date
+    end_date: Optional[datetime] = None     # fulfilled_time <= end_date
+
+
+class RequestRecord(NamedTuple):
+    serial_no: str
+    revision: Optional[str] = None
+    quantity: Optional[float] = None
+    location: Optional[str] = None
+    master_unit_no: Optional[str] = None
+
+
+class ActiveRequestChanges(NamedTuple):
+    version: int                 # newest committed change log version these changes cover
+    rows: List[Dict[str, Any]]   # requests inserted after since_version that are still active
+    deleted_req_ids: List[int]   # requests deleted after since_version
+
+
+class StorageBackend:
+    """Persistence operations used by the app; see the module docstring"""
+
+    name = 'abstract'
+
+    async def start(self):
+        """Open connections / create the schema if the backend manages it"""
+
+    async def close(self):
+        """Release connections"""
+
+    # --- Active requests ---
+
+    async def list_active_requests(self) -> List[Dict[str, Any]]:
+        """All DROP_REQUESTS rows as dicts (every column), newest req_time first"""
+        raise NotImplementedError
+
+    async def active_request_summary(self) -> Tuple[int, Optional[datetime], Optional[datetime]]:
+        """(active request count, oldest req_time, newest req_time)"""
+        raise NotImplementedError
+
+    async def requested_serials(self, serial_nos: Sequence[Any]) -> Set[str]:
+        """The subset of serial_nos that have an active request"""
+        raise NotImplementedError
+
+    async def active_requests_version(self) -> int:
+        """
+        Version of the active request list: increases with every committed insert or
+        delete of a request (DROP_REQUESTS_CHANGELOG), never counting uncommitted ones
+        """
+        raise NotImplementedError
+
+    async def active_request_changes(self, since_version: int) -> Optional[ActiveRequestChanges]:
+        """
+        Changes to the active request list between since_version and the newest committed
+        version, from DROP_REQUESTS_CHANGELOG. None when the change log does not cover
+        since_version (pruned by the retention purge, newer than the log, or 0 while the log
+        has entries, as rows may predate it): read the whole list instead.
+        """
+        raise NotImplementedError
+
+    async def insert_request(self, part_no: str, deliver_to: str, req_time: datetime,
+                             record: RequestRecord) -> Optional[int]:
+        """Insert one request; returns its database-allocated req_id"""
+        raise NotImplementedError
+
+    async def insert_requests(self, part_no: str, deliver_to: str, req_time: datetime,
+                              records: Sequence[RequestRecord]) -> Dict[str, int]:
+        """
+        Insert several requests in one transaction, skipping serials that already have
+        an active request. Returns {serial_no: req_id} for the rows that were inserted.
+        """
+        raise NotImplementedError
+
+    # --- History writes ---
+
+    async def fulfill_requests(self, fulfillments: List[tuple], fulfillment_type: str) -> List[Dict[str, Any]]:
+        """
+        Move requests to history in one transaction
+
+        Args:
+            fulfillments: (serial_no, current_location) pairs
+            fulfillment_type: 'auto_cleanup', 'manual_cleanup' or 'manual_delete'
+
+        Returns:
+            The history rows written (serials without an active request are skipped)
+        """
+        raise NotImplementedError
+
+    async def clear_history(self) -> int:
+        """Delete all history; returns the number of rows deleted (StorageBusyError if a purge is running)"""
+        raise NotImplementedError
+
+    # --- History queries ---
+
+    async def query_history(self, filters: HistoryFilters, limit: int, offset: int,
+                            keyset: Optional[Tuple[datetime, int]], count_mode: str
+                            ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        One page of history from the last HISTORY_DISPLAY_DAYS days, newest first
+        (fulfilled_time DESC, history_id DESC), excluding EXCLUDED_DELIVER_TO
+
+        Args:
+            limit: rows to return (callers ask for one extra to detect a next page)
+            offset: rows to skip (ignored when keyset is given)
+            keyset: (fulfilled_time, history_id) of the last row of the previous page
+            count_mode: 'exact', 'cached' or 'none' for the total row count
+
+        Returns:
+            (rows as dicts with HISTORY_COLUMNS, total count or None)
+        """
+        raise NotImplementedError
+
+    async def history_stats(self, days: int, part_no: Optional[str], source: str,
+                            parallel: bool) -> Tuple[Dict[str, Any], Dict[str, float], str]:
+        """
+        Aggregates for /api/history/stats over the last `days` days
+
+        Returns:
+            (results, timings in ms by query, source actually used) where results has
+            overall: (total, avg, min, max, auto, manual_cleanup, manual_delete)
+            by_part_number: [(part_no, count, avg, min, max)]
+            daily_trends: [(date, count, avg)] for the last min(days, 7) days, newest first
+            performance_breakdown: [(label, count, avg)] ordered by avg
+            by_shift: {shift: (count, avg, min, max, auto, manual_cleanup, manual_delete)}
+        """
+        raise NotImplementedError
+
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-worker active requests view (active_requests_view.py)
+Backed by a throwaway SQLite storage (conftest.py), no database server needed
+"""
+
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+from active_requests_view import ActiveRequestsView
+from storage import RequestRecord
+
+
+async def test_incremental_refresh_and_indexes(storage):
+    view = ActiveRequestsView(storage, max_lag_seconds=60)
+
+    now = datetime.utcnow()
+    await storage.insert_request('P-1', 'W1', now - timedelta(hours=1), RequestRecord('S1', quantity=1))
+
+    version, rows = await view.list_requests()
+    assert version == 1 and [row['serial_no'] for row in rows] == ['S1']
+    assert view.full_reloads == 1
+
+    # Another writer's changes are only picked up by a refresh, and only the changes are read
+    await storage.insert_requests('P-2', 'W2', now, [RequestRecord('S2'), RequestRecord('S3')])
+    await storage.fulfill_requests([('S1', 'L')], 'manual_delete')
+    assert await view.requested_serials(['S1', 'S2']) == {'S1'}
+    await view.refresh()
+    assert view.full_reloads == 1 and view.changes_applied == 3
+
+    version, rows = await view.list_requests()
+    assert version == await storage.active_requests_version()
+    assert [row['serial_no'] for row in rows] == ['S3', 'S2']
+    assert await view.requested_serials(['S1', 'S2', 'S3', None]) == {'S2', 'S3'}
+    assert [row['serial_no'] for row in (await view.list_requests(part_no='P-2', deliver_to='W2'))[1]] == ['S3', 'S2']
+    assert (await view.list_requests(part_no='P-1'))[1] == []
+    assert (await view.list_requests(part_no='P-2', deliver_to='W1'))[1] == []
+
+    count, oldest, newest = await view.summary()
+    assert count == 2 and oldest == newest == now
+    assert view.get_stats()['distinct_values'] == {'serial_no': 2, 'part_no': 1, 'deliver_to': 1}
+
+
+async def test_reload_when_change_log_was_pruned(storage):
+    view = ActiveRequestsView(storage, max_lag_seconds=60)
+
+    now = datetime.utcnow()
+    await storage.insert_request('P-1', 'W1', now, RequestRecord('S1'))
+    await view.refresh()
+
+    await storage.insert_request('P-1', 'W1', now, RequestRecord('S2'))
+    # Retention purge: everything but the newest change log row is gone
+    await storage._run(lambda conn: conn.execute(
+        "DELETE FROM DROP_REQUESTS_CHANGELOG WHERE version < (SELECT MAX(version) FROM DROP_REQUESTS_CHANGELOG)"
+    ))
+    assert await storage.active_request_changes(view.version) is None
+
+    await view.refresh()
+    assert view.full_reloads == 2
+    assert await view.requested_serials(['S1', 'S2']) == {'S1', 'S2'}
+
+
+async def test_stale_reads_refresh_first(storage):
+    view = ActiveRequestsView(storage, max_lag_seconds=0)
+
+    assert (await view.summary())[0] == 0
+    await storage.insert_request('P-1', 'W1', datetime.utcnow(), RequestRecord('S1'))
+    assert (await view.summary())[0] == 1
+    assert view.read_through_refreshes == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for the cross-worker broadcast bus (broadcast_bus.py)
+Two UnixSocketBus instances in one process stand in for two gunicorn workers
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+from broadcast_bus import UnixSocketBus, unix_bus_supported
+
+pytestmark = pytest.mark.skipif(not unix_bus_supported(), reason="needs Unix domain sockets and fcntl")
+
+
+class Worker:
+    def __init__(self, path):
+        self.bus = UnixSocketBus(path, reconnect_seconds=0.01)
+        self.received = []
+        self.reconnects = 0
+
+    async def start(self):
+        async def on_message(text):
+            self.received.append(text)
+
+        async def on_reconnect():
+            self.reconnects += 1
+
+        await self.bus.start(on_message, on_reconnect)
+        await wait_for(lambda: self.bus.get_stats()['connected'])
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+async def test_messages_reach_other_workers_and_broker_fails_over(tmp_path):
+    path = str(tmp_path / 'bus.sock')
+    first, second = Worker(path), Worker(path)
+    await first.start()
+    await second.start()
+    assert first.bus.get_stats()['role'] == 'broker' and second.bus.get_stats()['role'] == 'client'
+
+    await first.bus.publish('from first')
+    await second.bus.publish('from second ✅\nwith a newline')
+    await wait_for(lambda: first.received and second.received)
+    assert first.received == ['from second ✅\nwith a newline']  # Never echoed to the sender
+    assert second.received == ['from first']
+
+    # The broker's worker exits: the other one takes over and is told it may have missed messages
+    await first.bus.close()
+    await wait_for(lambda: second.bus.get_stats()['role'] == 'broker' and second.bus.get_stats()['connected'])
+    assert second.reconnects == 1
+
+    third = Worker(path)
+    await third.start()
+    await second.bus.publish('after failover')
+    await wait_for(lambda: third.received)
+    assert third.received == ['after failover']
+
+    await third.bus.close()
+    await second.bus.close()
+    assert not os.path.exists(path)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for the ERP call throttling (main.TokenBucket, main.ErpCallLimiter)
+"""
+
+import asyncio
+import sys
+import time
+
+import pytest
+
+from main import ErpCallLimiter, TokenBucket
+
+
+async def timed_acquires(bucket, count):
+    started = time.monotonic()
+    for _ in range(count):
+        await bucket.acquire()
+    return time.monotonic() - started
+
+
+async def test_bucket_allows_a_burst_then_refills_at_its_rate():
+    bucket = TokenBucket(rate=20, capacity=3)
+
+    assert await timed_acquires(bucket, 3) < 0.03  # The burst does not wait
+    waited = await timed_acquires(bucket, 2)  # Two more tokens at 20/s take ~0.1s
+    assert 0.08 <= waited < 0.5
+
+
+async def test_bucket_capacity_is_at_least_one_and_never_overfills():
+    bucket = TokenBucket(rate=1000, capacity=0)
+    assert bucket.capacity == 1
+
+    await asyncio.sleep(0.02)  # Would refill 20 tokens without the cap
+    await bucket.acquire()
+    assert bucket._tokens < 1
+
+
+async def test_limiter_caps_concurrency_and_counts_calls():
+    limiter = ErpCallLimiter(max_concurrency=2, rate_per_second=1000, burst=100)
+    running = []
+
+    async def erp_call(serial_no):
+        running.append(serial_no)
+        assert limiter.in_flight <= 2
+        await asyncio.sleep(0.01)
+        return serial_no.lower()
+
+    results = await asyncio.gather(*(limiter.call(erp_call, f"S{i}") for i in range(6)))
+
+    assert results == [f"s{i}" for i in range(6)]
+    assert limiter.calls == 6 and limiter.peak_in_flight == 2 and limiter.in_flight == 0
+    assert limiter.get_stats() == {
+        'max_concurrency': 2,
+        'peak_concurrency': 2,
+        'rate_limit_per_second': 1000,
+        'rate_limit_burst': 100
+    }
+
+
+async def test_limiter_rate_limits_calls():
+    limiter = ErpCallLimiter(max_concurrency=10, rate_per_second=20, burst=2)
+
+    async def erp_call():
+        return None
+
+    started = time.monotonic()
+    await asyncio.gather(*(limiter.call(erp_call) for _ in range(4)))
+    assert time.monotonic() - started >= 0.08  # 2 calls from the burst, 2 more at 20/s
+
+
+async def test_failed_call_releases_its_slot():
+    limiter = ErpCallLimiter(max_concurrency=1, rate_per_second=1000, burst=10)
+
+    async def failing():
+        raise ConnectionError("ERP down")
+
+    async def working():
+        return 'ok'
+
+    with pytest.raises(ConnectionError):
+        await limiter.call(failing)
+    assert await asyncio.wait_for(limiter.call(working), timeout=1) == 'ok'
+    assert limiter.in_flight == 0 and limiter.calls == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
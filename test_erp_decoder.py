@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Parity tests: erp_decoder against the previous pandas pipeline (bench_erp_decoder.pandas_path)
+"""
+
+import math
+import sys
+
+import pandas as pd
+import pytest
+
+from bench_erp_decoder import COLUMNS, decoder_path, make_payload, pandas_path
+from erp_decoder import KIND_BOOL, KIND_FLOAT, KIND_INT, KIND_OBJECT, ErpTable, column_kind
+
+
+def same_value(a, b) -> bool:
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return a == b and type(a) is type(b)
+
+
+def assert_same_records(expected, actual):
+    assert [list(record) for record in actual] == [list(record) for record in expected]
+    for expected_record, actual_record in zip(expected, actual):
+        for column in expected_record:
+            assert same_value(expected_record[column], actual_record[column]), (
+                column, expected_record[column], actual_record[column]
+            )
+
+
+def payload(rows, columns=COLUMNS):
+    return {'outputs': {}, 'tables': [{'columns': list(columns), 'rows': rows}]}
+
+
+def row(serial_no, quantity=100, location='WH-A01', add_date='2024-03-01T06:00:00', revision='A', master_unit=None):
+    return [serial_no, 'P-10001', revision, quantity, location, add_date, master_unit]
+
+
+@pytest.mark.parametrize('row_count, seed', [(1, 1), (20, 7), (200, 11), (2000, 7)])
+def test_synthetic_payloads_match_pandas(row_count, seed):
+    data = make_payload(row_count, seed)
+    requested = {r[0] for r in data['tables'][0]['rows'][::5]}
+    assert_same_records(pandas_path(data, requested), decoder_path(data, requested))
+
+
+def test_empty_result_matches_pandas():
+    assert decoder_path(payload([]), set()) == pandas_path(payload([]), set()) == []
+
+
+@pytest.mark.parametrize('missing', ['Location', 'Add_Date', 'Serial_No'])
+def test_missing_column_raises_key_error_like_pandas(missing):
+    columns = [column for column in COLUMNS if column != missing]
+    data = payload([[value for column, value in zip(COLUMNS, row('S1')) if column != missing]], columns)
+
+    with pytest.raises(KeyError):
+        pandas_path(data, set())
+    with pytest.raises(KeyError):
+        decoder_path(data, set())
+
+
+@pytest.mark.parametrize('rows', [
+    [row('S1', quantity=None), row('S2', quantity=50)],  # int column with a gap -> float
+    [row('S1', quantity=math.nan), row('S2', quantity=50)],
+    [row('S1', quantity=None), row('S2', quantity=None)],  # all missing -> 0 (object column)
+    [row('S1', quantity=math.nan), row('S2', quantity=math.nan)],  # all NaN -> 0.0 (float column)
+    [row('S1', quantity=math.inf), row('S2', quantity=-math.inf), row('S3', quantity=7)],
+    [row('S1', revision=None, master_unit=None), row('S2', revision='B', master_unit='800001')],
+    [row('S1', location=None), row('S2', location='J-B1'), row('S3', location='PROD-03')],
+    [row('S1', add_date=None), row('S2'), row('S0')],  # missing sort key sorts last
+])
+def test_none_and_nan_values_match_pandas(rows):
+    requested = {'S2'}
+    assert_same_records(pandas_path(payload(rows), requested), decoder_path(payload(rows), requested))
+
+
+@pytest.mark.parametrize('values, kind', [
+    ([1, 2, 3], KIND_INT),
+    ([1, 2.5], KIND_FLOAT),
+    ([1, None], KIND_FLOAT),
+    ([math.nan, math.nan], KIND_FLOAT),
+    ([None, None], KIND_OBJECT),
+    ([True, False], KIND_BOOL),
+    ([True, None], KIND_OBJECT),
+    ([True, 1], KIND_OBJECT),
+    (['10', 20], KIND_OBJECT),
+    ([], KIND_OBJECT),
+])
+def test_numeric_coercion_matches_pandas_dtypes(values, kind):
+    assert column_kind(values) == kind
+
+    rows = [[value] for value in values]
+    expected = pd.DataFrame(rows, columns=['value']).to_dict(orient='records')
+    assert_same_records(expected, ErpTable(['value'], rows).records())
+
+    filled = pd.DataFrame(rows, columns=['value']).fillna(0).to_dict(orient='records')
+    assert_same_records(filled, ErpTable(['value'], rows).records(fill_missing=True))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for GET /api/history (main.get_history) on the SQLite backend
+"""
+
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+from storage import RequestRecord
+
+
+@pytest.fixture
+def history():
+    main.history_response_cache.invalidate('test setup')
+    yield main.storage
+    asyncio.run(main.storage.clear_history())
+    asyncio.run(main.storage.close())
+
+
+async def fulfill(storage, serial_no):
+    await storage.insert_request('P-1', 'W1', datetime.utcnow() - timedelta(minutes=30), RequestRecord(serial_no))
+    await storage.fulfill_requests([(serial_no, 'W1')], 'manual')
+
+
+async def get_history(**params):
+    response = await main.get_history(**params)
+    return json.loads(response.body)
+
+
+async def test_repeated_page_load_is_answered_from_the_response_cache(history):
+    await fulfill(history, 'S1')
+    cache = main.history_response_cache
+
+    first = await get_history(page=1, limit=50, total='cached')
+    hits, misses = cache.hits, cache.misses
+    second = await get_history(page=1, limit=50, total='cached')
+
+    assert (cache.hits, cache.misses) == (hits + 1, misses)
+    assert second == first and first['pagination']['total_records'] == 1
+
+
+async def test_history_write_invalidates_cached_pages(history):
+    await fulfill(history, 'S1')
+    await get_history(total='cached')
+
+    await fulfill(history, 'S2')
+    misses = main.history_response_cache.misses
+    page = await get_history(total='cached')
+
+    assert main.history_response_cache.misses == misses + 1
+    assert [record['serial_no'] for record in page['data']] == ['S2', 'S1']
+
+
+async def test_exact_total_bypasses_the_response_cache(history):
+    await fulfill(history, 'S1')
+    cache = main.history_response_cache
+    hits, misses = cache.hits, cache.misses
+
+    await get_history(total='exact')
+    await get_history(total='exact')
+
+    assert (cache.hits, cache.misses) == (hits, misses)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for the /api/history keyset cursor (main.encode_history_cursor / main.decode_history_cursor)
+"""
+
+import base64
+import json
+import sys
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from main import decode_history_cursor, encode_history_cursor
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+@pytest.mark.parametrize('fulfilled_time, history_id', [
+    (datetime(2024, 3, 1, 6, 0), 1),
+    (datetime(2024, 12, 31, 23, 59, 59, 999999), 123456789),
+    (datetime(2025, 1, 1), 2 ** 40),
+])
+def test_cursor_round_trip(fulfilled_time, history_id):
+    cursor = encode_history_cursor(fulfilled_time, history_id)
+
+    assert decode_history_cursor(cursor) == (fulfilled_time, history_id)
+    assert '=' not in cursor and '+' not in cursor and '/' not in cursor  # Safe in a query string
+
+
+@pytest.mark.parametrize('cursor', [
+    '',
+    'not a cursor',
+    'é',
+    encode_history_cursor(datetime(2024, 3, 1), 7)[:-3],  # Truncated
+    raw_cursor({'t': '2024-03-01T00:00:00'}),  # Missing id
+    raw_cursor({'t': 'yesterday', 'id': 7}),
+    raw_cursor({'t': '2024-03-01T00:00:00', 'id': 'seven'}),
+    raw_cursor(['2024-03-01T00:00:00', 7]),
+])
+def test_tampered_or_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_history_cursor(cursor)
+
+
+async def test_invalid_cursor_is_a_bad_request():
+    with pytest.raises(HTTPException) as error:
+        await main.get_history(cursor='not a cursor')
+    assert error.value.status_code == 400
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Tests for the batched history purge (main.purge_history)
+The Azure SQL connection is replaced by FakePurgeDb, which answers the purge's statements
+from in-memory history rows and DROP_REQUESTS_HISTORY_PURGE runs
+"""
+
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+
+
+class FakePurgeDb:
+    def __init__(self, history):
+        self.history = dict(history)  # history_id -> fulfilled_time
+        self.runs = {}
+        self.lock_held_elsewhere = False
+        self.fail_on_batch = None
+        self.batches = 0
+        self.statements = []
+
+    def matching(self, sql, value):
+        if 'fulfilled_time < ?' in sql:
+            return sorted((t, i) for i, t in self.history.items() if t < value)
+        return sorted((i, i) for i in self.history if i <= value)
+
+    def execute(self, sql, params):
+        self.statements.append(sql)
+        if 'sp_getapplock' in sql:
+            return [(-1 if self.lock_held_elsewhere else 0,)]
+        if 'WHERE mode = ? AND status IN' in sql:
+            runs = [r for r in self.runs.values() if r['mode'] == params[0] and r['status'] in ('running', 'failed')]
+            return [(r['purge_id'], r['cutoff_time'], r['max_history_id'], r['deleted_rows'], r['batches'])
+                    for r in sorted(runs, key=lambda r: -r['purge_id'])[:1]]
+        if 'MAX(history_id)' in sql:
+            return [(max(self.history, default=0),)]
+        if 'INSERT INTO DROP_REQUESTS_HISTORY_PURGE' in sql:
+            purge_id = len(self.runs) + 1
+            self.runs[purge_id] = {'purge_id': purge_id, 'mode': params[0], 'cutoff_time': params[1],
+                                   'max_history_id': params[2], 'status': 'running', 'deleted_rows': 0, 'batches': 0}
+            return [(purge_id,)]
+        if 'SELECT COUNT(*) FROM DROP_REQUESTS_HISTORY WHERE' in sql:
+            return [(len(self.matching(sql, params[0])),)]
+        if 'DECLARE @batch' in sql:
+            batch_size, value, purge_id = params
+            self.batches += 1
+            if self.batches == self.fail_on_batch:
+                raise ConnectionResetError("connection lost")
+            batch = self.matching(sql, value)[:batch_size]
+            for _, history_id in batch:
+                del self.history[history_id]
+            self.runs[purge_id]['deleted_rows'] += len(batch)
+            self.runs[purge_id]['batches'] += 1
+            return [(len(batch),)]
+        for status in ('running', 'completed', 'failed'):
+            if f"SET status = '{status}'" in sql:
+                self.runs[params[-1]]['status'] = status
+        return []
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    async def execute(self, sql, params=()):
+        self.rows = self.db.execute(sql, list(params))
+
+    async def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    async def cursor(self):
+        return FakeCursor(self.db)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def purge_db(monkeypatch):
+    now = datetime.utcnow()
+    db = FakePurgeDb({i: now - timedelta(days=40 + i) for i in range(1, 6)} | {6: now, 7: now})
+    db.rollup_rebuilds = 0
+
+    async def get_db_connection():
+        return FakeConnection(db)
+
+    async def release_db_connection(conn):
+        pass
+
+    async def rebuild_history_rollups():
+        db.rollup_rebuilds += 1
+
+    monkeypatch.setattr(main, 'get_db_connection', get_db_connection)
+    monkeypatch.setattr(main, 'release_db_connection', release_db_connection)
+    monkeypatch.setattr(main, 'rebuild_history_rollups', rebuild_history_rollups)
+    return db
+
+
+async def test_retention_purge_reports_its_run_and_deletes_in_batches(purge_db):
+    started = asyncio.get_running_loop().create_future()
+    result = await main.purge_history('retention', days=30, batch_size=2, pause_seconds=0, started=started)
+
+    run = started.result()
+    assert run['status'] == 'running' and run['purge_id'] == 1 and run['rows_to_delete'] == 5
+    assert result['status'] == 'completed' and result['deleted_rows'] == 5 and result['batches'] == 3
+    assert sorted(purge_db.history) == [6, 7]
+    assert purge_db.runs[1]['status'] == 'completed'
+    assert any('DROP_REQUESTS_HISTORY_ROLLUP' in sql for sql in purge_db.statements)
+    assert any('sp_releaseapplock' in sql for sql in purge_db.statements)
+
+
+async def test_failed_purge_is_resumed_with_its_cutoff(purge_db):
+    purge_db.fail_on_batch = 2
+    with pytest.raises(ConnectionResetError):
+        await main.purge_history('retention', days=30, batch_size=2, pause_seconds=0)
+    assert purge_db.runs[1]['status'] == 'failed' and purge_db.runs[1]['deleted_rows'] == 2
+    assert any('sp_releaseapplock' in sql for sql in purge_db.statements)
+
+    result = await main.purge_history('retention', days=10, batch_size=2, pause_seconds=0)
+    assert result['resumed'] and result['purge_id'] == 1
+    assert result['cutoff_time'] == purge_db.runs[1]['cutoff_time'].isoformat()  # Not the new days=10 cutoff
+    assert result['deleted_rows'] == 5 and sorted(purge_db.history) == [6, 7]
+
+
+async def test_purge_is_skipped_while_another_one_runs(purge_db):
+    purge_db.lock_held_elsewhere = True
+    started = asyncio.get_running_loop().create_future()
+    assert await main.purge_history('retention', started=started) == {'status': 'skipped', 'mode': 'retention'}
+    assert started.result()['status'] == 'skipped'
+    assert purge_db.runs == {} and len(purge_db.history) == 7
+
+
+async def test_clear_all_deletes_what_existed_at_start_and_rebuilds_rollups(purge_db):
+    result = await main.purge_history('clear_all', batch_size=5, pause_seconds=0)
+    assert result['deleted_rows'] == 7 and result['cutoff_time'] is None
+    assert purge_db.runs[1]['max_history_id'] == 7 and purge_db.history == {}
+    assert purge_db.rollup_rebuilds == 1
+
+
+async def test_background_purge_answers_with_its_run(purge_db):
+    result = await main.start_history_purge_task('clear_all', batch_size=5, pause_seconds=0)
+    assert result == {'status': 'started', 'purge_id': 1, 'mode': 'clear_all', 'resumed': False, 'rows_to_delete': 7}
+    await main.history_purge_task
+    assert purge_db.runs[1]['status'] == 'completed' and purge_db.history == {}
+
+
+def test_retention_cutoff_is_utc_midnight():
+    cutoff = main.history_retention_cutoff(30, now=datetime(2024, 3, 31, 17, 45))
+    assert cutoff == datetime(2024, 3, 1)
+    assert main.history_purge_predicate('retention', cutoff, None)[:2] == ("fulfilled_time < ?", [cutoff])
+    assert main.history_purge_predicate('clear_all', None, 42)[:2] == ("history_id <= ?", [42])
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for the history rollup aggregation (main.accumulate_history_rollups, main.performance_category_sql)
+The SQL conditions are plain comparisons, so they are evaluated in an in-memory SQLite database
+"""
+
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import pytest
+
+import main
+from main import PERFORMANCE_CATEGORIES, ROLLUP_SUM_COLUMNS, accumulate_history_rollups, performance_category
+
+DURATIONS = [0, 59, 60, 61, 480, 481, 1440, 1441, 10000, None]
+
+
+def history_row(duration, part_no='P-1', fulfillment_type='auto_cleanup'):
+    return {
+        'fulfilled_time': datetime(2024, 3, 1, 8, 0),
+        'part_no': part_no,
+        'deliver_to': 'W1',
+        'fulfillment_type': fulfillment_type,
+        'fulfillment_duration_minutes': duration
+    }
+
+
+def test_performance_category_bounds():
+    assert [performance_category(duration) for duration in DURATIONS] == [
+        'fast', 'fast', 'fast', 'medium', 'medium', 'slow', 'slow', 'very_slow', 'very_slow', None
+    ]
+
+
+def test_unknown_durations_count_as_fulfilled_but_in_no_bucket():
+    rollups = accumulate_history_rollups([history_row(duration) for duration in DURATIONS])
+
+    (entry,) = rollups.values()
+    known = [duration for duration in DURATIONS if duration is not None]
+    assert entry['fulfilled_count'] == len(DURATIONS)
+    assert entry['duration_count'] == len(known) and entry['duration_sum'] == sum(known)
+    assert sum(entry[f'{prefix}_count'] for _, prefix, _ in PERFORMANCE_CATEGORIES) == entry['duration_count']
+    assert sum(entry[f'{prefix}_sum'] for _, prefix, _ in PERFORMANCE_CATEGORIES) == entry['duration_sum']
+    assert (entry['very_slow_count'], entry['very_slow_sum']) == (2, 11441)
+    assert (entry['duration_min'], entry['duration_max']) == (0, 10000)
+
+
+def test_rollups_are_keyed_and_added_to_existing_entries():
+    rollups = accumulate_history_rollups([history_row(30), history_row(None, fulfillment_type='manual_delete')])
+    rollups = accumulate_history_rollups([history_row(90)], rollups)
+
+    assert sorted(key[-1] for key in rollups) == ['auto_cleanup', 'manual_delete']
+    auto = rollups[(datetime(2024, 3, 1).date(), 'Morning', 'P-1', 'W1', 'auto_cleanup')]
+    assert (auto['fulfilled_count'], auto['fast_count'], auto['medium_count']) == (2, 1, 1)
+    manual_delete = rollups[(datetime(2024, 3, 1).date(), 'Morning', 'P-1', 'W1', 'manual_delete')]
+    assert manual_delete == {**dict.fromkeys(ROLLUP_SUM_COLUMNS, 0), 'fulfilled_count': 1,
+                             'duration_min': None, 'duration_max': None}
+
+
+@pytest.fixture
+def durations_db():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE h (fulfillment_duration_minutes INTEGER)")
+    conn.executemany("INSERT INTO h VALUES (?)", [(duration,) for duration in DURATIONS])
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('prefix', [prefix for _, prefix, _ in PERFORMANCE_CATEGORIES])
+def test_category_sql_matches_performance_category(durations_db, prefix):
+    selected = [row[0] for row in durations_db.execute(
+        f"SELECT fulfillment_duration_minutes FROM h WHERE {main.performance_category_sql(prefix)}"
+    )]
+    assert selected == [duration for duration in DURATIONS if performance_category(duration) == prefix]
+
+
+def test_category_sql_rejects_unknown_prefix():
+    with pytest.raises(KeyError):
+        main.performance_category_sql('instant')
+
+
+def test_migration_takes_unknown_durations_out_of_very_slow(durations_db):
+    columns = ['fulfilled_count', 'duration_count', 'very_slow_count']
+    durations_db.execute(f"CREATE TABLE DROP_REQUESTS_HISTORY_ROLLUP ({', '.join(columns)})")
+    # Counted the old way: 3 rows without a duration in very_slow, next to 2 real very slow ones
+    durations_db.executemany("INSERT INTO DROP_REQUESTS_HISTORY_ROLLUP VALUES (?, ?, ?)", [(10, 7, 5), (4, 4, 1)])
+
+    with open(os.path.join(os.path.dirname(__file__), 'migrations', '0011_rollup_null_durations.sql')) as f:
+        durations_db.executescript(f.read())
+
+    assert durations_db.execute("SELECT very_slow_count FROM DROP_REQUESTS_HISTORY_ROLLUP").fetchall() == [(2,), (1,)]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
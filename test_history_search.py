@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for the trigram substring index of the history search (history_search.py)
+The candidate filter is checked against a plain LIKE scan in an in-memory SQLite database
+"""
+
+import random
+import sqlite3
+import sys
+
+import pytest
+
+from history_search import (
+    FIELD_PART_NO, FIELD_SERIAL_NO, candidate_filter_sql, ngram_rows, ngram_rows_for_history,
+    search_trigrams, trigrams
+)
+
+
+def test_trigrams_are_distinct_and_lower_cased():
+    assert trigrams('AbCaBc') == {'abc', 'bca', 'cab'}
+    assert trigrams('abc') == {'abc'}
+
+
+@pytest.mark.parametrize('value', [None, '', 'a', 'ab'])
+def test_values_shorter_than_a_trigram_have_none(value):
+    assert trigrams(value) == set()
+
+
+@pytest.mark.parametrize('term', [None, '', '1', '12'])
+def test_short_terms_cannot_use_the_index(term):
+    assert search_trigrams(term) is None
+
+
+@pytest.mark.parametrize('term', ['12%4', '12_4', 'P-[12]', '%123', '123_'])
+def test_terms_with_like_wildcards_cannot_use_the_index(term):
+    assert search_trigrams(term) is None
+
+
+def test_search_trigrams_are_sorted():
+    assert search_trigrams('P-1234') == ['-12', '123', '234', 'p-1']
+    assert search_trigrams('ABA') == ['aba']
+
+
+def test_ngram_rows_cover_both_fields():
+    rows = ngram_rows(7, 'S1234', 'P-1')
+    assert sorted(rows) == sorted([
+        (FIELD_SERIAL_NO, 's12', 7), (FIELD_SERIAL_NO, '123', 7), (FIELD_SERIAL_NO, '234', 7),
+        (FIELD_PART_NO, 'p-1', 7)
+    ])
+    assert ngram_rows(8, None, 'ab') == []
+    assert ngram_rows_for_history([{'history_id': 1, 'serial_no': 'abc'}, {'history_id': 2, 'part_no': 'xyz'}]) == [
+        (FIELD_SERIAL_NO, 'abc', 1), (FIELD_PART_NO, 'xyz', 2)
+    ]
+
+
+@pytest.fixture
+def history_db():
+    random.seed(42)
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE DROP_REQUESTS_HISTORY (history_id INTEGER PRIMARY KEY, serial_no TEXT, part_no TEXT)")
+    conn.execute("""
+        CREATE TABLE DROP_REQUESTS_HISTORY_NGRAM (
+            field TEXT, gram TEXT, history_id INTEGER, PRIMARY KEY (field, gram, history_id)
+        )
+    """)
+    records = [
+        {'history_id': i,
+         'serial_no': ''.join(random.choice('0123456789') for _ in range(random.randint(2, 8))),
+         'part_no': random.choice(['P-1001', 'p-1002', 'AB-12-X', 'ab12', None, '77'])}
+        for i in range(1, 301)
+    ]
+    conn.executemany("INSERT INTO DROP_REQUESTS_HISTORY VALUES (:history_id, :serial_no, :part_no)", records)
+    conn.executemany("INSERT INTO DROP_REQUESTS_HISTORY_NGRAM VALUES (?, ?, ?)", ngram_rows_for_history(records))
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('column, field, term', [
+    ('serial_no', FIELD_SERIAL_NO, '123'),
+    ('serial_no', FIELD_SERIAL_NO, '9090'),
+    ('serial_no', FIELD_SERIAL_NO, '000'),
+    ('part_no', FIELD_PART_NO, 'p-100'),
+    ('part_no', FIELD_PART_NO, 'B-12'),
+    ('part_no', FIELD_PART_NO, 'AB1'),
+    ('part_no', FIELD_PART_NO, 'zzz'),
+])
+def test_candidate_filter_matches_a_plain_like_scan(history_db, column, field, term):
+    like = f"{column} LIKE ?"
+    expected = [row[0] for row in history_db.execute(
+        f"SELECT history_id FROM DROP_REQUESTS_HISTORY WHERE {like} ORDER BY history_id", [f"%{term}%"]
+    )]
+
+    candidates_sql, params = candidate_filter_sql(field, search_trigrams(term))
+    found = [row[0] for row in history_db.execute(
+        f"SELECT history_id FROM DROP_REQUESTS_HISTORY WHERE {candidates_sql} AND {like} ORDER BY history_id",
+        params + [f"%{term}%"]
+    )]
+
+    assert found == expected
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for the connection cap of the parallel /api/history/stats queries
+(main.run_history_stats_queries, main.history_stats_connections)
+"""
+
+import asyncio
+import sys
+
+import pytest
+
+import main
+
+
+class FakePool:
+    """Stands in for the aioodbc pool and records how many connections were held at once"""
+
+    def __init__(self):
+        self.held = 0
+        self.peak = 0
+        self.acquired = 0
+
+    async def get_db_connection(self):
+        self.held += 1
+        self.acquired += 1
+        self.peak = max(self.peak, self.held)
+        return self
+
+    async def release_db_connection(self, conn):
+        self.held -= 1
+
+    async def cursor(self):
+        return 'cursor'
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(main, 'get_db_connection', pool.get_db_connection)
+    monkeypatch.setattr(main, 'release_db_connection', pool.release_db_connection)
+    return pool
+
+
+def stats_queries(names):
+    async def query(cursor):
+        await asyncio.sleep(0.01)
+        return cursor
+
+    return {name: query for name in names}
+
+
+QUERY_NAMES = ['overall', 'by_part_number', 'daily_trends', 'performance_breakdown', 'by_shift']
+
+
+async def test_parallel_queries_of_concurrent_requests_share_the_connection_cap(pool, monkeypatch):
+    monkeypatch.setattr(main, 'history_stats_connections', asyncio.Semaphore(2))
+
+    loads = await asyncio.gather(*(
+        main.run_history_stats_queries(stats_queries(QUERY_NAMES), parallel=True) for _ in range(3)
+    ))
+
+    assert pool.peak == 2 and pool.held == 0
+    assert pool.acquired == 15  # One connection per query
+    for results, timings in loads:
+        assert results == {name: 'cursor' for name in QUERY_NAMES}
+        assert set(timings) == set(QUERY_NAMES)
+
+
+async def test_sequential_queries_use_one_connection_outside_the_cap(pool, monkeypatch):
+    monkeypatch.setattr(main, 'history_stats_connections', asyncio.Semaphore(1))
+
+    async with main.history_stats_connections:  # Held by another request's parallel queries
+        results, timings = await asyncio.wait_for(
+            main.run_history_stats_queries(stats_queries(QUERY_NAMES), parallel=False), timeout=1
+        )
+
+    assert pool.acquired == 1 and pool.peak == 1
+    assert list(results) == QUERY_NAMES and all(elapsed >= 0 for elapsed in timings.values())
+
+
+async def test_failed_query_releases_its_connection_and_slot(pool, monkeypatch):
+    monkeypatch.setattr(main, 'history_stats_connections', asyncio.Semaphore(1))
+
+    async def failing(cursor):
+        raise RuntimeError("query timeout")
+
+    with pytest.raises(RuntimeError):
+        await main.run_history_stats_queries({'overall': failing}, parallel=True)
+    assert pool.held == 0
+
+    results, _ = await asyncio.wait_for(
+        main.run_history_stats_queries(stats_queries(['overall']), parallel=True), timeout=1
+    )
+    assert results == {'overall': 'cursor'}
+
+
+def test_cap_defaults_to_at_least_one_connection():
+    assert main.history_stats_connections._value == max(1, main.AppConfig.HISTORY_STATS_MAX_CONNECTIONS)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
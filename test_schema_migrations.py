@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for the migration file loader (schema_migrations.split_batches / load_migrations)
+"""
+
+import hashlib
+import sys
+
+import pytest
+
+from schema_migrations import MIGRATIONS_DIR, load_migrations, split_batches
+
+
+def test_script_is_split_on_go_lines():
+    script = "CREATE TABLE a (id INT);\nGO\n  go  \nALTER TABLE a ADD b INT;\nGo\n\nGO\n"
+    assert split_batches(script) == ["CREATE TABLE a (id INT);", "ALTER TABLE a ADD b INT;"]
+
+
+def test_script_without_go_is_one_batch():
+    assert split_batches("SELECT 1;\nSELECT 2;") == ["SELECT 1;\nSELECT 2;"]
+    assert split_batches("\n  \nGO\n") == []
+
+
+def test_go_as_part_of_a_line_does_not_split():
+    script = "SELECT 1 AS GO;\nEXEC GO_HOME;\n-- GO\nGOTO done;"
+    assert split_batches(script) == [script]
+
+
+@pytest.mark.parametrize('script', [
+    "INSERT INTO notes VALUES ('first line\nGO\nlast line');",
+    "INSERT INTO notes VALUES (N'it''s\nGO\n''quoted''');",
+    "/* disabled:\nGO\nDROP TABLE a; */\nSELECT 1;",
+    "/* outer /* inner */\nGO\n*/ SELECT 1;",
+    "SELECT 1 AS [odd\nGO\nname];",
+    "SELECT 1 AS \"odd\nGO\nname\";",
+])
+def test_go_inside_strings_identifiers_and_comments_does_not_split(script):
+    assert split_batches(script) == [script]
+
+
+def test_go_after_a_closed_string_or_comment_splits():
+    script = "SELECT '/*', '--';\nGO\n/* done */ -- it's done\nGO\nSELECT ']';"
+    assert split_batches(script) == ["SELECT '/*', '--';", "/* done */ -- it's done", "SELECT ']';"]
+
+
+def write(directory, name, script):
+    (directory / name).write_text(script, encoding='utf-8')
+
+
+def test_migrations_are_loaded_in_version_order(tmp_path):
+    write(tmp_path, '0010_second.sql', "SELECT 10;")
+    write(tmp_path, '0002_first.sql', "SELECT 2;\nGO\nSELECT 3;")
+    write(tmp_path, 'README.md', "not a migration")
+    write(tmp_path, '0003_Upper.sql', "not a migration name")
+    write(tmp_path, '3_short.sql', "not a migration name")
+
+    migrations = load_migrations(str(tmp_path))
+
+    assert [(m.version, m.name) for m in migrations] == [(2, 'first'), (10, 'second')]
+    assert migrations[0].batches == ["SELECT 2;", "SELECT 3;"]
+
+
+def test_checksum_covers_the_whole_file(tmp_path):
+    script = "SELECT 1;\nGO\n"
+    write(tmp_path, '0001_one.sql', script)
+    first = load_migrations(str(tmp_path))[0]
+    assert first.checksum == hashlib.sha256(script.encode('utf-8')).hexdigest()
+
+    write(tmp_path, '0001_one.sql', script + "-- edited\n")  # Same batches, different file
+    assert load_migrations(str(tmp_path))[0].checksum != first.checksum
+
+
+def test_duplicate_versions_are_rejected(tmp_path):
+    write(tmp_path, '0001_one.sql', "SELECT 1;")
+    write(tmp_path, '0001_other.sql', "SELECT 2;")
+    with pytest.raises(ValueError, match=r"Duplicate migration versions .*\[1\]"):
+        load_migrations(str(tmp_path))
+
+
+def test_shipped_migrations_are_numbered_without_gaps():
+    migrations = load_migrations(MIGRATIONS_DIR)
+    assert [m.version for m in migrations] == list(range(1, len(migrations) + 1))
+    assert all(m.batches for m in migrations)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
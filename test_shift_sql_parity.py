@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Parity test: SQL shift bucketing (czech_shift_sql) vs get_shift_from_czech_datetime
+
+Evaluates the T-SQL expression on the database for UTC instants around every CET/CEST
+transition from 2015 to 2035 (plus shift boundaries on ordinary days) and compares
+each result with the Python implementation.
+
+Needs the AZURE_SQL_* environment variables and the ODBC driver; skipped otherwise.
+
+Usage:
+    python -m pytest -q test_shift_sql_parity.py
+    python test_shift_sql_parity.py
+"""
+
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+
+import pytest
+
+REQUIRED_VARS = ['AZURE_SQL_SERVER', 'AZURE_SQL_DATABASE', 'AZURE_SQL_USERNAME', 'AZURE_SQL_PASSWORD']
+
+# Timestamps per query (one parameter each, SQL Server allows 2100)
+BATCH_SIZE = 1000
+
+
+def last_sunday(year: int, month: int) -> date:
+    """Last Sunday of a 31-day month (EU DST switches on the last Sunday of March and October)"""
+    day = date(year, month, 31)
+    return day - timedelta(days=(day.weekday() - 6) % 7)
+
+
+def sample_instants():
+    """UTC instants around DST transitions and shift boundaries"""
+    instants = set()
+    days = []
+    for year in range(2015, 2036):
+        for month in (3, 10):
+            transition = last_sunday(year, month)
+            days.extend(transition + timedelta(days=offset) for offset in (-1, 0, 1))
+    days.extend([date(2024, 1, 15), date(2024, 7, 15), date(2024, 12, 31), date(2025, 1, 1)])
+
+    for day in days:
+        start = datetime(day.year, day.month, day.day)
+        # Every 15 minutes through the day
+        for quarter in range(96):
+            instants.add(start + timedelta(minutes=15 * quarter))
+        # One second either side of every full hour (covers 6:00, 14:00, 22:00 in both CET and CEST)
+        for hour in range(24):
+            boundary = start + timedelta(hours=hour)
+            instants.add(boundary - timedelta(seconds=1))
+            instants.add(boundary + timedelta(seconds=1))
+    return sorted(instants)
+
+
+def load_main():
+    missing = [var for var in REQUIRED_VARS if not os.getenv(var)]
+    if missing:
+        pytest.skip(f"database not configured ({', '.join(missing)} not set)")
+    try:
+        import main
+    except ImportError as e:
+        pytest.skip(f"database driver not available: {e}")
+    return main
+
+
+async def sql_shifts(main, instants):
+    """Evaluate czech_shift_sql on the database for each instant"""
+    results = {}
+    conn = await main.get_db_connection()
+    try:
+        cursor = await conn.cursor()
+        for i in range(0, len(instants), BATCH_SIZE):
+            batch = instants[i:i + BATCH_SIZE]
+            values = ", ".join("(CAST(? AS DATETIME))" for _ in batch)
+            await cursor.execute(f"""
+                SELECT v.ts, {main.czech_shift_sql('v.ts')}
+                FROM (VALUES {values}) AS v(ts)
+            """, batch)
+            for ts, shift in await cursor.fetchall():
+                results[ts] = shift
+
+        await cursor.execute(f"SELECT {main.czech_shift_sql('CAST(NULL AS DATETIME)')}")
+        null_row = await cursor.fetchone()
+        results[None] = null_row[0]
+    finally:
+        await main.release_db_connection(conn)
+        if main.connection_pool:
+            main.connection_pool.close()
+            await main.connection_pool.wait_closed()
+            main.connection_pool = None
+    return results
+
+
+def compare(main):
+    instants = sample_instants()
+    sql_results = asyncio.run(sql_shifts(main, instants))
+
+    mismatches = []
+    for instant in instants + [None]:
+        expected = main.get_shift_from_czech_datetime(instant)
+        actual = sql_results.get(instant)
+        if actual != expected:
+            mismatches.append((instant, expected, actual))
+    return len(instants) + 1, mismatches
+
+
+def test_shift_sql_parity():
+    main = load_main()
+    checked, mismatches = compare(main)
+    assert not mismatches, f"{len(mismatches)}/{checked} mismatches, first: {mismatches[:5]}"
+
+
+if __name__ == "__main__":
+    import main as app_main
+
+    print("🔍 Comparing SQL shift bucketing with get_shift_from_czech_datetime...")
+    print("=" * 60)
+    checked, mismatches = compare(app_main)
+    for instant, expected, actual in mismatches[:20]:
+        print(f"❌ FAIL | UTC: {instant} | Python: {expected} | SQL: {actual}")
+    print("=" * 60)
+    if mismatches:
+        print(f"⚠️  {len(mismatches)} of {checked} instants differ")
+    else:
+        print(f"🎉 All {checked} instants match")
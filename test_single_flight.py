@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for the ERP request coalescing (main.SingleFlight)
+"""
+
+import asyncio
+import sys
+
+import pytest
+
+from main import SingleFlight
+
+
+class Upstream:
+    """Fake ERP call that blocks until released and counts how often it ran"""
+
+    def __init__(self, result=None, error=None):
+        self.result = [{'serial_no': 'S1'}] if result is None else result
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return self.result
+
+
+async def test_concurrent_identical_calls_share_one_upstream_call():
+    flight = SingleFlight()
+    upstream = Upstream()
+
+    callers = [asyncio.ensure_future(flight.run(4619, {'Serial_No': 'S1'}, upstream)) for _ in range(5)]
+    await asyncio.sleep(0)
+    upstream.release.set()
+    results = await asyncio.gather(*callers)
+
+    assert upstream.calls == 1
+    assert all(result == [{'serial_no': 'S1'}] for result in results)
+    results[0][0]['location'] = 'changed'  # Each caller gets its own copy
+    assert 'location' not in results[1][0]
+    stats = flight.get_stats()
+    assert (stats['calls'], stats['upstream_calls'], stats['coalesced_calls'], stats['in_flight']) == (5, 1, 4, 0)
+    assert stats['by_datasource']['4619']['coalesced_calls'] == 4
+
+
+async def test_calls_are_keyed_by_datasource_and_inputs():
+    assert SingleFlight.make_key(8566, {'a': 1, 'b': 2}) == SingleFlight.make_key(8566, {'b': 2, 'a': 1})
+
+    flight = SingleFlight()
+    upstream = Upstream()
+    callers = [
+        asyncio.ensure_future(flight.run(8566, {'Part_No': 'P-1'}, upstream)),
+        asyncio.ensure_future(flight.run(8566, {'Part_No': 'P-2'}, upstream)),
+        asyncio.ensure_future(flight.run(4619, {'Part_No': 'P-1'}, upstream)),
+    ]
+    await asyncio.sleep(0)
+    upstream.release.set()
+    await asyncio.gather(*callers)
+
+    assert upstream.calls == 3
+    assert flight.get_stats()['coalesced_calls'] == 0
+
+
+async def test_error_reaches_every_waiter_and_is_not_cached():
+    flight = SingleFlight()
+    failing = Upstream(error=ConnectionError("ERP down"))
+
+    callers = [asyncio.ensure_future(flight.run(4619, {'Serial_No': 'S1'}, failing)) for _ in range(3)]
+    await asyncio.sleep(0)
+    failing.release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+
+    assert failing.calls == 1
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert flight.get_stats()['in_flight'] == 0
+
+    # The next call goes upstream again instead of reusing the failure
+    recovered = Upstream()
+    recovered.release.set()
+    assert await flight.run(4619, {'Serial_No': 'S1'}, recovered) == [{'serial_no': 'S1'}]
+    assert recovered.calls == 1
+
+
+async def test_cancelled_caller_does_not_cancel_the_shared_call():
+    flight = SingleFlight()
+    upstream = Upstream()
+
+    first = asyncio.ensure_future(flight.run(4619, {'Serial_No': 'S1'}, upstream))
+    second = asyncio.ensure_future(flight.run(4619, {'Serial_No': 'S1'}, upstream))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    upstream.release.set()
+
+    assert await second == [{'serial_no': 'S1'}]
+    assert first.cancelled() and upstream.calls == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests for the embedded SQLite storage backend (sqlite_storage.py)
+Runs without a database server: every test uses a throwaway database file (conftest.py)
+"""
+
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+from sqlite_storage import to_db_time
+from storage import HistoryFilters, RequestRecord
+
+
+async def test_requests_and_fulfillment(make_storage):
+    changes = []
+    storage = make_storage(changes.append)
+
+    now = datetime.utcnow()
+    assert await storage.active_requests_version() == 0
+    req_id = await storage.insert_request('P-1', 'W1', now - timedelta(hours=2), RequestRecord('S1', 'A', 5, 'L1'))
+    inserted = await storage.insert_requests('P-2', 'W2', now, [RequestRecord('S1'), RequestRecord('S2', quantity=3)])
+    assert list(inserted) == ['S2'] and inserted['S2'] > req_id
+    assert await storage.active_requests_version() == 2
+
+    assert await storage.requested_serials(['S1', 'S2', 'S3', None]) == {'S1', 'S2'}
+    count, oldest, newest = await storage.active_request_summary()
+    assert count == 2 and oldest < newest
+    active = await storage.list_active_requests()
+    assert [row['serial_no'] for row in active] == ['S2', 'S1']
+    assert isinstance(active[0]['req_time'], datetime)
+
+    moved = await storage.fulfill_requests([('S1', 'PROD-1'), ('S9', 'PROD-9')], 'manual_cleanup')
+    assert [row['serial_no'] for row in moved] == ['S1']
+    assert moved[0]['fulfillment_duration_minutes'] == 120
+    assert moved[0]['current_location'] == 'PROD-1'
+    assert await storage.requested_serials(['S1']) == set()
+    assert changes == ['fulfill_requests (manual_cleanup)']
+    assert await storage.active_requests_version() == 3
+
+    # Nothing moved, nothing invalidated
+    assert await storage.fulfill_requests([('S1', 'PROD-1')], 'manual_delete') == []
+    assert len(changes) == 1
+    assert await storage.active_requests_version() == 3
+
+
+async def test_history_paging_and_filters(storage):
+    now = datetime.utcnow()
+    await storage.insert_requests('P-1', 'W1', now, [RequestRecord(f"39{i:03d}") for i in range(5)])
+    await storage.insert_request('P-2', 'TEST', now, RequestRecord('TEST-1'))
+    await storage.fulfill_requests([(f"39{i:03d}", 'L') for i in range(5)] + [('TEST-1', 'L')], 'auto_cleanup')
+
+    page, total = await storage.query_history(HistoryFilters(), 2, 0, None, 'exact')
+    assert total == 5  # TEST workcenter excluded
+    assert [row['history_id'] for row in page] == [5, 4]
+
+    keyset = (page[-1]['fulfilled_time'], page[-1]['history_id'])
+    page, total = await storage.query_history(HistoryFilters(), 10, 0, keyset, 'none')
+    assert total is None
+    assert [row['history_id'] for row in page] == [3, 2, 1]
+
+    page, total = await storage.query_history(HistoryFilters(serial_no='9003'), 10, 0, None, 'exact')
+    assert [row['serial_no'] for row in page] == ['39003'] and total == 1
+
+    future = HistoryFilters(start_date=now + timedelta(days=1))
+    assert await storage.query_history(future, 10, 0, None, 'exact') == ([], 0)
+
+    assert await storage.clear_history() == 6
+    assert await storage.query_history(HistoryFilters(), 10, 0, None, 'exact') == ([], 0)
+
+
+async def test_history_stats_shapes(storage):
+    now = datetime.utcnow()
+    await storage.insert_request('P-1', 'W1', now - timedelta(minutes=30), RequestRecord('S1'))
+    await storage.insert_request('P-1', 'W1', now - timedelta(hours=3), RequestRecord('S2'))
+    await storage.insert_request('P-2', 'W1', now, RequestRecord('S3'))
+    await storage.fulfill_requests([('S1', 'L'), ('S2', 'L')], 'auto_cleanup')
+    await storage.fulfill_requests([('S3', 'L')], 'manual_delete')
+
+    results, timings, source = await storage.history_stats(30, None, 'rollup', True)
+    assert source == 'raw'
+    assert set(timings) == set(results)
+
+    total, avg, minimum, maximum, auto, manual_cleanup, manual_delete = results['overall']
+    assert (total, minimum, maximum, auto, manual_cleanup, manual_delete) == (2, 30, 180, 2, 0, 1)
+    assert avg == 105
+
+    assert results['by_part_number'] == [('P-1', 2, 105.0, 30, 180)]
+    assert results['daily_trends'] == [(now.date(), 2, 105.0)]
+    assert [row[0] for row in results['performance_breakdown']] == ['Fast (≤1 hour)', 'Medium (1-8 hours)']
+    assert results['by_shift'] == {'Morning': (2, 105.0, 30, 180, 2, 0, 0)}
+
+    results, _, _ = await storage.history_stats(30, 'P-2', 'raw', False)
+    assert results['overall'][0] == 0 and results['overall'][6] == 1
+
+
+async def test_unknown_durations_are_left_out_of_the_performance_breakdown(storage):
+    now = datetime.utcnow()
+    await storage.insert_requests('P-1', 'W1', now - timedelta(minutes=30), [RequestRecord('S1'), RequestRecord('S2')])
+    await storage.fulfill_requests([('S1', 'L'), ('S2', 'L')], 'auto_cleanup')
+    await storage._run(lambda conn: conn.execute(
+        "UPDATE DROP_REQUESTS_HISTORY SET fulfillment_duration_minutes = NULL WHERE serial_no = 'S2'"
+    ))
+
+    results, _, _ = await storage.history_stats(30, None, 'raw', False)
+    assert results['overall'][:2] == (2, 30)
+    assert results['performance_breakdown'] == [('Fast (≤1 hour)', 1, 30.0)]
+
+
+async def test_change_log_is_pruned_but_keeps_the_version(storage):
+    now = datetime.utcnow()
+    await storage.insert_requests('P-1', 'W1', now, [RequestRecord('S1'), RequestRecord('S2')])
+    await storage.fulfill_requests([('S1', 'L')], 'manual_delete')
+    assert await storage.active_requests_version() == 3
+    assert (await storage.active_request_changes(1)).deleted_req_ids == [1]
+
+    # A day later the next prune drops everything but the newest row
+    await storage._run(lambda conn: conn.execute(
+        "UPDATE DROP_REQUESTS_CHANGELOG SET changed_at = ?", (to_db_time(now - timedelta(days=2)),)
+    ))
+    await storage.start()
+    assert await storage._run(lambda conn: conn.execute("SELECT version FROM DROP_REQUESTS_CHANGELOG").fetchall()) == [(3,)]
+    assert await storage.active_requests_version() == 3
+    assert await storage.active_request_changes(1) is None  # Too far behind: the view reloads
+    assert await storage.active_request_changes(3) == (3, [], [])
+
+    await storage.insert_request('P-1', 'W1', now, RequestRecord('S3'))
+    assert await storage.active_requests_version() == 4  # Versions are never reused
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
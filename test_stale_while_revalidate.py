@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for the production locations cache (main.StaleWhileRevalidateCache)
+"""
+
+import asyncio
+import sys
+
+import pytest
+
+from main import StaleWhileRevalidateCache
+
+
+class FakeErp:
+    """Fetch function returning queued answers (a list, or an exception to raise)"""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def expire(cache):
+    cache._fetched_at -= cache.ttl_seconds + 1
+
+
+async def test_cold_cache_waits_for_the_erp_and_fresh_values_are_served_directly():
+    erp = FakeErp(['LOC-1', 'LOC-2'])
+    cache = StaleWhileRevalidateCache('locations', erp, ttl_seconds=60)
+
+    assert await cache.get() == ['LOC-1', 'LOC-2']
+    assert await cache.get() == ['LOC-1', 'LOC-2']
+
+    stats = cache.get_stats()
+    assert (stats['misses'], stats['hits'], stats['stale_hits']) == (1, 1, 0)
+    assert stats['fresh'] and erp.calls == 1
+
+
+async def test_stale_value_is_served_while_one_background_refresh_runs():
+    erp = FakeErp(['LOC-1'], ['LOC-1', 'LOC-3'])
+    cache = StaleWhileRevalidateCache('locations', erp, ttl_seconds=60)
+    await cache.get()
+    expire(cache)
+    erp.release.clear()
+
+    assert await cache.get() == ['LOC-1']  # Answered without waiting for the refresh
+    assert await cache.get() == ['LOC-1']
+    assert cache.get_stats()['refreshing'] and cache.stale_hits == 2
+
+    erp.release.set()
+    await cache._refresh_task
+    assert erp.calls == 2  # One refresh for both stale reads
+    assert await cache.get() == ['LOC-1', 'LOC-3']
+    assert cache.get_stats()['fresh'] and cache.hits == 1
+
+
+@pytest.mark.parametrize('failure', [ConnectionError("ERP down"), []])
+async def test_failed_or_empty_refresh_keeps_the_last_good_value(failure):
+    erp = FakeErp(['LOC-1'], failure, ['LOC-2'])
+    cache = StaleWhileRevalidateCache('locations', erp, ttl_seconds=60)
+    await cache.get()
+    expire(cache)
+
+    assert await cache.refresh() is False
+    assert await cache.get() == ['LOC-1']
+    stats = cache.get_stats()
+    assert not stats['fresh'] and stats['refresh_failures'] == 1 and stats['last_error']
+
+    await cache._refresh_task  # The stale read above started another refresh, which succeeds
+    assert await cache.get() == ['LOC-2']
+
+
+async def test_cold_cache_with_a_failing_erp_returns_an_empty_list():
+    cache = StaleWhileRevalidateCache('locations', FakeErp(ConnectionError("ERP down")), ttl_seconds=60)
+
+    assert await cache.get() == []
+    assert cache.get_stats()['cached'] is False and cache.last_error == "ERP down"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for the WebSocket broadcast hub (websocket_hub.py)
+Clients are in-process stand-ins for starlette WebSockets; a blocked one never finishes a send
+"""
+
+import asyncio
+import json
+import sys
+
+import pytest
+
+from websocket_hub import SLOW_CONSUMER_CLOSE_CODE, BroadcastHub
+
+
+class FakeClient:
+    def __init__(self, blocked=False, broken=False):
+        self.client = None
+        self.received = []
+        self.closed_with = None
+        self.unblock = asyncio.Event()
+        if not blocked:
+            self.unblock.set()
+        self.broken = broken
+
+    async def send_text(self, text):
+        if self.broken:
+            raise ConnectionResetError("gone")
+        await self.unblock.wait()
+        self.received.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def make_hub(policy, queue_size=3, send_timeout_seconds=5):
+    return BroadcastHub(queue_size, policy, send_timeout_seconds, resync_message=lambda: {'type': 'resync'})
+
+
+async def test_slow_client_is_coalesced_without_delaying_others():
+    hub = make_hub('coalesce')
+    fast, slow = FakeClient(), FakeClient(blocked=True)
+    hub.connect(fast, {'type': 'hello'})
+    slow_connection = hub.connect(slow, {'type': 'hello'})
+    await asyncio.sleep(0)
+
+    for seq in range(1, 7):
+        assert hub.broadcast({'seq': seq}) == 2
+        await asyncio.sleep(0.001)  # Lets the fast client's writer keep up
+    await asyncio.sleep(0.01)
+    assert [m.get('seq') for m in fast.received] == [None, 1, 2, 3, 4, 5, 6]
+    assert slow.received == []
+
+    # hello is in flight; seq 1-3 filled the queue, seq 4 replaced it with a resync, 5-6 queued behind
+    stats = slow_connection.get_stats()
+    assert stats['coalesced'] == 1 and stats['dropped'] == 4 and stats['queue_depth'] == 3
+    slow.unblock.set()
+    await asyncio.sleep(0.01)
+    assert slow.received == [{'type': 'hello'}, {'type': 'resync'}, {'seq': 5}, {'seq': 6}]
+    assert hub.get_stats()['totals'] == {'sent': 11, 'dropped': 4, 'coalesced': 1}
+
+
+async def test_slow_client_is_disconnected_by_policy():
+    hub = make_hub('disconnect', queue_size=2)
+    slow = FakeClient(blocked=True)
+    hub.connect(slow)
+    for seq in range(4):
+        hub.broadcast({'seq': seq})
+    await asyncio.sleep(0.01)
+    assert slow.closed_with == SLOW_CONSUMER_CLOSE_CODE
+    stats = hub.get_stats()
+    assert stats['connections_count'] == 0 and stats['slow_disconnects'] == 1
+    assert stats['totals']['dropped'] == 3  # seq 0-1 queued and seq 2 that overflowed; seq 3 came after the disconnect
+
+
+async def test_dead_and_stuck_clients_are_removed():
+    hub = make_hub('coalesce', send_timeout_seconds=0.01)
+    broken, stuck, ok = FakeClient(broken=True), FakeClient(blocked=True), FakeClient()
+    for client in (broken, stuck, ok):
+        hub.connect(client)
+    hub.broadcast(json.dumps('relayed text is sent as is'))
+    await asyncio.sleep(0.05)
+    assert list(hub.connections) == [3] and hub.get_stats()['send_failures'] == 2
+    assert ok.received == ['relayed text is sent as is']
+    # The stuck socket is closed so the client reconnects; the broken one is already gone
+    assert stuck.closed_with == SLOW_CONSUMER_CLOSE_CODE and broken.closed_with is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
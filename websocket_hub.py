@@ -0,0 +1,234 @@
+"""
+WebSocket broadcast hub: non-blocking fan-out with a bounded send queue per connection
+
+broadcast() never waits on a client. It serializes the message once and appends it to
+every connection's queue; one writer task per connection sends from that queue. A tablet
+on flaky Wi-Fi only backs up its own queue, never the other clients or the handler
+that broadcast.
+
+When a queue is full the connection is a slow consumer and the hub's policy applies:
+
+    coalesce    the queued messages are discarded and replaced by a single resync
+                message (resync_message()); the client reloads its state from the API
+    disconnect  the connection is closed with code 1013 (try again later); the client
+                reconnects and starts from a fresh snapshot
+
+A send that does not complete within send_timeout_seconds closes the connection with code 1013
+as well (checked by one watchdog task per hub rather than a timeout per send, which would cost
+a task per message).
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+SLOW_CONSUMER_POLICIES = ('coalesce', 'disconnect')
+
+# Close code for connections dropped as slow consumers (RFC 6455 "Try Again Later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class HubConnection:
+    """One client: its send queue, writer task and counters"""
+
+    def __init__(self, hub: 'BroadcastHub', websocket: WebSocket, connection_id: int):
+        self.hub = hub
+        self.websocket = websocket
+        self.connection_id = connection_id
+        self.client = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+        self.connected_at = datetime.now().isoformat()
+        self.pending: Deque[Tuple[float, str]] = deque()  # (enqueued monotonic time, text)
+        self._wakeup = asyncio.Event()
+        self._sending_since: Optional[float] = None  # enqueue time of the message being sent
+        self.send_started: Optional[float] = None  # when the current send began (watchdog)
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_queue_depth = 0
+        self.max_lag_seconds = 0.0
+        self.writer = asyncio.ensure_future(self._write())
+
+    def lag_seconds(self) -> float:
+        """Age of the oldest message not yet sent to this client"""
+        oldest = self._sending_since if self._sending_since is not None else (
+            self.pending[0][0] if self.pending else None
+        )
+        return time.monotonic() - oldest if oldest is not None else 0.0
+
+    def enqueue(self, text: str):
+        if self.closed:
+            return
+        if len(self.pending) >= self.hub.queue_size:
+            if self.hub.policy == 'disconnect':
+                self.dropped += 1  # This message; close() counts the queued ones
+                self.hub.slow_disconnects += 1
+                logger.warning(f"⚠️ WebSocket #{self.connection_id} ({self.client}) is {len(self.pending)} "
+                               f"messages behind, disconnecting")
+                self.close(SLOW_CONSUMER_CLOSE_CODE)
+                return
+            # Everything queued (and this message) is superseded by one resync
+            self.dropped += len(self.pending) + 1
+            self.coalesced += 1
+            self.pending.clear()
+            text = json.dumps(self.hub.resync_message())
+        self.pending.append((time.monotonic(), text))
+        self.max_queue_depth = max(self.max_queue_depth, len(self.pending))
+        self._wakeup.set()
+
+    async def _write(self):
+        try:
+            while True:
+                while not self.pending:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                self._sending_since, text = self.pending.popleft()
+                self.send_started = time.monotonic()
+                await self.websocket.send_text(text)
+                self.max_lag_seconds = max(self.max_lag_seconds, time.monotonic() - self._sending_since)
+                self._sending_since = self.send_started = None
+                self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # Dead connection
+            logger.warning(f"Removing dead WebSocket connection #{self.connection_id} ({self.client}): {e!r}")
+            self.hub.send_failures += 1
+            self.close()
+
+    def close(self, code: Optional[int] = None):
+        """Stop sending and unregister; with a code, also close the socket (the receive loop then ends)"""
+        if self.closed:
+            return
+        self.closed = True
+        self.dropped += len(self.pending)
+        self.pending.clear()
+        self.hub._forget(self)
+        if asyncio.current_task() is not self.writer:
+            self.writer.cancel()
+        if code is not None:
+            asyncio.ensure_future(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), self.hub.send_timeout_seconds)
+        except Exception:
+            pass  # Already gone
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'id': self.connection_id,
+            'client': self.client,
+            'connected_at': self.connected_at,
+            'queue_depth': len(self.pending),
+            'lag_seconds': round(self.lag_seconds(), 3),
+            'max_lag_seconds': round(self.max_lag_seconds, 3),
+            'max_queue_depth': self.max_queue_depth,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced
+        }
+
+
+class BroadcastHub:
+    """
+    Args:
+        queue_size: Messages a connection may have waiting before it counts as a slow consumer
+        policy: 'coalesce' or 'disconnect' (see the module docstring)
+        send_timeout_seconds: Longest a single send may take before the connection is closed
+        resync_message: Builds the message that replaces a coalesced backlog
+    """
+
+    def __init__(self, queue_size: int, policy: str, send_timeout_seconds: float,
+                 resync_message: Callable[[], Dict[str, Any]]):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy {policy!r}, expected one of {SLOW_CONSUMER_POLICIES}")
+        self.queue_size = max(1, queue_size)
+        self.policy = policy
+        self.send_timeout_seconds = send_timeout_seconds
+        self.resync_message = resync_message
+        self.connections: Dict[int, HubConnection] = {}
+        self._next_id = 0
+        self._watchdog: Optional[asyncio.Task] = None
+        self.broadcasts = 0
+        self.slow_disconnects = 0
+        self.send_failures = 0
+        # Counters of connections that have gone away, so totals survive disconnects
+        self._closed_totals = {'sent': 0, 'dropped': 0, 'coalesced': 0}
+
+    def connect(self, websocket: WebSocket, first_message: Optional[Dict[str, Any]] = None) -> HubConnection:
+        """Register an accepted websocket; first_message is queued before any broadcast reaches it"""
+        if self._watchdog is None or self._watchdog.done():
+            self._watchdog = asyncio.ensure_future(self._watch_sends())
+        self._next_id += 1
+        connection = HubConnection(self, websocket, self._next_id)
+        if first_message is not None:
+            connection.enqueue(json.dumps(first_message))
+        self.connections[connection.connection_id] = connection
+        return connection
+
+    async def _watch_sends(self):
+        """Close connections whose current send has taken longer than send_timeout_seconds"""
+        while True:
+            await asyncio.sleep(min(1.0, self.send_timeout_seconds / 2))
+            now = time.monotonic()
+            for connection in list(self.connections.values()):
+                started = connection.send_started
+                if started is not None and now - started > self.send_timeout_seconds:
+                    logger.warning(f"Removing stuck WebSocket connection #{connection.connection_id} "
+                                   f"({connection.client}): send pending for {now - started:.1f}s")
+                    self.send_failures += 1
+                    # Close the socket too, so the page notices (onclose), reconnects and resyncs
+                    connection.close(SLOW_CONSUMER_CLOSE_CODE)
+
+    def disconnect(self, connection: HubConnection):
+        connection.close()
+
+    def _forget(self, connection: HubConnection):
+        if self.connections.pop(connection.connection_id, None) is not None:
+            for counter in self._closed_totals:
+                self._closed_totals[counter] += getattr(connection, counter)
+
+    def broadcast(self, message: Union[Dict[str, Any], str], exclude: Optional[HubConnection] = None) -> int:
+        """Queue message (a dict is sent as JSON) for every connection; returns the number of recipients"""
+        text = message if isinstance(message, str) else json.dumps(message)
+        self.broadcasts += 1
+        recipients = [c for c in self.connections.values() if c is not exclude]
+        for connection in recipients:
+            connection.enqueue(text)
+        return len(recipients)
+
+    async def close(self):
+        """Close every connection (shutdown)"""
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+        connections = list(self.connections.values())
+        for connection in connections:
+            connection.close()
+        await asyncio.gather(*(connection._close_socket(1001) for connection in connections))  # Going away
+
+    def get_stats(self) -> Dict[str, Any]:
+        connections: List[Dict[str, Any]] = sorted(
+            (c.get_stats() for c in self.connections.values()), key=lambda s: s['lag_seconds'], reverse=True
+        )
+        totals = {counter: value + sum(c[counter] for c in connections)
+                  for counter, value in self._closed_totals.items()}
+        return {
+            'connections_count': len(connections),
+            'queue_size': self.queue_size,
+            'policy': self.policy,
+            'send_timeout_seconds': self.send_timeout_seconds,
+            'broadcasts': self.broadcasts,
+            'slow_disconnects': self.slow_disconnects,
+            'send_failures': self.send_failures,
+            'totals': totals,
+            'connections': connections
+        }